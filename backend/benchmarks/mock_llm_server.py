@@ -0,0 +1,257 @@
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, List, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+FAULT_RESPONSE = """### High-Level Overview:
+- The file builds SQL queries from request parameters and returns the matching rows.
+
+### Detected Faults:
+{faults}"""
+
+FAULT_TEMPLATE = """#### Fault {number}:
+- **Fault Detected**: SQL injection through string concatenation.
+- **Cause**: The `id` parameter is appended directly to the query string.
+- **Impact**: An attacker can read or modify arbitrary rows.
+- **Solution**: Use a prepared statement with a bound parameter.
+"""
+
+PATTERN_RESPONSE = """### High-Level Explanation:
+/// Bind the identifier instead of concatenating it.
+
+### Implementation Plan:
+#### Code Changes:
+```java
+PreparedStatement statement = connection.prepareStatement("SELECT * FROM users WHERE id = ?");
+statement.setString(1, id);
+```
+"""
+
+PATCH_RESPONSE = """```java
+class Dao {
+    ResultSet find(Connection connection, String id) throws SQLException {
+        PreparedStatement statement = connection.prepareStatement("SELECT * FROM users WHERE id = ?");
+        statement.setString(1, id);
+        return statement.executeQuery();
+    }
+}
+```
+"""
+
+VALIDATION_RESPONSE = """**Status:** GOOD
+
+**Issues:** None, the query is parameterised.
+
+**Explanation:** The reported fault is resolved."""
+
+# (marker found in the prompt, canned response key) checked in order, first match wins
+PROMPT_MARKERS: List[Tuple[str, str]] = [
+    ("Refine the following fault analysis", "fault"),
+    ("Analyze the following code file", "fault"),
+    ("Given the following fault and context", "pattern"),
+    ("Strict Code Review", "validation"),
+    ("pattern fix", "patch"),
+]
+
+class MockLLMServer:
+    """
+    Local OpenAI-compatible stand-in for /v1/chat/completions. Responses are picked by
+    the pipeline stage the prompt belongs to and delayed by a fixed latency plus the time
+    the completion would take to stream at tokens_per_second.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, tokens_per_second: float = 0.0, num_faults: int = 1, responses: Optional[Dict[str, str]] = None) -> None:
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.responses: Dict[str, str] = {
+            "fault": FAULT_RESPONSE.format(faults="\n".join(FAULT_TEMPLATE.format(number=i) for i in range(1, num_faults + 1))),
+            "pattern": PATTERN_RESPONSE,
+            "patch": PATCH_RESPONSE,
+            "validation": VALIDATION_RESPONSE,
+            "default": "OK",
+        }
+        self.responses.update(responses or {})
+        self.request_counts: Dict[str, int] = {}
+        # (status code, Retry-After seconds) returned instead of a completion, oldest first
+        self.failures: List[Tuple[int, Optional[float]]] = []
+        # extra seconds added to the next requests, to simulate a hung call
+        self.stalls: List[float] = []
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def fail_next(self, count: int = 1, status: int = 429, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.failures.extend([(status, retry_after)] * count)
+
+    def stall_next(self, count: int = 1, seconds: float = 60.0) -> None:
+        with self._lock:
+            self.stalls.extend([seconds] * count)
+
+    def next_failure(self) -> Optional[Tuple[int, Optional[float]]]:
+        with self._lock:
+            if self.failures:
+                self.request_counts["failed"] = self.request_counts.get("failed", 0) + 1
+                return self.failures.pop(0)
+        return None
+
+    def pick_response(self, prompt: str) -> Tuple[str, str]:
+        for marker, key in PROMPT_MARKERS:
+            if marker in prompt:
+                return key, self.responses[key]
+        return "default", self.responses["default"]
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        # rough estimate, good enough for usage numbers and simulated streaming time
+        return max(1, len(text) // 4)
+
+    def complete(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        key, content = self.pick_response(prompt)
+        with self._lock:
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+        # honour the generation limits the way a real server would
+        finish_reason = "stop"
+        stops = body.get("stop") or []
+        for stop in [stops] if isinstance(stops, str) else stops:
+            if stop and stop in content:
+                content = content[:content.index(stop)]
+        max_tokens = body.get("max_tokens")
+        if max_tokens and self.count_tokens(content) > max_tokens:
+            content = content[:max_tokens * 4]
+            finish_reason = "length"
+
+        prompt_tokens = self.count_tokens(prompt)
+        completion_tokens = self.count_tokens(content)
+        delay = self.latency
+        with self._lock:
+            if self.stalls:
+                delay += self.stalls.pop(0)
+        if self.tokens_per_second > 0:
+            delay += completion_tokens / self.tokens_per_second
+        if delay > 0:
+            time.sleep(delay)
+
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock-llm"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def start(self) -> "MockLLMServer":
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    for name, value in (headers or {}).items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client gave up, e.g. a cancelled hedge
+                    logger.debug("Client disconnected before the response was sent")
+
+            def do_GET(self) -> None:
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": "mock-llm", "object": "model"}]})
+                else:
+                    self._send_json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self._send_json(400, {"error": {"message": "invalid JSON body"}})
+                    return
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                failure = mock.next_failure()
+                if failure is not None:
+                    status, retry_after = failure
+                    headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+                    self._send_json(status, {"error": {"message": f"mock failure {status}", "type": "mock_error"}}, headers)
+                    return
+                self._send_json(200, mock.complete(body))
+
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.debug(format % args)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f"Mock LLM server listening on {self.url}")
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve canned pipeline responses over an OpenAI-compatible API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request.")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Simulated generation speed, 0 disables.")
+    parser.add_argument("--faults", type=int, default=1, help="Number of faults in the canned localization.")
+    parser.add_argument("--responses", help="JSON file overriding responses by key (fault, pattern, patch, validation, default).")
+    args = parser.parse_args(argv)
+
+    responses = None
+    if args.responses:
+        with open(args.responses, "r", encoding="utf-8") as f:
+            responses = json.load(f)
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.tokens_per_second, args.faults, responses).start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
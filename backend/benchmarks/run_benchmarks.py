@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import statistics
+import faiss
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from backend.benchmarks.mock_llm_server import MockLLMServer
+from backend.source.pipeline.pipeline import Pipeline
+from backend.source.pipeline.rag.rag import RAG, chunk_file
+from backend.source.pipeline.fault_loc.fault_localization import FaultLocalization
+# pipeline.py imports Model through the backend/ path entry, use the same module so caches are shared
+from source.model.model import Model
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "baseline.json")
+
+METHOD_TEMPLATES = [
+    """    public ResultSet find{name}(Connection connection, String id) throws SQLException {{
+        Statement statement = connection.createStatement();
+        return statement.executeQuery("SELECT * FROM {table} WHERE id = " + id);
+    }}
+""",
+    """    public int total{name}(List<Integer> values) {{
+        int total = 0;
+        for (int i = 0; i <= values.size(); i++) {{
+            total += values.get(i);
+        }}
+        return total;
+    }}
+""",
+    """    public String read{name}(String path) throws IOException {{
+        BufferedReader reader = new BufferedReader(new FileReader(path));
+        return reader.readLine();
+    }}
+""",
+]
+
+def make_corpus(num_files: int, methods_per_file: int = 12, seed: int = 0) -> List[Dict[str, str]]:
+    # same seed, same corpus, so runs are comparable
+    rng = random.Random(seed)
+    files = []
+    for i in range(num_files):
+        methods = "".join(
+            rng.choice(METHOD_TEMPLATES).format(name=f"Item{i}_{j}", table=f"table_{rng.randint(0, 99)}")
+            for j in range(methods_per_file)
+        )
+        content = f"import java.sql.*;\nimport java.io.*;\nimport java.util.*;\n\npublic class Service{i} {{\n{methods}}}\n"
+        files.append({"filename": f"src/Service{i}.java", "content": content})
+    return files
+
+class BenchModel(Model):
+    # lets the benchmark point at a local tokenizer without touching model_configs.json
+    tokenizer_override: Optional[str] = None
+
+    def _get_model_config(self, model: str) -> Any:
+        config = dict(super()._get_model_config(model))
+        if self.tokenizer_override:
+            config["tokenizer"] = self.tokenizer_override
+        return config
+
+class BenchPipeline(Pipeline):
+    embedding_model: str = "all-MiniLM-L6-v2"
+
+    def set_rag(self, index_path: Optional[str] = "code_index.faiss") -> None:
+        self.rag = RAG(model_name=self.embedding_model, index_path=index_path)
+
+    def set_model(self, model_selection: Optional[str] = None, api_key: Optional[str] = None, provider: Optional[str] = None, test: bool = False) -> None:
+        self.model = BenchModel("mock-llm", None, "local")
+
+class BenchmarkRunner:
+    def __init__(self, repeat: int = 3) -> None:
+        self.repeat = repeat
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def bench(self, name: str, func: Callable[[], Any], setup: Optional[Callable[[], Any]] = None) -> None:
+        # setup runs outside the timed region and its return value is passed to func
+        timings: List[float] = []
+        try:
+            for _ in range(self.repeat):
+                state = setup() if setup is not None else None
+                start = time.perf_counter()
+                func(state) if setup is not None else func()
+                timings.append(time.perf_counter() - start)
+        except Exception as e:
+            logger.warning(f"Skipping {name}: {str(e)}")
+            self.results[name] = {"skipped": str(e)}
+            return
+        self.results[name] = {
+            "median": statistics.median(timings),
+            "min": min(timings),
+            "max": max(timings),
+            "repeat": len(timings),
+        }
+        logger.info(f"{name}: median {self.results[name]['median']:.4f}s over {len(timings)} runs")
+
+    def agreement(self, name: str, corpus: List[Dict[str, str]], args: argparse.Namespace, k: int = 5, **candidate: Any) -> None:
+        # retrieval overlap between a default RAG and one built with the candidate settings
+        queries = [f"{fault} in {method}Item{i}_{i % 12}" for i in range(args.queries)
+                   for fault, method in (("SQL injection", "find"), ("off by one loop bound", "total"), ("unclosed reader", "read"))]
+        try:
+            rags = []
+            for settings in ({}, candidate):
+                rag = RAG(model_name=args.embedding_model, index_path=None, **settings)
+                rag.embed_code(corpus, batch_size=args.batch_size)
+                rags.append(rag)
+            top1 = overlap = 0.0
+            for query in queries:
+                reference, other = ([(r["metadata"]["file_name"], r["metadata"]["chunk_number"]) for r in rag.retrieve_context(query, k=k)] for rag in rags)
+                top1 += reference[0] == other[0]
+                overlap += len(set(reference) & set(other)) / len(reference)
+        except Exception as e:
+            logger.warning(f"Skipping {name}: {str(e)}")
+            self.results[name] = {"skipped": str(e)}
+            return
+        result: Dict[str, Any] = {"top1": top1 / len(queries), f"overlap_at_{k}": overlap / len(queries), "queries": len(queries)}
+        if "index_type" in candidate or "chunk_compression" in candidate:
+            # resident bytes per chunk for the vectors and the chunk text, reference first
+            for label, rag in (("reference", rags[0]), ("candidate", rags[1])):
+                chunks = rag.code_chunks
+                text = chunks.nbytes() if hasattr(chunks, "nbytes") else sum(sys.getsizeof(chunk) + 8 for chunk in chunks)
+                result[f"{label}_vector_bytes"] = faiss.serialize_index(rag.index).nbytes / rag.index.ntotal
+                result[f"{label}_text_bytes"] = text / len(chunks)
+        self.results[name] = result
+        logger.info(f"{name}: {result}")
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    BenchModel.tokenizer_override = args.tokenizer
+    BenchPipeline.embedding_model = args.embedding_model
+    runner = BenchmarkRunner(args.repeat)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    largest = make_corpus(max(sizes))
+    sample = largest[0]
+
+    runner.bench("chunking.rag_splitter", lambda: [chunk_file(f) for f in largest])
+
+    backends = args.embedding_backends.split(",")
+    for size in sizes:
+        corpus = largest[:size]
+        for backend in backends:
+            # torch keeps the plain names so older baselines still compare
+            suffix = f"[{size}]" if backend == "torch" else f"[{size},{backend}]"
+            runner.bench(f"rag.ingest{suffix}", lambda rag: rag.embed_code(corpus, batch_size=args.batch_size),
+                         setup=lambda backend=backend: RAG(model_name=args.embedding_model, index_path=None, backend=backend))
+
+            def retrieval_setup(corpus: List[Dict[str, str]] = corpus, backend: str = backend) -> RAG:
+                rag = RAG(model_name=args.embedding_model, index_path=None, backend=backend)
+                rag.embed_code(corpus, batch_size=args.batch_size)
+                return rag
+            runner.bench(f"rag.retrieve{suffix}",
+                         lambda rag: [rag.retrieve_context(f"SQL injection in find{i}", k=5) for i in range(args.queries)],
+                         setup=retrieval_setup)
+
+    # how often another backend retrieves the same chunks as torch on the largest corpus
+    for backend in backends:
+        if backend != "torch":
+            runner.agreement(f"rag.agreement[{backend}]", largest, args, backend=backend)
+
+    # compressed vectors (reranked on exact ones) and compressed chunk text against the flat index
+    for index_type in args.index_types.split(","):
+        runner.agreement(f"rag.storage[{index_type}]", largest, args, index_type=index_type, chunk_compression="zstd")
+
+    # many sessions querying at once, each encoding alone versus batched by the shared executor
+    queries = [f"SQL injection in find{i}" for i in range(args.queries * args.concurrency)]
+    for use_executor in (False, True):
+        name = "executor" if use_executor else "direct"
+
+        def concurrent_queries(rag: RAG) -> None:
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                list(pool.map(lambda query: rag.encode([query]), queries))
+        runner.bench(f"rag.concurrent_queries[{name}]", concurrent_queries,
+                     setup=lambda use_executor=use_executor: RAG(model_name=args.embedding_model, index_path=None, use_executor=use_executor))
+
+    with MockLLMServer(latency=args.latency, tokens_per_second=args.tokens_per_second, num_faults=args.faults) as server:
+        os.environ["LOCAL_LLM_BASE_URL"] = server.url
+
+        def new_pipeline() -> BenchPipeline:
+            return BenchPipeline(sample["filename"], sample["content"], checkpoint_dir=None, index_path=None, num_candidates=args.candidates)
+
+        def staged(*stages: str) -> Callable[[], BenchPipeline]:
+            # a fresh pipeline with the earlier stages already run
+            def setup() -> BenchPipeline:
+                pipeline = new_pipeline()
+                for stage in stages:
+                    getattr(pipeline, stage)()
+                return pipeline
+            return setup
+
+        runner.bench("chunking.fault_localization",
+                     lambda model: FaultLocalization(model, sample["content"]),
+                     setup=lambda: BenchModel("mock-llm", None, "local"))
+        runner.bench("stage.fault_localization", lambda p: p.fault_localization(), setup=staged())
+        runner.bench("stage.pattern_matching", lambda p: p.pattern_matching(), setup=staged("fault_localization"))
+        runner.bench("stage.patch_generation", lambda p: p.patch_generation(), setup=staged("fault_localization", "pattern_matching"))
+        runner.bench("stage.patch_validation", lambda p: p.patch_validation(), setup=staged("fault_localization", "pattern_matching", "patch_generation"))
+        runner.bench("end_to_end", lambda p: p.run_pipline(), setup=new_pipeline)
+        logger.info(f"Mock server requests: {server.request_counts}")
+
+    return runner.results
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    print(f"{'benchmark':<32} {'median (s)':>12} {'baseline (s)':>13} {'change':>9}")
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:<32} {'skipped':>12}")
+            continue
+        if "median" not in result:
+            print(f"{name:<32} " + ", ".join(f"{key} {value:.3f}" if isinstance(value, float) else f"{key} {value}" for key, value in result.items()))
+            continue
+        previous = baseline.get("results", {}).get(name, {}).get("median")
+        if previous:
+            change = result["median"] / previous - 1
+            flag = "  REGRESSION" if change > tolerance else ""
+            print(f"{name:<32} {result['median']:>12.4f} {previous:>13.4f} {change:>+8.1%}{flag}")
+            if flag:
+                regressions.append(name)
+        else:
+            print(f"{name:<32} {result['median']:>12.4f} {'-':>13} {'-':>9}")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline against a local mock LLM server.")
+    parser.add_argument("--sizes", default="10,100,500", help="Comma separated corpus sizes for the RAG benchmarks.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=20, help="Retrieval queries per RAG retrieval run.")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8, help="Threads issuing queries in the concurrent embedding benchmark.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock server seconds per request.")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Mock server generation speed, 0 disables.")
+    parser.add_argument("--faults", type=int, default=2, help="Faults in the mock localization.")
+    parser.add_argument("--candidates", type=int, default=1, help="Patch candidates per pipeline run.")
+    parser.add_argument("--tokenizer", help="Tokenizer name or local path, defaults to the mock-llm config.")
+    parser.add_argument("--embedding-model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--index-types", default="fp16,sq8,pq", help="Comma separated compressed index types to compare with flat.")
+    parser.add_argument("--embedding-backends", default="torch,onnx", help="Comma separated RAG embedding backends to compare.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a result is flagged.")
+    parser.add_argument("--output", help="Also write the raw results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("baseline", "save_baseline", "output")},
+        "results": results,
+    }
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+
+    for path in filter(None, [args.output, args.baseline if args.save_baseline else None]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote results to {path}")
+
+    return 1 if regressions and not args.save_baseline else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+import time
+import uuid
+import queue
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# states a job can end in, anything else is still queued or running
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a job once it was asked to stop. Like asyncio.CancelledError it is not an
+    Exception, so stage code that logs and carries on after a failed call still unwinds.
+    """
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when every worker is busy and the queue has no room left."""
+
+# the job running on this thread, copied into the executors stages fan out to
+_current_job: contextvars.ContextVar[Optional["Job"]] = contextvars.ContextVar("current_job", default=None)
+
+def current_job() -> Optional["Job"]:
+    return _current_job.get()
+
+def raise_if_cancelled() -> None:
+    # called before every model call, outside a job it does nothing
+    job = _current_job.get()
+    if job is not None and job.cancel_requested:
+        raise JobCancelled(job.id)
+
+class Job:
+    def __init__(self, func: Callable[..., Any], args: tuple, kwargs: Dict[str, Any], name: Optional[str] = None) -> None:
+        self.id = uuid.uuid4().hex
+        self.name = name or getattr(func, "__name__", "job")
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.state = "queued"
+        # (stage, status, details) in the order they were reported
+        self.events: List[Dict[str, Any]] = []
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def cancel(self) -> bool:
+        """Ask the job to stop. A queued job never starts, a running one stops at its next model call or stage."""
+        with self._lock:
+            if self.is_finished:
+                return False
+            self._cancel.set()
+            if self.state == "queued":
+                self._finish("cancelled")
+        return True
+
+    def report(self, stage: str, status: str, **details: Any) -> None:
+        """Record a progress event, then stop here if the job was cancelled in the meantime."""
+        with self._lock:
+            self.events.append({"stage": stage, "status": status, "time": time.time(), **details})
+        raise_if_cancelled()
+
+    def progress(self) -> Dict[str, str]:
+        # latest status per stage, in the order stages were first reported
+        stages: Dict[str, str] = {}
+        with self._lock:
+            for event in self.events:
+                stages[event["stage"]] = event["status"]
+        return stages
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def _finish(self, state: str, result: Any = None, error: Optional[str] = None) -> None:
+        self.state = state
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+        self._done.set()
+
+    def _run(self, on_start: Optional[Callable[[], None]] = None) -> None:
+        with self._lock:
+            if self.is_finished:
+                # cancelled while it was waiting in the queue
+                return
+            self.state = "running"
+            self.started = time.time()
+        if on_start is not None:
+            on_start()
+        token = _current_job.set(self)
+        try:
+            result = self.func(self, *self.args, **self.kwargs)
+        except JobCancelled:
+            logger.info(f"Job {self.id} ({self.name}) cancelled")
+            with self._lock:
+                self._finish("cancelled")
+        except Exception as e:
+            logger.error(f"Job {self.id} ({self.name}) failed: {str(e)}")
+            with self._lock:
+                self._finish("failed", error=str(e))
+        else:
+            with self._lock:
+                self._finish("done", result=result)
+        finally:
+            _current_job.reset(token)
+
+class JobQueue:
+    """
+    Runs submitted functions on a fixed pool of worker threads, each called with its Job as
+    the first argument so it can report progress. At most max_pending jobs wait for a
+    worker, past that submit raises QueueFull instead of letting work pile up. Finished
+    jobs are kept, oldest dropped first, so a client can still collect a result it polled
+    for late.
+    """
+    def __init__(self, workers: int = 2, max_pending: int = 16, max_finished: int = 100, name: str = "jobs") -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.name = name
+        # unbounded, capacity is counted from the jobs still queued so a cancelled one frees its place
+        self._pending: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        # signalled whenever a job leaves the queued state
+        self._room = threading.Condition(self._lock)
+
+    def _start_workers(self) -> None:
+        # workers start with the first job, so importing the service costs no threads
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self) -> None:
+        while True:
+            job = self._pending.get()
+            try:
+                if job is None:
+                    return
+                job._run(on_start=self._notify_room)
+            finally:
+                self._pending.task_done()
+                self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job_id]
+
+    def _notify_room(self) -> None:
+        with self._room:
+            self._room.notify_all()
+
+    def _queued(self) -> int:
+        # callers hold _lock
+        return sum(1 for job in self._jobs.values() if job.state == "queued")
+
+    def submit(self, func: Callable[..., Any], *args: Any, name: Optional[str] = None, timeout: float = 0, **kwargs: Any) -> Job:
+        """Queue func(job, *args, **kwargs). Waits up to timeout seconds for room, then raises QueueFull."""
+        self._start_workers()
+        job = Job(func, args, kwargs, name)
+        with self._room:
+            if not self._room.wait_for(lambda: self._queued() < self.max_pending, timeout=max(0, timeout)):
+                logger.warning(f"Rejecting {job.name}, {self.max_pending} jobs already waiting")
+                raise QueueFull(f"{self.max_pending} jobs are already waiting, try again shortly")
+            self._jobs[job.id] = job
+            self._pending.put(job)
+        logger.info(f"Queued job {job.id} ({job.name})")
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def cancel(self, job_id: Optional[str]) -> bool:
+        job = self.get(job_id)
+        if job is None or not job.cancel():
+            return False
+        # a cancelled queued job stays in _pending until a worker skips it, but no longer takes up room
+        self._notify_room()
+        return True
+
+    def position(self, job_id: str) -> Optional[int]:
+        # 1 is next to start, None once the job left the queue
+        with self._lock:
+            queued = [job for job in self._jobs.values() if job.state == "queued"]
+        for i, job in enumerate(queued):
+            if job.id == job_id:
+                return i + 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        return {state: states.count(state) for state in ("queued", "running", *FINISHED_STATES)}
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Cancel everything still queued or running and stop the workers."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+            threads, self._threads = self._threads, []
+        for job in jobs:
+            job.cancel()
+        for _ in threads:
+            self._pending.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,64 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, Hashable, TypeVar
+
+from backend.source.telemetry.tracing import tracer
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution: the first caller runs the
+    function and everyone who arrives while it is in flight gets the same result or
+    exception. Nothing is cached once the call finishes.
+    """
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.executed = 0
+        self.coalesced = 0
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            logger.debug(f"Joining in-flight {self.name} request")
+            with tracer.span(f"{self.name}.coalesced", coalesced=1):
+                return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+# shared by every Model and RAG in the process
+llm_flights = SingleFlight("llm")
+embedding_flights = SingleFlight("embedding")
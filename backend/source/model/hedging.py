@@ -0,0 +1,226 @@
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, List, Callable, Awaitable, Tuple, TypeVar, Deque, Coroutine
+
+from backend.source.telemetry.tracing import tracer
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class LatencyTracker:
+    def __init__(self, window: int = 200) -> None:
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key: str, percentile: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures so callers route around the
+    provider, then lets a single trial request through once reset_timeout has passed.
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit for {self.name} closed")
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                # a failed trial re-opens the circuit for another timeout
+                self.opened_at = time.monotonic()
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+
+    def release(self) -> None:
+        # an attempt that was cancelled says nothing about the provider
+        with self._lock:
+            self._trial_in_flight = False
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name: str, config: Optional[Dict[str, Any]] = None) -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, **(config or {}))
+        return _breakers[name]
+
+# process wide latency history, keyed by provider and model
+latencies = LatencyTracker()
+
+class EventLoopThread:
+    # one long-lived loop so async clients and their connection pools survive between calls
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="llm-event-loop", daemon=True).start()
+            return self._loop
+
+    def submit(self, coroutine: Coroutine[Any, Any, T]) -> "Future[T]":
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        future = self.submit(coroutine)
+        try:
+            return future.result()
+        except BaseException:
+            # the caller is gone (e.g. interrupted), don't leave the request running
+            future.cancel()
+            raise
+
+event_loop = EventLoopThread()
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+# set by hedged for each attempt it launches, resolved with the loop time once the attempt is sent
+_sent: contextvars.ContextVar[Optional["asyncio.Future[float]"]] = contextvars.ContextVar("hedge_sent", default=None)
+
+def mark_sent() -> None:
+    # called by an attempt as its request goes out, later calls (e.g. retries) are ignored
+    sent = _sent.get()
+    if sent is not None and not sent.done():
+        sent.set_result(asyncio.get_running_loop().time())
+
+async def hedged(attempts: List[Callable[[], Awaitable[T]]], delay: Optional[float], max_hedges: int = 1, hedge_with_fallbacks: bool = False, context: Optional[contextvars.Context] = None, clock_from_send: bool = False) -> Tuple[T, int]:
+    """
+    Start attempts[0] and, if it hasn't answered after delay seconds, send a hedge: a
+    duplicate of the running attempt, or the next fallback when hedge_with_fallbacks is
+    set, up to max_hedges times. A failed attempt fails over to the next fallback straight
+    away. The first success wins and everything still running is cancelled. Returns the
+    result and the index of the attempt that produced it.
+
+    With clock_from_send the delay is counted from when the latest attempt called
+    mark_sent() instead of from its launch, so time spent queued in a rate limiter does
+    not trigger a hedge that would only queue behind it.
+    """
+    if not attempts:
+        raise ValueError("At least one attempt is required.")
+    loop = asyncio.get_running_loop()
+    tasks: Dict["asyncio.Task[T]", int] = {}
+    next_index = 0
+    current = 0
+    hedges = 0
+    last_error: Optional[BaseException] = None
+    # resolved with the time the most recently launched attempt was sent
+    sent: "asyncio.Future[float]" = loop.create_future()
+
+    def launch(index: int) -> None:
+        nonlocal sent
+        sent = loop.create_future()
+        if not clock_from_send:
+            sent.set_result(loop.time())
+        # each attempt gets its own copy so it resolves its own future, spans are shared by reference
+        attempt_context = (context if context is not None else contextvars.copy_context()).copy()
+        attempt_context.run(_sent.set, sent)
+        tasks[loop.create_task(attempts[index](), context=attempt_context)] = index
+
+    def launch_next() -> None:
+        nonlocal next_index, current
+        current = next_index
+        next_index += 1
+        launch(current)
+
+    launch_next()
+    try:
+        while tasks:
+            can_hedge = hedges < max_hedges and delay is not None
+            waiting: List["asyncio.Future[Any]"] = list(tasks)
+            timeout = None
+            if can_hedge and sent.done():
+                timeout = max(0.0, sent.result() + delay - loop.time())
+            elif can_hedge:
+                # the hedge clock starts once the attempt gets past the limiter
+                waiting.append(sent)
+            done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            done.discard(sent)
+            if not done and timeout is None:
+                continue
+            if not done:
+                hedges += 1
+                logger.info(f"No response after {delay:.1f}s, sending hedged request {hedges}")
+                if context is not None:
+                    context.run(tracer.add, hedges=hedges)
+                if hedge_with_fallbacks and next_index < len(attempts):
+                    launch_next()
+                else:
+                    launch(current)
+                continue
+            for task in done:
+                index = tasks.pop(task)
+                if task.exception() is None:
+                    return task.result(), index
+                last_error = task.exception()
+                logger.warning(f"Attempt on target {index + 1} failed: {str(last_error)}")
+            # fail over to an untried target, the limiter has already retried this one
+            if next_index < len(attempts):
+                launch_next()
+        assert last_error is not None
+        raise last_error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -1,12 +1,26 @@
-from transformers import AutoTokenizer
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple, List, Callable
+import re
 import json
+import hashlib
 import os
+import time
+import asyncio
 import logging
+import threading
+import functools
+import contextvars
 from pathlib import Path
-import litellm
 from dotenv import load_dotenv
 
+from backend.source.telemetry.tracing import tracer
+from backend.source.model.rate_limiter import get_limiter, is_retryable
+from backend.source.model.hedging import CircuitOpenError, event_loop, get_breaker, hedged, latencies, mark_sent
+from backend.source.concurrency.singleflight import llm_flights
+from backend.source.concurrency.job_queue import raise_if_cancelled
+from backend.source.model_server.client import RemoteTokenizer, get_client
+from backend.source.model.token_counter import TokenCounter
+from backend.source.model.prompt_template import ChatPrompt
+
 #litellm.set_verbose=True
 
 # Configure logging
@@ -16,6 +30,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# tokenizers are shared by every Model in the process so repeated pipelines skip the load
+_tokenizer_cache: Dict[str, Any] = {}
+_tokenizer_lock = threading.Lock()
+
+def load_tokenizer(tokenizer_name: str) -> Any:
+    with _tokenizer_lock:
+        if tokenizer_name not in _tokenizer_cache:
+            # transformers (and litellm below) take seconds to import, so only the first use pays for them
+            from transformers import AutoTokenizer
+            _tokenizer_cache[tokenizer_name] = AutoTokenizer.from_pretrained(tokenizer_name)
+            logger.info("Successfully initialized tokenizer")
+        else:
+            logger.debug("Reusing cached tokenizer")
+        return _tokenizer_cache[tokenizer_name]
+
+# sampling settings in a model's config that every call starts from
+SAMPLING_PARAMS = ("temperature", "top_p", "top_k")
+
+# phrases that suggest a routed cheap model was out of its depth
+LOW_CONFIDENCE_PATTERN = re.compile(r"(?i)\b(i'?m not sure|i am not sure|i cannot|i can'?t|unable to (?:determine|identify)|as an ai)\b")
+
 class Model:
     def __init__(self, model: Optional[str], api_key: Optional[str], provider: Optional[str], test: bool = False) -> None:
         logger.info("Initializing Model class")
@@ -47,10 +82,29 @@ class Model:
         try:
             logger.debug("Starting common initialization")
             self.current_config: Dict[str, Any] = self._get_model_config(self.model)
-            self.tokenizer: AutoTokenizer = self.get_tokenizer()
+            self.tokenizer: Any = self.get_tokenizer()
+            # counts are cached by content, so budget checks on a repeated prompt never re-encode it
+            self.token_counter = TokenCounter(self.tokenizer)
             self.client: Dict[str, str] = self.initialize_client()
+            # providers tried in order when hedging or failing over, each with the limiter
+            # it shares with every other Model on the same provider
+            self.targets: List[Dict[str, Any]] = self._build_targets()
+            # per task model overrides, e.g. a cheaper model for consolidation
+            self.routes: Dict[str, Any] = self.current_config.get("routes", {})
+            self._routed_models: Dict[str, "Model"] = {}
+            self._routes_lock = threading.Lock()
             self.max_context: int = self.current_config.get("max_context", 0)
             self.max_response: int = self.current_config.get("max_response", 0)
+            # tokens of retrieved code a prompt may carry, None keeps every retrieved chunk
+            self.context_budget: Optional[int] = self.current_config.get("context_budget")
+            # per task max_tokens, stop sequences and sampling, the model's own config overriding the shared one
+            self.generation_profiles: Dict[str, Dict[str, Any]] = self._load_generation_profiles()
+            # running token usage reported by the provider across this model's calls
+            self.usage: Dict[str, int] = {"prompt_tokens": 0, "completion_tokens": 0}
+            # per task: calls, calls cut off at max_tokens, prompt tokens and how many of them were a
+            # static system prefix (counted locally) or served from the provider's prompt cache
+            self.task_usage: Dict[str, Dict[str, int]] = {}
+            self._usage_lock = threading.Lock()
             logger.debug(f"Initialized with max_context: {self.max_context}, max_response: {self.max_response}")
         except Exception as e:
             logger.error(f"Error during model initialization: {str(e)}")
@@ -82,77 +136,298 @@ class Model:
         logger.debug("Successfully retrieved model configuration")
         return self.model_configs["models"][model]
 
-    def get_tokenizer(self) -> AutoTokenizer:
+    def get_tokenizer(self) -> Any:
         logger.debug("Initializing tokenizer")
+        tokenizer_name = self.current_config.get("tokenizer") or "meta-llama/Meta-Llama-3-8B-Instruct"
         try:
-            tokenizer = AutoTokenizer.from_pretrained("meta-llama/Meta-Llama-3-8B-Instruct") # needs to change
-            logger.info("Successfully initialized tokenizer")
-            return tokenizer
+            # with a model server running the tokenizer lives there, shared by every worker
+            client = get_client()
+            if client is not None:
+                return RemoteTokenizer(tokenizer_name, client)
+            return load_tokenizer(tokenizer_name)
         except Exception as e:
             logger.error(f"Failed to initialize tokenizer: {str(e)}")
             raise RuntimeError(f"Failed to initialize tokenizer: {str(e)}")
 
+    def _load_generation_profiles(self) -> Dict[str, Dict[str, Any]]:
+        profiles = {task: dict(profile) for task, profile in self.model_configs.get("generation_profiles", {}).items()}
+        for task, profile in self.current_config.get("generation_profiles", {}).items():
+            profiles.setdefault(task, {}).update(profile)
+        return profiles
+
+    def generation_params(self, task: Optional[str] = None, temperature: Optional[float] = None) -> Dict[str, Any]:
+        # the model's sampling settings, then the default profile, then the task's, an explicit temperature wins
+        params: Dict[str, Any] = {name: self.current_config[name] for name in SAMPLING_PARAMS if self.current_config.get(name) is not None}
+        if self.max_response:
+            params["max_tokens"] = self.max_response
+        params.update(self.generation_profiles.get("default", {}))
+        if task:
+            params.update(self.generation_profiles.get(task, {}))
+        if temperature is not None:
+            params["temperature"] = temperature
+        # a profile can tighten the response window, never widen it
+        if self.max_response and params.get("max_tokens"):
+            params["max_tokens"] = min(params["max_tokens"], self.max_response)
+        return {name: value for name, value in params.items() if value is not None}
+
+    def _provider_configs(self) -> Dict[str, Dict[str, str]]:
+        return {
+            "openrouter": {"base_url": "https://openrouter.ai/api/v1", "model_prefix": "openrouter/", "api_key_env": "OPENROUTER_API_KEY"},
+            "fireworks": {"base_url": "https://api.fireworks.ai/inference/v1", "model_prefix": "fireworks_ai/", "api_key_env": "FIREWORKS_API_KEY"},
+            "openai": {"base_url": "https://api.openai.com/v1", "model_prefix": "", "api_key_env": "OPENAI_API_KEY"},
+            "huggingface": {"base_url": "https://api-inference.huggingface.co/models", "model_prefix": "huggingface/", "api_key_env": "HUGGINGFACE_API_KEY"},
+            # any OpenAI-compatible server, e.g. backend/benchmarks/mock_llm_server.py
+            "local": {"base_url": os.getenv("LOCAL_LLM_BASE_URL", "http://127.0.0.1:8089/v1"), "model_prefix": "openai/", "api_key_env": "LOCAL_LLM_API_KEY"}
+        }
+
     def initialize_client(self) -> Dict[str, str]:
         logger.debug(f"Initializing client for provider: {self.provider}")
-        provider_configs: Dict[str, Dict[str, str]] = {
-            "openrouter": {"base_url": "https://openrouter.ai/api/v1", "model_prefix": "openrouter/"},
-            "fireworks": {"base_url": "https://api.fireworks.ai/inference/v1", "model_prefix": "fireworks_ai/"},
-            "openai": {"base_url": "https://api.openai.com/v1", "model_prefix": ""},
-            "huggingface": {"base_url": "https://api-inference.huggingface.co/models", "model_prefix": "huggingface/"}
-        }
+        provider_configs = self._provider_configs()
 
         if self.provider not in provider_configs:
             logger.error(f"Unsupported provider: {self.provider}")
             raise ValueError(f"Unsupported provider: {self.provider}")
 
         config = provider_configs[self.provider]
+        import litellm
         litellm.api_key = self.api_key
         logger.info(f"Successfully initialized client for provider: {self.provider}")
         
         return {
-            "api_key": self.api_key,
+            # the openai client refuses an empty key even when the server ignores it
+            "api_key": self.api_key or ("local" if self.provider == "local" else ""),
             "base_url": config["base_url"],
             "model_prefix": config["model_prefix"]
         }
 
-    def generate_response(self, prompt: str) -> str:
+    def _target(self, model: str, provider: str, api_key: str) -> Dict[str, Any]:
+        config = self._provider_configs()[provider]
+        return {
+            "model": model,
+            "provider": provider,
+            "formatted_model": f"{config['model_prefix']}{model}",
+            "api_key": api_key or ("local" if provider == "local" else ""),
+            "params": {"api_base": config["base_url"]} if provider == "local" else {},
+            "limiter": get_limiter(provider, self.model_configs.get("rate_limits", {}).get(provider)),
+        }
+
+    def _build_targets(self) -> List[Dict[str, Any]]:
+        # the selected model first, then the fallbacks listed in its config
+        targets = [self._target(self.model, self.provider, self.client["api_key"])]
+        for name in self.current_config.get("fallbacks", []):
+            config = self.model_configs.get("models", {}).get(name)
+            if config is None or config.get("provider") not in self._provider_configs():
+                logger.warning(f"Ignoring unknown fallback model: {name}")
+                continue
+            provider = config["provider"]
+            api_key = self.api_key if provider == self.provider else os.getenv(self._provider_configs()[provider]["api_key_env"], "")
+            targets.append(self._target(name, provider, api_key))
+        return targets
+
+    def hedge_delay(self) -> Optional[float]:
+        # wait this long for the primary before sending a hedge, None never hedges
+        config = self.model_configs.get("hedging", {})
+        if not config.get("enabled", True):
+            return None
+        delay = latencies.percentile(f"{self.provider}/{self.model}", config.get("percentile", 95), config.get("min_samples", 20))
+        if delay is None:
+            delay = config.get("initial_delay")
+        if delay is None:
+            return None
+        return min(max(delay, config.get("min_delay", 0.0)), config.get("max_delay", delay))
+
+    def route_for(self, task: Optional[str]) -> Optional[Dict[str, Any]]:
+        # a route only matters when it points at a different model
+        route = self.routes.get(task) if task else None
+        if not route or not route.get("model") or route["model"] == self.model:
+            return None
+        return route
+
+    def _routed_model(self, name: str) -> "Model":
+        with self._routes_lock:
+            if name not in self._routed_models:
+                provider = self._get_model_config(name)["provider"]
+                api_key = self.api_key if provider == self.provider else os.getenv(self._provider_configs()[provider]["api_key_env"], "")
+                routed = type(self)(name, api_key, provider)
+                # usage is reported on the model the pipeline holds
+                routed.usage = self.usage
+                routed.task_usage = self.task_usage
+                routed._usage_lock = self._usage_lock
+                self._routed_models[name] = routed
+            return self._routed_models[name]
+
+    def is_confident(self, response: str, route: Dict[str, Any]) -> bool:
+        if len(response.strip()) < route.get("min_chars", 1):
+            return False
+        # an odd number of fences means the answer was cut off inside a code block
+        if response.count("```") % 2:
+            return False
+        return LOW_CONFIDENCE_PATTERN.search(response) is None
+
+    def generate_response(self, prompt: str, temperature: Optional[float] = None, task: Optional[str] = None, validate: Optional[Callable[[str], bool]] = None) -> str:
+        route = self.route_for(task)
+        if route is None:
+            return self._generate(prompt, temperature, task)
+
+        # prompts past the route's size limit count as hard and skip the cheap model
+        max_prompt_tokens = route.get("max_prompt_tokens")
+        if max_prompt_tokens and self.get_token_count(prompt) > max_prompt_tokens:
+            logger.info(f"Prompt for {task} exceeds {max_prompt_tokens} tokens, using {self.model}")
+            return self._generate(prompt, temperature, task)
+
+        with tracer.span("llm.route", task=task, model=route["model"]) as span:
+            response: Optional[str] = None
+            try:
+                response = self._routed_model(route["model"])._generate(prompt, temperature, task)
+            except Exception as e:
+                logger.warning(f"Routed model {route['model']} failed for {task}: {str(e)}")
+            if response is not None and self.is_confident(response, route) and (validate is None or validate(response)):
+                span.set(escalated=False)
+                return response
+
+            logger.info(f"Escalating {task} from {route['model']} to {self.model}")
+            span.set(escalated=True)
+            return self._generate(prompt, temperature, task)
+
+    def _generate(self, prompt: str, temperature: Optional[float] = None, task: Optional[str] = None) -> str:
+        # a cancelled job stops before its next call, the one in flight is left to finish
+        raise_if_cancelled()
+        # an explicit temperature means the caller wants independent samples, those are never shared
+        if temperature is not None:
+            return self._complete(prompt, temperature, task)
+        params = json.dumps(self.generation_params(task), sort_keys=True)
+        key = (self.provider, self.model, hashlib.sha256(prompt.encode("utf-8")).hexdigest(), params)
+        return llm_flights.do(key, lambda: self._complete(prompt, task=task))
+
+    def _complete(self, prompt: str, temperature: Optional[float] = None, task: Optional[str] = None) -> str:
         logger.debug("Starting response generation")
         if not self.client:
             logger.error("Missing client configuration")
-            return "Error: Client configuration is required."
+            raise ValueError("Client configuration is required.")
         
+        params = self.generation_params(task, temperature)
+
+        # the token bucket is only worth a tokenizer pass when a provider that may serve the call limits tokens
+        estimated_tokens = self.get_token_count(prompt) if any(target["limiter"].tokens is not None for target in self.targets) else 0
+        # the system message is the same on every call of a stage, so its count comes from the cache
+        prefix_tokens = self.get_token_count(prompt.system) if isinstance(prompt, ChatPrompt) else 0
+        hedging = self.model_configs.get("hedging", {})
+
         try:
-            formatted_model = f"{self.client['model_prefix']}{self.model}"
-            logger.debug(f"Using formatted model name: {formatted_model}")
-            
             logger.debug("Sending completion request to model")
-            response = litellm.completion(
-                model=formatted_model,
-                messages=[{"role": "user", "content": prompt}],
-                api_key=self.client["api_key"]
-            )
-            
-            result = response.choices[0].message.content if response.choices else ""
-            if result:
-                logger.info("Successfully generated response")
-            else:
-                logger.warning("Generated empty response")
-            return result
-            
+            with tracer.span("llm.generate", model=self.model, provider=self.provider, task=task) as span:
+                attempts = [functools.partial(self._acomplete, target, prompt, params, estimated_tokens) for target in self.targets]
+                # attempts run on the shared event loop so a losing hedge can actually be cancelled
+                response, winner = event_loop.run(hedged(
+                    attempts,
+                    self.hedge_delay(),
+                    max_hedges=hedging.get("max_hedges", 1),
+                    hedge_with_fallbacks=hedging.get("hedge_with_fallbacks", False),
+                    context=contextvars.copy_context(),
+                    clock_from_send=True
+                ))
+                if winner > 0:
+                    span.set(served_by=self.targets[winner]["model"])
+                prompt_tokens, completion_tokens = self._record_usage(response)
+                self.targets[winner]["limiter"].settle(estimated_tokens, prompt_tokens + completion_tokens)
+                finish_reason = response.choices[0].finish_reason if response.choices else None
+                cached_tokens = self._cached_tokens(response)
+                span.set(prefix_tokens=prefix_tokens, cached_tokens=cached_tokens)
+                if self._record_task(task, finish_reason == "length", prompt_tokens, prefix_tokens, cached_tokens):
+                    span.set(capped=1)
+                    logger.warning(f"Response for {task or 'untagged call'} hit max_tokens ({params.get('max_tokens')})")
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
-            return f"Error: {str(e)}"
+            raise
+
+        result = response.choices[0].message.content if response.choices else ""
+        if result:
+            logger.info("Successfully generated response")
+        else:
+            logger.warning("Generated empty response")
+        return result
+
+    async def _acomplete(self, target: Dict[str, Any], prompt: str, params: Dict[str, Any], estimated_tokens: int) -> Any:
+        breaker = get_breaker(target["provider"], self.model_configs.get("circuit_breaker"))
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit for {target['provider']} is open")
+        key = f"{target['provider']}/{target['model']}"
+        import litellm
+
+        async def send() -> Any:
+            # the limiter let the call through, start the hedge clock
+            mark_sent()
+            sent = time.monotonic()
+            # retries are handled by the limiter, not the client
+            response = await litellm.acompletion(
+                model=target["formatted_model"],
+                messages=prompt.messages if isinstance(prompt, ChatPrompt) else [{"role": "user", "content": prompt}],
+                api_key=target["api_key"],
+                max_retries=0,
+                # sampling settings a provider doesn't support (e.g. top_k on OpenAI) are left out
+                drop_params=True,
+                **target["params"],
+                **params
+            )
+            latencies.record(key, time.monotonic() - sent)
+            return response
+
+        try:
+            response = await target["limiter"].aexecute(send, estimated_tokens)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            if is_retryable(e):
+                breaker.record_failure()
+            else:
+                breaker.release()
+            raise
+        breaker.record_success()
+        return response
+
+    def _record_usage(self, response: Any) -> Tuple[int, int]:
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return 0, 0
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        tracer.add(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        with self._usage_lock:
+            self.usage["prompt_tokens"] += prompt_tokens
+            self.usage["completion_tokens"] += completion_tokens
+        return prompt_tokens, completion_tokens
+
+    def _cached_tokens(self, response: Any) -> int:
+        # prompt tokens the provider served from its prefix cache, where it reports them
+        details = getattr(getattr(response, "usage", None), "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0)
+        return cached if isinstance(cached, int) else 0
+
+    def _record_task(self, task: Optional[str], capped: bool, prompt_tokens: int = 0, prefix_tokens: int = 0, cached_tokens: int = 0) -> bool:
+        with self._usage_lock:
+            counts = self.task_usage.setdefault(task or "default", {"calls": 0, "capped": 0, "prompt_tokens": 0, "prefix_tokens": 0, "cached_tokens": 0})
+            counts["calls"] += 1
+            counts["capped"] += int(capped)
+            counts["prompt_tokens"] += prompt_tokens
+            counts["prefix_tokens"] += prefix_tokens
+            counts["cached_tokens"] += cached_tokens
+        return capped
 
     def get_token_count(self, text: str) -> int:
         logger.debug("Calculating token count")
         try:
-            count = len(self.tokenizer.encode(text))
+            count = self.token_counter.count(text)
             logger.debug(f"Token count: {count}")
             return count
         except Exception as e:
             logger.error(f"Error calculating token count: {str(e)}")
             raise
 
+    def get_token_counts(self, texts: List[str]) -> List[int]:
+        # one batched tokenizer call for everything not counted before
+        return self.token_counter.count_many(texts)
+
     def is_within_context_window(self, text: str) -> bool:
         logger.debug("Checking if text is within context window")
         try:
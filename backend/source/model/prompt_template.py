@@ -0,0 +1,49 @@
+import logging
+from typing import Any, Dict, List, Sequence
+
+from backend.source.model.token_counter import SegmentedPrompt
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# between the two messages when a chat prompt is read as one string
+MESSAGE_SEPARATOR = "\n"
+
+class ChatPrompt(SegmentedPrompt):
+    """
+    A prompt sent as two chat messages, the static instructions as the system message and
+    the code or analysis it is about as the user message. As a string it is both joined, so
+    it hashes, counts and reads like any other prompt, but Model sends the messages apart:
+    the instructions are then an identical prefix on every call a provider can cache.
+    """
+    system: str
+    user: str
+
+    def __new__(cls, system: Sequence[str], user: Sequence[str]) -> "ChatPrompt":
+        prompt = super().__new__(cls, [*system, MESSAGE_SEPARATOR, *user])
+        prompt.system = "".join(system)
+        prompt.user = "".join(user)
+        return prompt
+
+    @property
+    def messages(self) -> List[Dict[str, str]]:
+        return [{"role": "system", "content": self.system}, {"role": "user", "content": self.user}]
+
+class PromptTemplate:
+    """
+    A stage prompt split into static instructions and the variable payload. Values only
+    ever go in the user part, except ones that are the same across a run (e.g. the
+    language), which the system part may use without breaking its prefix.
+    """
+    def __init__(self, system: str, user: str) -> None:
+        self.system = system
+        self.user = user
+
+    def render(self, **values: Any) -> ChatPrompt:
+        system = SegmentedPrompt.from_template(self.system, **values)
+        user = SegmentedPrompt.from_template(self.user, **values)
+        return ChatPrompt(system.segments, user.segments)
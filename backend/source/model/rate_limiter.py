@@ -0,0 +1,210 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Callable, Awaitable, TypeVar
+
+from backend.source.telemetry.tracing import tracer
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# status codes worth retrying, everything else is raised straight away
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        # returns how long to wait before trying again, 0 once the amount has been taken
+        with self._lock:
+            self._refill(time.monotonic())
+            # requests larger than the bucket go through once it is full and leave it in debt
+            needed = min(amount, self.capacity)
+            if self.tokens >= needed:
+                self.tokens -= amount
+                return 0.0
+            return (needed - self.tokens) / self.rate
+
+    def adjust(self, amount: float) -> None:
+        # settle the difference between an estimate and what was actually used
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on in-flight requests: each success adds roughly one slot per window of
+    requests, a throttled or slow response cuts the limit multiplicatively.
+    """
+    def __init__(self, initial: float = 4, minimum: float = 1, maximum: float = 32, decrease: float = 0.5, latency_target: Optional[float] = None) -> None:
+        self.limit = float(initial)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> Optional[float]:
+        # callers poll, waiting is an asyncio sleep in ProviderLimiter.aexecute
+        with self._lock:
+            if self.in_flight >= max(1, int(self.limit)):
+                return None
+            self.in_flight += 1
+            return time.monotonic()
+
+    def abandon(self) -> None:
+        # frees the slot without treating the request as a success or a failure
+        with self._lock:
+            self.in_flight -= 1
+
+    def release(self, started: float, throttled: bool = False) -> None:
+        latency = time.monotonic() - started
+        with self._lock:
+            self.in_flight -= 1
+            slow = self.latency_target is not None and latency > self.latency_target
+            if throttled or slow:
+                # requests already in flight when the limit was cut don't cut it again
+                if started >= self._last_decrease:
+                    factor = self.decrease if throttled else (1 + self.decrease) / 2
+                    self.limit = max(self.minimum, self.limit * factor)
+                    self._last_decrease = time.monotonic()
+                    logger.info(f"Concurrency limit reduced to {self.limit:.2f} ({'throttled' if throttled else f'latency {latency:.1f}s'})")
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+def retry_after(error: BaseException) -> Optional[float]:
+    # Retry-After is either a number of seconds or an HTTP date
+    for headers in (getattr(error, "headers", None), getattr(getattr(error, "response", None), "headers", None), getattr(error, "litellm_response_headers", None)):
+        if not headers:
+            continue
+        try:
+            value = headers.get("retry-after") or headers.get("Retry-After")
+        except AttributeError:
+            continue
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+class ProviderLimiter:
+    """
+    Shared by every Model talking to the same provider: request and token buckets, an
+    adaptive concurrency limit and retries with jittered exponential backoff.
+    """
+    def __init__(self, provider: str, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 initial_concurrency: float = 4, max_concurrency: float = 32, latency_target: Optional[float] = None,
+                 max_retries: int = 5, backoff_base: float = 1.0, backoff_cap: float = 60.0) -> None:
+        self.provider = provider
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, maximum=max_concurrency, latency_target=latency_target)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        # a Retry-After from one request holds back every request to the provider
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        # full jitter, but never sooner than the provider asked for
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        requested = retry_after(error)
+        if requested is not None:
+            delay = max(delay, min(requested, self.backoff_cap))
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    async def aexecute(self, send: Callable[[], Awaitable[T]], estimated_tokens: int = 0) -> T:
+        # every wait is an asyncio sleep so a hedged call can be cancelled while it waits
+        attempt = 0
+        while True:
+            reserved = []
+            try:
+                with self._lock:
+                    pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                for bucket, amount in ((self.requests, 1), (self.tokens, estimated_tokens)):
+                    while bucket is not None and amount:
+                        wait = bucket.reserve(amount)
+                        if wait <= 0:
+                            reserved.append((bucket, amount))
+                            break
+                        await asyncio.sleep(wait)
+                started = self.concurrency.try_acquire()
+                while started is None:
+                    await asyncio.sleep(0.05)
+                    started = self.concurrency.try_acquire()
+            except asyncio.CancelledError:
+                # cancelled before anything was sent, e.g. a losing hedge, so hand back what it took
+                for bucket, amount in reserved:
+                    bucket.adjust(-amount)
+                raise
+
+            try:
+                result = await send()
+            except asyncio.CancelledError:
+                # a cancelled hedge says nothing about the provider
+                self.concurrency.abandon()
+                raise
+            except Exception as e:
+                throttled = getattr(e, "status_code", None) == 429
+                self.concurrency.release(started, throttled=throttled)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt, e)
+                attempt += 1
+                tracer.add(retries=attempt)
+                logger.warning(f"{self.provider} request failed ({str(e)}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            self.concurrency.release(started)
+            return result
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        if self.tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+_limiters: Dict[str, ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(provider: str, config: Optional[Dict[str, Any]] = None) -> ProviderLimiter:
+    # one limiter per provider per process, created from the first config seen
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = ProviderLimiter(provider, **(config or {}))
+            logger.info(f"Created rate limiter for provider {provider} with {config or {}}")
+        return _limiters[provider]
@@ -0,0 +1,105 @@
+import string
+import hashlib
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from backend.source.telemetry.tracing import tracer
+from backend.source.model_server.client import RemoteTokenizer
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=64)
+def _parse(template: str) -> Tuple[Tuple[str, Optional[str], str], ...]:
+    return tuple((literal, field, spec or "") for literal, field, spec, _ in string.Formatter().parse(template))
+
+class SegmentedPrompt(str):
+    """
+    A prompt that remembers the pieces it was joined from. It is an ordinary string to
+    everything else, but TokenCounter counts it piece by piece, so the static parts of a
+    template are tokenized once and only the values that change are tokenized again.
+    """
+    segments: Tuple[str, ...]
+
+    def __new__(cls, segments: Sequence[str]) -> "SegmentedPrompt":
+        prompt = super().__new__(cls, "".join(segments))
+        prompt.segments = tuple(segment for segment in segments if segment)
+        return prompt
+
+    @classmethod
+    def from_template(cls, template: str, **values: Any) -> "SegmentedPrompt":
+        # same result as template.format(**values), keeping the literal text and the values apart
+        segments: List[str] = []
+        for literal, field, spec in _parse(template):
+            segments.append(literal)
+            if field is not None:
+                segments.append(format(values[field], spec))
+        return cls(segments)
+
+class TokenCounter:
+    """
+    Token counts cached by content hash. A SegmentedPrompt is counted as the sum of its
+    segments plus the tokenizer's special tokens, which can be off by a token or two where
+    a segment boundary splits what would otherwise merge, so use it for budgets, not billing.
+    Texts missing from the cache are tokenized together with the fast tokenizer's batch call.
+    """
+    def __init__(self, tokenizer: Any, maxsize: int = 4096) -> None:
+        self.tokenizer = tokenizer
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._counts: "OrderedDict[Tuple[bool, bytes], int]" = OrderedDict()
+        self._special_tokens: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        segments = getattr(text, "segments", None)
+        if segments:
+            return self.special_tokens() + sum(self.count_many(segments, add_special_tokens=False))
+        return self.count_many([text])[0]
+
+    def special_tokens(self) -> int:
+        # what the tokenizer adds around any text, e.g. the BOS token
+        if self._special_tokens is None:
+            self._special_tokens = self._encode_counts([""], True)[0]
+        return self._special_tokens
+
+    def count_many(self, texts: Sequence[str], add_special_tokens: bool = True) -> List[int]:
+        keys = [(add_special_tokens, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()) for text in texts]
+        counts: Dict[Tuple[bool, bytes], int] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._counts:
+                    self._counts.move_to_end(key)
+                    counts[key] = self._counts[key]
+            missing = {key: text for key, text in zip(keys, texts) if key not in counts}
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            with tracer.span("tokenizer.count", texts=len(missing)):
+                encoded = self._encode_counts(list(missing.values()), add_special_tokens)
+            with self._lock:
+                for key, count in zip(missing, encoded):
+                    counts[key] = count
+                    self._counts[key] = count
+                while len(self._counts) > self.maxsize:
+                    self._counts.popitem(last=False)
+        return [counts[key] for key in keys]
+
+    def _encode_counts(self, texts: List[str], add_special_tokens: bool) -> List[int]:
+        if isinstance(self.tokenizer, RemoteTokenizer):
+            # only the counts cross the socket, not the ids
+            return self.tokenizer.client.count_tokens(self.tokenizer.name, texts, add_special_tokens)
+        if len(texts) == 1:
+            return [len(self.tokenizer.encode(texts[0], add_special_tokens=add_special_tokens))]
+        return [len(ids) for ids in self.tokenizer(texts, add_special_tokens=add_special_tokens)["input_ids"]]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._counts)}
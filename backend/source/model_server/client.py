@@ -0,0 +1,130 @@
+import os
+import socket
+import logging
+import threading
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+
+from backend.source.model_server.protocol import ConnectionClosed, ModelServerError, send_message, recv_message, unpack_array
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class ModelServerClient:
+    # one connection per thread, the server handles each connection on its own thread
+    def __init__(self, socket_path: str, timeout: Optional[float] = 300.0) -> None:
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def call(self, method: str, **params: Any) -> Tuple[Dict[str, Any], bytes]:
+        # a connection left over from a restarted server is retried once on a fresh one
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None)
+            fresh = sock is None
+            sent = False
+            try:
+                if fresh:
+                    sock = self._local.sock = self._connect()
+                send_message(sock, {"method": method, **params})
+                sent = True
+                header, body = recv_message(sock)
+                break
+            except socket.timeout as e:
+                # the server is busy, not gone, sending the call again would only queue behind it
+                self.close()
+                raise ModelServerError(f"Model server at {self.socket_path} did not answer within {self.timeout}s") from e
+            except OSError as e:
+                self.close()
+                # only a connection that was dropped before the server replied is worth a retry
+                dropped = isinstance(e, ConnectionClosed) or (isinstance(e, ConnectionError) and not sent)
+                if fresh or attempt or not dropped:
+                    raise ModelServerError(f"Model server at {self.socket_path} is unavailable: {str(e)}") from e
+                logger.debug("Model server connection dropped, reconnecting")
+        if "error" in header:
+            raise ModelServerError(header["error"])
+        return header, body
+
+    def ping(self) -> Dict[str, Any]:
+        return self.call("ping")[0]
+
+    def count_tokens(self, tokenizer: str, texts: List[str], add_special_tokens: bool = True) -> List[int]:
+        return self.call("count_tokens", tokenizer=tokenizer, texts=texts, add_special_tokens=add_special_tokens)[0]["counts"]
+
+    def encode(self, tokenizer: str, texts: List[str], add_special_tokens: bool = True) -> List[List[int]]:
+        return self.call("encode", tokenizer=tokenizer, texts=texts, add_special_tokens=add_special_tokens)[0]["input_ids"]
+
+    def decode(self, tokenizer: str, ids: List[List[int]], skip_special_tokens: bool = False) -> List[str]:
+        return self.call("decode", tokenizer=tokenizer, ids=ids, skip_special_tokens=skip_special_tokens)[0]["texts"]
+
+    def encode_windows(self, tokenizer: str, window: int, text: Optional[str] = None, tokens: Optional[List[int]] = None) -> List[str]:
+        # the text split into consecutive windows of at most window tokens, decoded back to text
+        return self.call("encode_windows", tokenizer=tokenizer, window=window, text=text, tokens=tokens)[0]["windows"]
+
+    def embed(self, model: str, texts: List[str], backend: str = "torch") -> np.ndarray:
+        header, body = self.call("embed", model=model, texts=texts, backend=backend)
+        return unpack_array(header, body)
+
+class RemoteTokenizer:
+    # stands in for a Hugging Face tokenizer, for the calls the pipeline makes
+    def __init__(self, name: str, client: ModelServerClient) -> None:
+        self.name = name
+        self.client = client
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        return self.client.encode(self.name, [text], add_special_tokens)[0]
+
+    def decode(self, ids: List[int], skip_special_tokens: bool = False) -> str:
+        return self.client.decode(self.name, [list(ids)], skip_special_tokens)[0]
+
+    def __call__(self, texts: Any, add_special_tokens: bool = True) -> Dict[str, Any]:
+        if isinstance(texts, str):
+            return {"input_ids": self.encode(texts, add_special_tokens)}
+        return {"input_ids": self.client.encode(self.name, list(texts), add_special_tokens)}
+
+    def count_tokens(self, text: str) -> int:
+        return self.client.count_tokens(self.name, [text])[0]
+
+    def encode_windows(self, window: int, text: Optional[str] = None, tokens: Optional[List[int]] = None) -> List[str]:
+        return self.client.encode_windows(self.name, window, text=text, tokens=tokens)
+
+class RemoteEncoder:
+    # stands in for a SentenceTransformer, batching happens in the server
+    def __init__(self, name: str, client: ModelServerClient, backend: str = "torch") -> None:
+        self.name = name
+        self.client = client
+        self.backend = backend
+
+    def encode(self, texts: List[str], **kwargs: Any) -> np.ndarray:
+        return self.client.embed(self.name, list(texts), self.backend)
+
+_client: Optional[ModelServerClient] = None
+_client_lock = threading.Lock()
+
+def get_client() -> Optional[ModelServerClient]:
+    # MODEL_SERVER_SOCKET points every process at a shared model server, unset loads models in process
+    socket_path = os.getenv("MODEL_SERVER_SOCKET")
+    if not socket_path:
+        return None
+    global _client
+    with _client_lock:
+        if _client is None or _client.socket_path != socket_path:
+            logger.info(f"Using model server at {socket_path}")
+            _client = ModelServerClient(socket_path)
+        return _client
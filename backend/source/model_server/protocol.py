@@ -0,0 +1,45 @@
+import json
+import socket
+import struct
+import numpy as np
+from typing import Dict, Any, Tuple
+
+# every message is (header length, body length), a JSON header, then raw bytes
+# (embeddings travel as float32 bytes so they aren't inflated by JSON)
+FRAME = struct.Struct("!II")
+
+class ModelServerError(RuntimeError):
+    pass
+
+class ConnectionClosed(ConnectionError):
+    """The peer closed the connection before sending any part of the next message."""
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        data = sock.recv(size - len(buffer))
+        if not data:
+            raise ConnectionClosed("Model server connection closed") if not buffer else ConnectionError("Model server connection closed mid-message")
+        buffer.extend(data)
+    return bytes(buffer)
+
+def send_message(sock: socket.socket, header: Dict[str, Any], body: bytes = b"") -> None:
+    encoded = json.dumps(header).encode("utf-8")
+    sock.sendall(FRAME.pack(len(encoded), len(body)) + encoded + body)
+
+def recv_message(sock: socket.socket) -> Tuple[Dict[str, Any], bytes]:
+    header_length, body_length = FRAME.unpack(_recv_exact(sock, FRAME.size))
+    try:
+        header = json.loads(_recv_exact(sock, header_length))
+        body = _recv_exact(sock, body_length) if body_length else b""
+    except ConnectionClosed as e:
+        # part of the message already arrived
+        raise ConnectionError("Model server connection closed mid-message") from e
+    return header, body
+
+def pack_array(array: np.ndarray) -> Tuple[Dict[str, Any], bytes]:
+    array = np.ascontiguousarray(array, dtype="float32")
+    return {"shape": list(array.shape)}, array.tobytes()
+
+def unpack_array(header: Dict[str, Any], body: bytes) -> np.ndarray:
+    return np.frombuffer(body, dtype="float32").reshape(header["shape"])
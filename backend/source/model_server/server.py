@@ -0,0 +1,142 @@
+import os
+import sys
+import logging
+import argparse
+import threading
+import socketserver
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from backend.source.model.model import load_tokenizer
+from backend.source.pipeline.rag.rag import encoder_key, load_encoder
+from backend.source.pipeline.rag.embedding_executor import get_embedding_executor
+from backend.source.model_server.protocol import send_message, recv_message, pack_array
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class ModelServer:
+    """
+    Owns the tokenizers and embedding models for every web and batch worker on the host,
+    so the weights are resident once. Workers connect over a UNIX socket (see
+    client.ModelServerClient) and models are loaded on first use unless preloaded.
+    """
+    def __init__(self, socket_path: str, tokenizers: Optional[List[str]] = None, embedding_models: Optional[List[str]] = None) -> None:
+        self.socket_path = socket_path
+        self.preload = (tokenizers or [], embedding_models or [])
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], Tuple[Dict[str, Any], bytes]]] = {
+            "ping": self.ping,
+            "count_tokens": self.count_tokens,
+            "encode": self.encode,
+            "decode": self.decode,
+            "encode_windows": self.encode_windows,
+            "embed": self.embed,
+        }
+        self._server: Optional[socketserver.ThreadingUnixStreamServer] = None
+
+    def ping(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        return {"pid": os.getpid()}, b""
+
+    def count_tokens(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        tokenizer = load_tokenizer(request["tokenizer"])
+        encoded = tokenizer(request["texts"], add_special_tokens=request.get("add_special_tokens", True))["input_ids"]
+        return {"counts": [len(ids) for ids in encoded]}, b""
+
+    def encode(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        tokenizer = load_tokenizer(request["tokenizer"])
+        return {"input_ids": tokenizer(request["texts"], add_special_tokens=request.get("add_special_tokens", True))["input_ids"]}, b""
+
+    def decode(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        tokenizer = load_tokenizer(request["tokenizer"])
+        return {"texts": tokenizer.batch_decode(request["ids"], skip_special_tokens=request.get("skip_special_tokens", False))}, b""
+
+    def encode_windows(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        tokenizer = load_tokenizer(request["tokenizer"])
+        tokens = request.get("tokens")
+        if tokens is None:
+            tokens = tokenizer.encode(request["text"], add_special_tokens=False)
+        window = request["window"]
+        windows = [tokens[i:i + window] for i in range(0, len(tokens), window)]
+        return {"windows": tokenizer.batch_decode(windows, skip_special_tokens=True)}, b""
+
+    def embed(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        # requests from every connected worker are batched together by the executor
+        backend = request.get("backend", "torch")
+        executor = get_embedding_executor(encoder_key(request["model"], backend), load_encoder(request["model"], backend))
+        return pack_array(executor.encode(request["texts"]))
+
+    def handle(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        handler = self.handlers.get(request.get("method", ""))
+        if handler is None:
+            return {"error": f"Unknown method: {request.get('method')}"}, b""
+        try:
+            return handler(request)
+        except Exception as e:
+            logger.error(f"Model server {request.get('method')} failed: {str(e)}")
+            return {"error": f"{type(e).__name__}: {str(e)}"}, b""
+
+    def start(self) -> "ModelServer":
+        for name in self.preload[0]:
+            load_tokenizer(name)
+        for name in self.preload[1]:
+            load_encoder(name)
+
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                # a connection stays open for many requests until the worker closes it
+                while True:
+                    try:
+                        request, _ = recv_message(self.request)
+                    except (ConnectionError, OSError):
+                        return
+                    header, body = server.handle(request)
+                    try:
+                        send_message(self.request, header, body)
+                    except (ConnectionError, OSError):
+                        return
+
+        # a socket left behind by a previous server would make bind fail
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self._server.daemon_threads = True
+        os.chmod(self.socket_path, 0o600)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f"Model server listening on {self.socket_path}")
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def __enter__(self) -> "ModelServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve tokenizers and embedding models to local workers over a UNIX socket.")
+    parser.add_argument("--socket", default=os.getenv("MODEL_SERVER_SOCKET", "/tmp/code-repair-models.sock"))
+    parser.add_argument("--tokenizer", action="append", default=[], help="Tokenizer to load at startup, repeatable.")
+    parser.add_argument("--embedding-model", action="append", default=[], help="Embedding model to load at startup, repeatable.")
+    args = parser.parse_args(argv)
+
+    server = ModelServer(args.socket, args.tokenizer, args.embedding_model).start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
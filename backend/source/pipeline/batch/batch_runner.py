@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Set, Iterable
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".py", ".java", ".cpp", ".c", ".h", ".hpp")
+
+def collect_files(root: Optional[str] = None, manifest: Optional[str] = None) -> List[str]:
+    # a manifest is a text file with one path per line, relative paths resolve against the manifest
+    paths: List[str] = []
+    if manifest:
+        base_dir = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    paths.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    if root:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            for filename in sorted(filenames):
+                if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                    paths.append(os.path.join(dirpath, filename))
+    logger.info(f"Collected {len(paths)} files")
+    return paths
+
+def load_completed(output_path: str) -> Set[str]:
+    # files that already have a successful result are skipped when resuming
+    completed: Set[str] = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a crash can leave a partial last line behind
+                continue
+            if record.get("status") == "ok":
+                completed.add(record["path"])
+    logger.info(f"Found {len(completed)} completed files in {output_path}")
+    return completed
+
+def run_file(path: str, model: Optional[str], test: bool, checkpoint_dir: Optional[str]) -> Dict[str, Any]:
+    from backend.source.pipeline.pipeline import Pipeline
+
+    start = time.perf_counter()
+    record: Dict[str, Any] = {"path": path}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        # each file gets its own in-memory index so concurrent pipelines don't share one on disk
+        pipeline = Pipeline(os.path.basename(path), content, model, test=test, checkpoint_dir=checkpoint_dir, index_path=None)
+        pipeline.run_pipline()
+        record.update({
+            "status": "ok",
+            "localization": pipeline.localization,
+            "final_patch": pipeline.final_patch,
+            "validation": pipeline.validation,
+            "prompt_tokens": pipeline.model.usage["prompt_tokens"],
+            "completion_tokens": pipeline.model.usage["completion_tokens"],
+        })
+    except Exception as e:
+        logger.error(f"Error processing {path}: {str(e)}")
+        record.update({"status": "error", "error": str(e), "prompt_tokens": 0, "completion_tokens": 0})
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+async def _run_batch_async(paths: List[str], model: Optional[str], test: bool, concurrency: int, checkpoint_dir: Optional[str]) -> List[Dict[str, Any]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(path: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await asyncio.to_thread(run_file, path, model, test, checkpoint_dir)
+
+    return await asyncio.gather(*(run_one(path) for path in paths))
+
+def run_batch(paths: List[str], model: Optional[str], test: bool, concurrency: int, checkpoint_dir: Optional[str]) -> List[Dict[str, Any]]:
+    # runs inside a worker process, the model calls overlap while waiting on the provider
+    return asyncio.run(_run_batch_async(paths, model, test, concurrency, checkpoint_dir))
+
+def _batches(paths: List[str], size: int) -> Iterable[List[str]]:
+    for i in range(0, len(paths), size):
+        yield paths[i:i + size]
+
+class BatchRunner:
+    def __init__(self, output_path: str, model: Optional[str] = None, test: bool = False, processes: Optional[int] = None, concurrency: int = 4, batch_size: int = 8, checkpoint_dir: Optional[str] = "pipeline_checkpoints") -> None:
+        logger.info("Initializing BatchRunner")
+        self.output_path = output_path
+        self.model = model
+        self.test = test
+        self.processes = processes or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.checkpoint_dir = checkpoint_dir
+        self.stats: Dict[str, Any] = {"files": 0, "errors": 0, "tokens": 0, "elapsed": 0.0}
+        logger.debug(f"Processes: {self.processes}, concurrency per process: {self.concurrency}, batch size: {self.batch_size}")
+
+    def report_throughput(self, start: float) -> str:
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        self.stats["elapsed"] = elapsed
+        files_per_min = self.stats["files"] * 60 / elapsed
+        tokens_per_s = self.stats["tokens"] / elapsed
+        return (f"{self.stats['files']} files ({self.stats['errors']} errors) in {elapsed:.1f}s - "
+                f"{files_per_min:.1f} files/min, {tokens_per_s:.1f} tokens/s")
+
+    def run(self, paths: List[str]) -> Dict[str, Any]:
+        completed = load_completed(self.output_path)
+        pending = [path for path in paths if path not in completed]
+        logger.info(f"Running {len(pending)} files ({len(paths) - len(pending)} already completed)")
+        if not pending:
+            return self.stats
+
+        start = time.perf_counter()
+        with open(self.output_path, "a", encoding="utf-8") as out, \
+                ProcessPoolExecutor(max_workers=self.processes) as executor:
+            futures = [
+                executor.submit(run_batch, batch, self.model, self.test, self.concurrency, self.checkpoint_dir)
+                for batch in _batches(pending, self.batch_size)
+            ]
+            for future in as_completed(futures):
+                try:
+                    records = future.result()
+                except Exception as e:
+                    # a crashed worker loses its batch, it is picked up again on the next resume
+                    logger.error(f"Batch failed: {str(e)}")
+                    continue
+                for record in records:
+                    out.write(json.dumps(record) + "\n")
+                    self.stats["files"] += 1
+                    self.stats["errors"] += record["status"] != "ok"
+                    self.stats["tokens"] += record["prompt_tokens"] + record["completion_tokens"]
+                out.flush()
+                print(self.report_throughput(start), flush=True)
+
+        logger.info(f"Batch run complete: {self.report_throughput(start)}")
+        return self.stats
+
+def run_repository(args: argparse.Namespace) -> int:
+    from backend.source.pipeline.repository.repository import RepositoryPipeline
+
+    repository = RepositoryPipeline(
+        args.repository,
+        model=args.model,
+        test=args.test,
+        max_workers=args.concurrency,
+        checkpoint_dir=args.checkpoint_dir
+    )
+    results = repository.run()
+    with open(args.output, "a", encoding="utf-8") as out:
+        for filename, result in results.items():
+            status = "error" if "error" in result else "ok"
+            out.write(json.dumps({"path": filename, "status": status, **result}) + "\n")
+    return 1 if any("error" in result for result in results.values()) else 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the code repair pipeline over a directory or manifest of files.")
+    parser.add_argument("root", nargs="?", help="directory to scan for source files")
+    parser.add_argument("--manifest", help="text file listing one source file per line")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--model", default=None, help="model id from model_configs.json")
+    parser.add_argument("--test", action="store_true", help="use the free test model")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent pipelines per process")
+    parser.add_argument("--batch-size", type=int, default=8, help="files handed to a worker at a time")
+    parser.add_argument("--checkpoint-dir", default="pipeline_checkpoints", help="stage checkpoint directory")
+    parser.add_argument("--repository", help="directory or archive analyzed as one repository with a shared index")
+    args = parser.parse_args(argv)
+
+    if args.repository:
+        return run_repository(args)
+    if not args.root and not args.manifest:
+        parser.error("a directory, --manifest or --repository is required")
+
+    paths = collect_files(args.root, args.manifest)
+    runner = BatchRunner(
+        args.output,
+        model=args.model,
+        test=args.test,
+        processes=args.processes,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        checkpoint_dir=args.checkpoint_dir
+    )
+    stats = runner.run(paths)
+    return 1 if stats["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,13 @@
 import re
 from typing import List, Tuple, Optional, Any
-from transformers import AutoTokenizer
-from huggingface_hub import InferenceClient
 import os
 import logging
 
+from backend.source.telemetry.tracing import tracer
+from backend.source.model_server.client import RemoteTokenizer
+from backend.source.model.prompt_template import PromptTemplate
+from backend.source.pipeline.minify.minifier import MinifiedCode, minify
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -13,46 +16,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class FaultLocalization:
-    def __init__(self, model: Any, file_contents: str) -> None:
-        logger.info("Initializing FaultLocalization")
-        try:
-            self.model = model
-            self.file_contents = file_contents
-            self.max_context = self.model.max_context - 250
-            self.max_response = self.model.max_response - 250
-            logger.debug(f"Max context size: {self.max_context}, Max response size: {self.max_response}")
-            
-            self.chunks: List[Tuple[int, str]] = self._chunk_code()
-            self.fault_localization: Optional[str] = None
-            logger.info("FaultLocalization initialized successfully")
-        except Exception as e:
-            logger.error(f"Error during initialization: {str(e)}", exc_info=True)
-            raise
-    
-    def _chunk_code(self) -> List[Tuple[int, str]]:
-        logger.info("Starting code chunking process")
-        try:
-            tokens = self.model.tokenizer.encode(self.file_contents, add_special_tokens=False)
-            chunk_size = self.max_response
-            chunks: List[Tuple[int, str]] = []
-            
-            logger.debug(f"Total tokens: {len(tokens)}, Chunk size: {chunk_size}")
-            
-            for i in range(0, len(tokens), chunk_size):
-                chunk_tokens = tokens[i:i + chunk_size]
-                chunk_text = self.model.tokenizer.decode(chunk_tokens, skip_special_tokens=True)
-                chunks.append((i // chunk_size, chunk_text))
-                logger.debug(f"Created chunk {i // chunk_size} with {len(chunk_tokens)} tokens")
-            
-            logger.info(f"Code chunking completed. Total chunks: {len(chunks)}")
-            return chunks
-        except Exception as e:
-            logger.error(f"Error during code chunking: {str(e)}", exc_info=True)
-            raise
-    
-    def get_prompt(self, code: str) -> str:
-        logger.debug("Generating prompt for code analysis")
-        prompt = f"""
+    # bump whenever the prompts change so cached stage results are invalidated
+    PROMPT_VERSION = "3"
+    # static instructions go first as the system message, the code follows as the user message
+    ANALYSIS_TEMPLATE = PromptTemplate(system="""
         Analyze the following code file to identify any vulnerabilities or faults. For each identified issue, provide 
         the analysis using the following structured format:
 
@@ -74,16 +41,11 @@ class FaultLocalization:
         ### Output Requirements:
         - Use bullet points and section headers for clarity.
         - Ensure all explanations are concise, actionable, and easy to understand.
-
+        """, user="""
         Here is the code: 
         {code}
-        """
-        logger.debug("Prompt generated successfully")
-        return prompt
-    
-    def clean_response(self, response: str) -> str:
-        logger.debug("Cleaning and formatting response")
-        cleaned_prompt = f"""
+        """)
+    CLEANUP_TEMPLATE = PromptTemplate(system="""
         Refine the following fault analysis to adhere to the structured format:
 
         ### High-Level Overview:
@@ -105,13 +67,86 @@ class FaultLocalization:
         - Improve readability and structure.
         - Enhance clarity and comprehensiveness.
         - Maintain consistency in formatting and terminology.
-
+        """, user="""
         Here is the analysis:
         {response}
-        """
+        """)
+
+    # with a language the prompts carry a minified copy of the file and reported line numbers
+    # are mapped back to the original, tokens are then those of the minified text
+    def __init__(self, model: Any, file_contents: str, tokens: Optional[List[int]] = None, language: Optional[str] = None) -> None:
+        logger.info("Initializing FaultLocalization")
+        try:
+            self.model = model
+            self.file_contents = file_contents
+            self.minified: Optional[MinifiedCode] = minify(file_contents, language) if language else None
+            self.prompt_code = self.minified.text if self.minified is not None else file_contents
+            # token ids computed ahead of time (e.g. once per repository) skip re-encoding the file
+            self.tokens = tokens
+            self.max_context = self.model.max_context - 250
+            self.max_response = self.model.max_response - 250
+            logger.debug(f"Max context size: {self.max_context}, Max response size: {self.max_response}")
+            
+            self.chunks: List[Tuple[int, str]] = self._chunk_code()
+            self.fault_localization: Optional[str] = None
+            logger.info("FaultLocalization initialized successfully")
+        except Exception as e:
+            logger.error(f"Error during initialization: {str(e)}", exc_info=True)
+            raise
+    
+    def _chunk_code(self) -> List[Tuple[int, str]]:
+        logger.info("Starting code chunking process")
+        try:
+            if isinstance(self.model.tokenizer, RemoteTokenizer):
+                # encoding and decoding happen in the model server in one round trip
+                with tracer.span("tokenizer.encode"):
+                    windows = self.model.tokenizer.encode_windows(self.max_response, text=None if self.tokens is not None else self.prompt_code, tokens=self.tokens)
+                logger.info(f"Code chunking completed. Total chunks: {len(windows)}")
+                return list(enumerate(windows))
+            if self.tokens is not None:
+                tokens = self.tokens
+            else:
+                with tracer.span("tokenizer.encode"):
+                    tokens = self.model.tokenizer.encode(self.prompt_code, add_special_tokens=False)
+            chunk_size = self.max_response
+            chunks: List[Tuple[int, str]] = []
+            
+            logger.debug(f"Total tokens: {len(tokens)}, Chunk size: {chunk_size}")
+            
+            for i in range(0, len(tokens), chunk_size):
+                chunk_tokens = tokens[i:i + chunk_size]
+                chunk_text = self.model.tokenizer.decode(chunk_tokens, skip_special_tokens=True)
+                chunks.append((i // chunk_size, chunk_text))
+                logger.debug(f"Created chunk {i // chunk_size} with {len(chunk_tokens)} tokens")
+            
+            logger.info(f"Code chunking completed. Total chunks: {len(chunks)}")
+            return chunks
+        except Exception as e:
+            logger.error(f"Error during code chunking: {str(e)}", exc_info=True)
+            raise
+    
+    def get_prompt(self, code: str) -> str:
+        logger.debug("Generating prompt for code analysis")
+        prompt = self.ANALYSIS_TEMPLATE.render(code=code)
+        logger.debug("Prompt generated successfully")
+        return prompt
+    
+    def clean_response(self, response: str) -> str:
+        logger.debug("Cleaning and formatting response")
+        cleaned_prompt = self.CLEANUP_TEMPLATE.render(response=response)
         logger.debug("Response cleaning completed")
         return cleaned_prompt
     
+    def is_valid_analysis(self, response: str) -> bool:
+        # usable output lists faults in the expected format or says there are none
+        return bool(re.search(r"#### Fault \d+", response)) or "fault-free" in response.lower()
+
+    def is_valid_consolidation(self, response: str, analysis: str) -> bool:
+        # consolidation may merge duplicate faults but must not drop all of them
+        if not self.is_valid_analysis(response):
+            return False
+        return not re.search(r"#### Fault \d+", analysis) or bool(re.search(r"#### Fault \d+", response))
+
     def get_fault_localization(self) -> str:
         logger.info("Retrieving fault localization")
         if self.fault_localization is None:
@@ -123,14 +158,19 @@ class FaultLocalization:
         logger.info("Starting fault localization calculation")
         try:
             accumulated_responses: List[str] = []
-            
+            # lines of the prompt code before each chunk, for mapping line numbers back
+            offset = 0
+
             for index, chunk in self.chunks:
                 logger.info(f"Processing chunk {index}")
                 prompt = self.get_prompt(chunk)
                 logger.debug(f"Generated prompt for chunk {index}")
                 
-                response = self.model.generate_response(prompt)
+                response = self.model.generate_response(prompt, task="fault_localization.triage", validate=self.is_valid_analysis)
                 logger.debug(f"Received response for chunk {index}")
+                if self.minified is not None:
+                    response = self.minified.remap_lines(response, offset)
+                offset += chunk.count("\n")
                 accumulated_responses.append(response)
             
             full_analysis = "\n".join(accumulated_responses)
@@ -138,7 +178,11 @@ class FaultLocalization:
             
             if len(accumulated_responses) > 1:
                 logger.info("Multiple responses detected, cleaning and consolidating")
-                cleaned_analysis = self.model.generate_response(self.clean_response(full_analysis))
+                cleaned_analysis = self.model.generate_response(
+                    self.clean_response(full_analysis),
+                    task="fault_localization.consolidation",
+                    validate=lambda response: self.is_valid_consolidation(response, full_analysis)
+                )
                 self.fault_localization = cleaned_analysis
             else:
                 logger.info("Single response detected, using as is")
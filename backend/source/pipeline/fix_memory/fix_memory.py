@@ -0,0 +1,161 @@
+import os
+import json
+import difflib
+import hashlib
+import logging
+import threading
+import numpy as np
+from filelock import FileLock
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+from backend.source.pipeline.rag.rag import RAG
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# cosine similarity a past fault needs before its fix is adapted instead of generated from scratch
+DEFAULT_THRESHOLD = float(os.getenv("FIX_MEMORY_THRESHOLD", "0.85"))
+
+# one memory per directory and encoder, shared by every pipeline in the process
+_memories: Dict[Tuple[Optional[str], str], "FixMemory"] = {}
+_memories_lock = threading.Lock()
+
+def make_diff(before: str, after: str, filename: str = "file") -> str:
+    return "".join(difflib.unified_diff(before.splitlines(keepends=True), after.splitlines(keepends=True), fromfile=f"a/{filename}", tofile=f"b/{filename}"))
+
+class FixMemory:
+    """
+    Faults whose patches passed validation, with the pattern and diff that fixed them.
+    Fault texts are embedded into an inner product index over normalized vectors, so a
+    search score is the cosine similarity. path=None keeps the memory in this process only,
+    otherwise fixes.jsonl under path carries it across runs. Each line holds its fault's
+    vector and the index is rebuilt from the lines, so any number of processes can append
+    to one file: writes hold a file lock and every process picks up lines others appended.
+    """
+    def __init__(self, encode: Callable[[str], np.ndarray], encoder_key: str, path: Optional[str] = None, threshold: float = DEFAULT_THRESHOLD) -> None:
+        self.encode = encode
+        self.encoder_key = encoder_key
+        self.path = path
+        self.threshold = threshold
+        # a faiss.IndexFlatIP, built with the first fix
+        self.index: Any = None
+        self.entries: List[Dict[str, Any]] = []
+        self._digests = set()
+        self._lock = threading.Lock()
+        # how far into fixes.jsonl this process has read
+        self._offset = 0
+        if path:
+            with self._lock:
+                self._refresh()
+            logger.info(f"Loaded {len(self.entries)} remembered fixes from {self.path}")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _entries_file(self) -> str:
+        return os.path.join(self.path, "fixes.jsonl")
+
+    def _file_lock(self) -> FileLock:
+        os.makedirs(self.path, exist_ok=True)
+        return FileLock(self._entries_file() + ".lock")
+
+    def _refresh(self) -> None:
+        # reads whatever was appended since the last call, by this process or any other
+        entries_file = self._entries_file()
+        try:
+            if os.path.getsize(entries_file) <= self._offset:
+                return
+            with open(entries_file, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except OSError:
+            return
+        # a line still being written has no newline yet, it is read next time
+        complete = data[:data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        skipped = 0
+        for line in complete.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                skipped += 1
+                continue
+            # vectors from another embedding model aren't comparable with this one's
+            if entry.get("encoder") != self.encoder_key or entry.get("digest") in self._digests:
+                continue
+            vector = self._normalize(entry.pop("vector", None) or self.encode(entry["fault"]))
+            self._append(entry, vector)
+        if skipped:
+            logger.warning(f"Skipped {skipped} unreadable lines in {entries_file}")
+
+    def _append(self, entry: Dict[str, Any], vector: np.ndarray) -> None:
+        if self.index is None:
+            import faiss
+            self.index = faiss.IndexFlatIP(vector.shape[1])
+        self.index.add(vector)
+        self.entries.append(entry)
+        self._digests.add(entry["digest"])
+
+    @staticmethod
+    def _normalize(vector: Any) -> np.ndarray:
+        import faiss
+        vector = np.array(vector, dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _embed(self, text: str) -> np.ndarray:
+        return self._normalize(self.encode(text))
+
+    def lookup(self, fault: str) -> Optional[Dict[str, Any]]:
+        # the closest remembered fix when it is at least threshold similar, otherwise None
+        if self.path:
+            with self._lock:
+                self._refresh()
+        if not self.entries:
+            return None
+        vector = self._embed(fault)
+        with self._lock:
+            scores, ids = self.index.search(vector, 1)
+            if ids[0][0] < 0 or scores[0][0] < self.threshold:
+                return None
+            match = dict(self.entries[ids[0][0]], similarity=float(scores[0][0]))
+        logger.info(f"Found a remembered fix with similarity {match['similarity']:.3f}")
+        return match
+
+    def add(self, fault: str, pattern: str, response: str = "", diff: str = "", metadata: Optional[Dict[str, Any]] = None) -> bool:
+        digest = hashlib.sha256(f"{fault}\0{pattern}".encode("utf-8")).hexdigest()
+        if digest in self._digests or not fault.strip() or not pattern.strip():
+            return False
+        vector = self._embed(fault)
+        entry = {"fault": fault, "pattern": pattern, "response": response, "diff": diff, "metadata": metadata or {}, "encoder": self.encoder_key, "digest": digest}
+        with self._lock:
+            if not self.path:
+                if digest in self._digests:
+                    return False
+                self._append(entry, vector)
+            else:
+                with self._file_lock():
+                    # merge what other processes wrote first, one of them may have stored this fix
+                    self._refresh()
+                    if digest in self._digests:
+                        return False
+                    with open(self._entries_file(), "a", encoding="utf-8") as f:
+                        f.write(json.dumps({**entry, "vector": vector[0].tolist()}) + "\n")
+                    self._refresh()
+        logger.info(f"Remembered fix for fault, {len(self.entries)} fixes in memory")
+        return True
+
+def get_fix_memory(path: Optional[str] = None, model_name: str = 'all-MiniLM-L6-v2', backend: Optional[str] = None) -> FixMemory:
+    # an index-less RAG of its own embeds the faults, so the memory never holds on to a session's index
+    encoder = RAG(model_name=model_name, index_path=None, backend=backend)
+    key = (os.path.abspath(path) if path else None, encoder.encoder_key)
+    with _memories_lock:
+        if key not in _memories:
+            _memories[key] = FixMemory(encoder.encode_query, encoder.encoder_key, path)
+        return _memories[key]
@@ -0,0 +1,243 @@
+import io
+import os
+import re
+import logging
+import tokenize
+from typing import Iterable, List, Optional, Set, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# languages with // and /* */ comments where indentation carries no meaning
+C_FAMILY = {"java", "c", "cpp", "csharp", "javascript", "typescript", "go", "kotlin", "scala", "swift", "rust", "php"}
+EXTENSIONS = {
+    ".java": "java", ".c": "c", ".h": "c", ".cpp": "cpp", ".cc": "cpp", ".hpp": "cpp", ".cs": "csharp",
+    ".js": "javascript", ".ts": "typescript", ".go": "go", ".kt": "kotlin", ".scala": "scala",
+    ".swift": "swift", ".rs": "rust", ".php": "php", ".py": "python",
+}
+
+# literals the scanner must not touch, tried in this order at every quote character
+LITERAL_PATTERNS = [
+    re.compile(r'"""[\s\S]*?"""'),
+    re.compile(r'"(?:\\.|[^"\\\n])*"'),
+    re.compile(r"'(?:\\.|[^'\\\n])*'"),
+    re.compile(r"`(?:\\.|[^`\\])*`"),
+]
+FUNCTION_HEADER = re.compile(r"\b([A-Za-z_]\w*)\s*\([^;{}]*\)\s*(?:throws\s+[\w.,\s]+)?\{$")
+NOT_FUNCTIONS = {"if", "for", "while", "switch", "catch", "synchronized", "try", "else", "do", "return", "new", "foreach", "using", "lock"}
+LINE_REFERENCE = re.compile(r"(?i)\b(lines?\s+)(\d+)(?:(\s*(?:-|–|to|and)\s*)(\d+))?")
+
+def language_for(filename: str) -> str:
+    return EXTENSIONS.get(os.path.splitext(filename)[1].lower(), "text")
+
+class MinifiedCode:
+    """
+    Source with comments and layout stripped for a prompt. line_map[i] is the original
+    line of minified line i + 1, so line numbers the model reports can be mapped back,
+    and header is the leading comment block (license, file banner) that was removed.
+    """
+    def __init__(self, text: str, line_map: List[int], header: str = "") -> None:
+        self.text = text
+        self.line_map = line_map
+        self.header = header
+
+    def original_line(self, line: int) -> int:
+        if not self.line_map or line < 1:
+            return line
+        return self.line_map[min(line, len(self.line_map)) - 1]
+
+    def remap_lines(self, text: str, offset: int = 0) -> str:
+        # "line 4" and "lines 4-9" in a reply about the minified text (or a part of it that starts
+        # after offset lines) become the matching lines of the original file
+        def replace(match: re.Match) -> str:
+            first = str(self.original_line(int(match.group(2)) + offset))
+            if match.group(4) is None:
+                return f"{match.group(1)}{first}"
+            return f"{match.group(1)}{first}{match.group(3)}{self.original_line(int(match.group(4)) + offset)}"
+        return LINE_REFERENCE.sub(replace, text)
+
+def _scan_c_family(code: str, strip_comments: bool) -> List[Tuple[str, str, bool]]:
+    # per original line: the text, a mask with "c" for code and "s" for literal characters,
+    # and whether a comment was removed from it
+    chars: List[str] = []
+    mask: List[str] = []
+    commented: Set[int] = set()
+    line = 0
+    i = 0
+    while i < len(code):
+        char = code[i]
+        if char in "\"'`":
+            match = next((m for m in (p.match(code, i) for p in LITERAL_PATTERNS) if m), None)
+            if match is not None:
+                literal = match.group(0)
+                chars.extend(literal)
+                mask.extend("s" * len(literal))
+                line += literal.count("\n")
+                i = match.end()
+                continue
+        if strip_comments and code.startswith("//", i):
+            end = code.find("\n", i)
+            i = len(code) if end < 0 else end
+            commented.add(line)
+            continue
+        if strip_comments and code.startswith("/*", i):
+            end = code.find("*/", i + 2)
+            end = len(code) if end < 0 else end + 2
+            breaks = code.count("\n", i, end)
+            commented.update(range(line, line + breaks + 1))
+            # keep the line breaks so every following line stays where it was
+            chars.extend(" " + "\n" * breaks)
+            mask.extend("c" * (breaks + 1))
+            line += breaks
+            i = end
+            continue
+        chars.append(char)
+        mask.append("c")
+        if char == "\n":
+            line += 1
+        i += 1
+
+    lines: List[Tuple[str, str, bool]] = []
+    text, kinds, start = "".join(chars), "".join(mask), 0
+    for number, piece in enumerate(text.split("\n")):
+        lines.append((piece, kinds[start:start + len(piece)], number in commented))
+        start += len(piece) + 1
+    return lines
+
+def _collapse(line: str, mask: str) -> str:
+    # runs of spaces and tabs outside literals become one space, indentation goes entirely
+    out: List[str] = []
+    previous_space = False
+    for char, kind in zip(line, mask):
+        if kind == "c" and char in " \t":
+            if not previous_space:
+                out.append(" ")
+            previous_space = True
+            continue
+        out.append(char)
+        previous_space = False
+    text = "".join(out)
+    if mask[:1] != "s":
+        text = text.lstrip()
+    if mask[-1:] != "s":
+        text = text.rstrip()
+    return text
+
+def _code_only(line: str, mask: str) -> str:
+    return "".join(char if kind == "c" else " " for char, kind in zip(line, mask))
+
+def _elide(lines: List[str], code_lines: List[str], line_map: List[int], keep: Set[str]) -> Tuple[List[str], List[int]]:
+    # bodies of functions not named in keep shrink to a stub, only when the body has lines of its own
+    headers = [(i, FUNCTION_HEADER.search(line.strip())) for i, line in enumerate(code_lines)]
+    names = {match.group(1) for _, match in headers if match and match.group(1) not in NOT_FUNCTIONS}
+    if not names & keep:
+        # nothing in the file is related, so nothing is safe to hide
+        return lines, line_map
+    out_lines: List[str] = []
+    out_map: List[int] = []
+    i = 0
+    while i < len(lines):
+        match = headers[i][1]
+        out_lines.append(lines[i])
+        out_map.append(line_map[i])
+        if match and match.group(1) not in NOT_FUNCTIONS and match.group(1) not in keep:
+            depth, end = 1, i + 1
+            while end < len(lines):
+                depth += code_lines[end].count("{") - code_lines[end].count("}")
+                if depth <= 0:
+                    break
+                end += 1
+            if end < len(lines) and depth == 0 and code_lines[end].strip() == "}" and end > i + 2:
+                out_lines.extend(["/* ... */", "}"])
+                out_map.extend([line_map[i + 1], line_map[end]])
+                i = end + 1
+                continue
+        i += 1
+    return out_lines, out_map
+
+def _python_lines(code: str, strip_comments: bool) -> List[Tuple[str, bool, bool]]:
+    # per original line: text without comments, whether a comment was removed, whether it lies inside a string
+    lines = code.split("\n")
+    comments: dict = {}
+    in_string: Set[int] = set()
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type == tokenize.COMMENT:
+                comments[token.start[0] - 1] = token.start[1]
+            elif token.type == tokenize.STRING and token.end[0] > token.start[0]:
+                in_string.update(range(token.start[0], token.end[0]))
+    except (tokenize.TokenError, IndentationError, SyntaxError) as e:
+        logger.debug(f"Could not tokenize python source, keeping comments: {str(e)}")
+        comments = {}
+    result = []
+    for number, line in enumerate(lines):
+        if strip_comments and number in comments:
+            result.append((line[:comments[number]], True, number in in_string))
+        else:
+            result.append((line, False, number in in_string))
+    return result
+
+def minify(code: str, language: str, strip_comments: bool = True, collapse_whitespace: bool = True, keep: Optional[Iterable[str]] = None) -> MinifiedCode:
+    """
+    Strips comments and the leading license block, and collapses whitespace where the
+    language allows it (indentation is kept for python). Lines are never merged, so every
+    minified line maps to one original line. keep names the functions that matter: the
+    bodies of other functions become stubs (C-family only, and only if one of them exists).
+    """
+    language = (language or "text").lower()
+    original = code.split("\n")
+    lines: List[str] = []
+    code_lines: List[str] = []
+    line_map: List[int] = []
+    first_code: Optional[int] = None
+
+    if language in C_FAMILY:
+        for number, (line, mask, commented) in enumerate(_scan_c_family(code, strip_comments)):
+            text = _collapse(line, mask) if collapse_whitespace else line.rstrip()
+            if not text.strip() and "s" not in mask and (collapse_whitespace or commented):
+                continue
+            lines.append(text)
+            code_lines.append(_code_only(line, mask))
+            line_map.append(number + 1)
+            if first_code is None and text.strip():
+                first_code = number
+    elif language == "python":
+        for number, (line, commented, in_string) in enumerate(_python_lines(code, strip_comments)):
+            if in_string:
+                lines.append(line)
+                line_map.append(number + 1)
+                continue
+            text = line.rstrip()
+            if not text.strip() and (collapse_whitespace or commented):
+                continue
+            lines.append(text)
+            line_map.append(number + 1)
+            if first_code is None and text.strip():
+                first_code = number
+    else:
+        for number, line in enumerate(original):
+            text = line.rstrip() if collapse_whitespace else line
+            if collapse_whitespace and not text.strip():
+                continue
+            lines.append(text)
+            line_map.append(number + 1)
+        first_code = 0
+
+    header = "\n".join(original[:first_code]) + "\n" if strip_comments and first_code else ""
+    if keep is not None and language in C_FAMILY:
+        lines, line_map = _elide(lines, code_lines, line_map, set(keep))
+    return MinifiedCode("\n".join(lines), line_map, header)
+
+def split_header(code: str, language: str) -> Tuple[str, str]:
+    # the leading comment block and the rest of the file, untouched, so the header can be put back later
+    header = minify(code, language, collapse_whitespace=False).header
+    return header, code[len(header):]
+
+def restore_header(header: str, code: str) -> str:
+    if not header or not code.strip() or code.lstrip().startswith(header.strip()):
+        return code
+    return header + code
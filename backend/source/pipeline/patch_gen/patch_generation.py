@@ -1,8 +1,14 @@
 import os
 import re
+import ast
 import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Any, Optional
 
+from backend.source.model.prompt_template import PromptTemplate
+from backend.source.pipeline.minify.minifier import restore_header, split_header
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -11,20 +17,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class PatchGeneration:
-    def __init__(self, model: Any, file_contents: str, patterns: List[str], language: str) -> None:
-        logger.info("Initializing PatchGeneration")
-        self.model = model
-        self.patterns = patterns
-        self.file_contents = file_contents
-        self.patch_candidates_dir = "patch_candidates"
-        self.language = language
-        self.patches = []
-        logger.debug(f"Initialized with {len(patterns)} patterns for language: {language}")
-    
-    def get_prompt(self, pattern: str, current_code: str = "") -> str:
-        logger.debug("Generating prompt" + (" with current code" if current_code else " without current code"))
-        if current_code:
-            return f"""Apply the given pattern fix to the current code while preserving previous fixes.  
+    # bump whenever the prompts change so cached stage results are invalidated
+    PROMPT_VERSION = "3"
+    # static instructions go first as the system message, the code and pattern follow as the user message
+    UPDATE_TEMPLATE = PromptTemplate(system="""Apply the given pattern fix to the current code while preserving previous fixes.  
             FOLLOW THE OUTPUT GUIDELINES COMPLETELY AND ALWAYS. ENSURE THAT THE CODE BLOCK IS FORMATTED AS SPECIFIED AND ALWAYS COMPLETED.
 
             Instructions:  
@@ -33,23 +29,22 @@ class PatchGeneration:
             - Return the full, updated file with all fixes applied.  
             - Do not add explanations, comments, or extra formatting.  
 
-            Inputs:  
-            - Current code state:  
-            {current_code}  
-
-            - Pattern to address:  
-            {pattern} 
-
             Output:
             - The full, updated file with the vulnerability fixed.
 
             Format (ALWAYS FOLLOW THIS FORMAT):
-            ```{self.language}
+            ```{language}
             // Provide the detailed code implementation here
             ```
-            """
-        else:
-            return f"""
+            """, user="""
+            Inputs:  
+            - Current code state:  
+            {current_code}  
+
+            - Pattern to address:  
+            {pattern} 
+            """)
+    APPLY_TEMPLATE = PromptTemplate(system="""
             Apply the provided pattern fix to the given file contents and return the entire updated file with the fixes applied.
             FOLLOW THE OUTPUT GUIDELINES COMPLETELY AND ALWAYS. ENSURE THAT THE CODE BLOCK IS FORMATTED AS SPECIFIED AND ALWAYS COMPLETED.
 
@@ -59,19 +54,37 @@ class PatchGeneration:
             - Return the full, corrected file—do not output only the changes.
             - Do not add explanations, comments, or any extra formatting.
 
-            Inputs:
-            - file_contents: {self.file_contents}
-            - pattern_fix: {pattern}
-
             Output:
             - The full, updated file with the vulnerability fixed.
 
             Format:
-            ```{self.language}
+            ```{language}
             // Provide the detailed code implementation here
             ```
-            """
-        
+            """, user="""
+            Inputs:
+            - file_contents: {file_contents}
+            - pattern_fix: {pattern}
+            """)
+
+    def __init__(self, model: Any, file_contents: str, patterns: List[str], language: str) -> None:
+        logger.info("Initializing PatchGeneration")
+        self.model = model
+        self.patterns = patterns
+        self.file_contents = file_contents
+        self.patch_candidates_dir = "patch_candidates"
+        self.language = language
+        self.patches = []
+        self.candidates: List[str] = []
+        logger.debug(f"Initialized with {len(patterns)} patterns for language: {language}")
+    
+    def get_prompt(self, pattern: str, current_code: str = "") -> str:
+        logger.debug("Generating prompt" + (" with current code" if current_code else " without current code"))
+        if current_code:
+            return self.UPDATE_TEMPLATE.render(language=self.language, current_code=current_code, pattern=pattern)
+        else:
+            return self.APPLY_TEMPLATE.render(language=self.language, file_contents=self.file_contents, pattern=pattern)
+
     def return_code_block(self, text: str) -> str:
         logger.debug("Extracting code block from response")
         # regex pattern to match text between triple backticks
@@ -86,6 +99,51 @@ class PatchGeneration:
             logger.warning("No code block found in response")
             return ""
 
+    def _apply_pattern(self, pattern: str, current_code: str, temperature: Optional[float] = None) -> str:
+        # the license header costs tokens on every call and never changes, it is put back on the result
+        header, current_code = split_header(current_code, self.language)
+        # Include current code state in the prompt
+        prompt = self.get_prompt(pattern, current_code)
+        logger.debug("Generated prompt, requesting model response")
+        # a patch without a code block is useless, so it counts as a failed route
+        validate = lambda r: bool(self.return_code_block(r).strip())
+        if temperature is None:
+            response = self.model.generate_response(prompt, task="patch_generation", validate=validate)
+        else:
+            response = self.model.generate_response(prompt, temperature=temperature, task="patch_generation", validate=validate)
+        return restore_header(header, self.return_code_block(response))
+
+    def _has_balanced_delimiters(self, code: str) -> bool:
+        pairs = {")": "(", "]": "[", "}": "{"}
+        stack: List[str] = []
+        # strip string literals and comments so their contents are not counted
+        stripped = re.sub(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', '""', code)
+        stripped = re.sub(r"//[^\n]*|/\*[\s\S]*?\*/", "", stripped)
+        for char in stripped:
+            if char in "([{":
+                stack.append(char)
+            elif char in pairs:
+                if not stack or stack.pop() != pairs[char]:
+                    return False
+        return not stack
+
+    def screen_candidate(self, code: str) -> bool:
+        """Cheap local check that a candidate is worth sending to validation."""
+        if not code or not code.strip():
+            logger.debug("Rejecting empty candidate")
+            return False
+        if self.language == "python":
+            try:
+                ast.parse(code)
+            except SyntaxError as e:
+                logger.debug(f"Rejecting candidate with syntax error: {str(e)}")
+                return False
+            return True
+        if not self._has_balanced_delimiters(code):
+            logger.debug("Rejecting candidate with unbalanced delimiters")
+            return False
+        return True
+
     def create_patch_files(self) -> None:
         logger.info("Starting patch file creation")
 
@@ -96,13 +154,8 @@ class PatchGeneration:
         for idx, pattern in enumerate(self.patterns):
             try:
                 logger.info(f"Processing pattern {idx + 1}/{len(self.patterns)}")
-                # Include current code state in the prompt
-                prompt = self.get_prompt(pattern, current_code)
-                logger.debug("Generated prompt, requesting model response")
-                response = self.model.generate_response(prompt)
-
                 # Update the current code with the new response
-                current_code = self.return_code_block(response)
+                current_code = self._apply_pattern(pattern, current_code)
                 self.patches.append(current_code)
                 logger.info(f"Completed iteration {idx + 1}/{len(self.patterns)} - Updated Previous Patch")
 
@@ -111,3 +164,41 @@ class PatchGeneration:
                 continue
 
         logger.info(f"Completed all {len(self.patterns)} iterations. Final patch generated")
+
+    # samples several candidates for the final pattern concurrently and keeps the ones that pass local checks
+    def create_patch_candidates(self, num_candidates: int, max_workers: int = 4, temperature: Optional[float] = None) -> List[str]:
+        logger.info(f"Starting patch candidate creation with {num_candidates} candidates")
+        if not self.patterns:
+            logger.warning("No patterns provided, no candidates generated")
+            return []
+
+        # earlier patterns are applied serially, exactly as in create_patch_files
+        current_code = self.file_contents
+        for idx, pattern in enumerate(self.patterns[:-1]):
+            try:
+                logger.info(f"Processing pattern {idx + 1}/{len(self.patterns)}")
+                current_code = self._apply_pattern(pattern, current_code)
+                self.patches.append(current_code)
+            except Exception as e:
+                logger.error(f"Error in iteration {idx + 1}: {str(e)}")
+                continue
+
+        sampled: List[str] = []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, num_candidates))) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._apply_pattern, self.patterns[-1], current_code, temperature)
+                for _ in range(num_candidates)
+            ]
+            for future in as_completed(futures):
+                try:
+                    sampled.append(future.result())
+                except Exception as e:
+                    logger.error(f"Error sampling candidate: {str(e)}")
+
+        self.candidates = [code for code in sampled if self.screen_candidate(code)]
+        logger.info(f"{len(self.candidates)}/{len(sampled)} candidates passed local screening")
+        if not self.candidates:
+            # nothing parsed, keep the non-empty samples so validation can still report on them
+            logger.warning("No candidates passed local screening, keeping unscreened candidates")
+            self.candidates = [code for code in sampled if code.strip()]
+        return self.candidates
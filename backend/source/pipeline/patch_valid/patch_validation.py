@@ -1,6 +1,11 @@
 import re
 import logging
-from typing import Optional, Any, List
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Any, List, Dict, Tuple
+
+from backend.source.model.prompt_template import PromptTemplate
+from backend.source.pipeline.minify.minifier import MinifiedCode, minify
 
 # Configure logging
 logging.basicConfig(
@@ -10,76 +15,21 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class PatchValidation:
-    def __init__(self, model: Any, final_patch: str, faults: Optional[str] = None, language: Optional[str] = None) -> None:
-        logger.info("Initializing PatchValidation")
-        self.model = model
-        self.final_patch = final_patch
-        self.faults = faults
-        self.language = language
-        logger.debug(f"Initialized validation for final patch")
-
-
-    def parse_llm_response(self, response: str) -> tuple[str, str]:
-        """Extracts the status, issues, corrections, and explanation from LLM responses consistently."""
-        logger.debug("Starting to parse LLM response")
-        
-        # Normalize response formatting
-        response = response.strip()
-        logger.debug("Normalized response formatting")
-
-        # Capture Status (GOOD / BAD) robustly
-        status_match = re.search(r"(?i)\**\s*status\s*\**\s*[:.]?\s*\**\s*(good|bad)\**", response)
-        status = status_match.group(1).upper() if status_match else "UNKNOWN"
-        logger.info(f"Extracted status: {status}")
-
-        # Capture Issues, Corrections, and Explanation
-        issues_match = re.search(r"(?i)\*\*Issues\**:\*\*\s*(.*?)(?=\n\n\*\*Corrections\*\*|\n\n\*\*Explanation\*\*|$)", response, re.DOTALL)
-        corrections_match = re.search(r"(?i)\*\*Corrections\**:\*\*\s*(.*?)(?=\n\n\*\*Explanation\*\*|$)", response, re.DOTALL)
-        explanation_match = re.search(r"(?i)\*\*Explanation\**:\*\*\s*(.*)", response, re.DOTALL)
-
-        issues = issues_match.group(1).strip() if issues_match else "None provided"
-        corrections = corrections_match.group(1).strip() if corrections_match else "None provided"
-        explanation = explanation_match.group(1).strip() if explanation_match else "None provided"
-
-        logger.debug("Extracted issues, corrections, and explanation")
-        logger.debug(f"Issues found: {'Yes' if issues != 'None provided' else 'No'}")
-        logger.debug(f"Corrections provided: {'Yes' if corrections != 'None provided' else 'No'}")
-
-        return status, issues
-    
-    def resolve_sytnax_errors(self, code: str) -> str:
-        logger.debug("Generating syntax error resolution prompt")
-        return f"""
-        You are a software engineer. Analyze the following code and correct any syntax and grammatical errors.
-
-        **Code:**  
-        ```{self.language}
-        {code}  
-        ```  
-
-        Output:
-        ```{self.language}
-        // Provide the detailed code implementation here
-        ```
-        """
-
-    def get_validation_prompt(self) -> str:
-        logger.debug("Generating validation prompt")
-        prompt = f"""
+    # bump whenever the prompts change so cached stage results are invalidated
+    PROMPT_VERSION = "3"
+    # static instructions go first as the system message, the patch follows as the user message
+    VALIDATION_TEMPLATE = PromptTemplate(system="""
 ### **Strict Code Review and Fault Verification Task**
 
 #### **Objective:**
-You are an expert-level code reviewer with advanced knowledge of `{self.language}`. Your task is to **rigorously analyze** the provided code for correctness, security vulnerabilities, and efficiency. Additionally, this code has previously been modified by an LLM to address specific faults. Your primary goal is to determine whether these faults were fully resolved and to conduct an in-depth review based on strict evaluation criteria.
+You are an expert-level code reviewer with advanced knowledge of `{language}`. Your task is to **rigorously analyze** the provided code for correctness, security vulnerabilities, and efficiency. Additionally, this code has previously been modified by an LLM to address specific faults. Your primary goal is to determine whether these faults were fully resolved and to conduct an in-depth review based on strict evaluation criteria.
 
 ---
 
-Here is the file to examine:
-{self.final_patch}
-
 ### **Evaluation Criteria:**
 
 1. **Compilation & Syntax Validation:**  
-   - Ensure that the code compiles successfully in `{self.language}` without syntax errors.  
+   - Ensure that the code compiles successfully in `{language}` without syntax errors.  
    - If compilation issues exist, identify the exact errors (with line numbers where possible) and suggest corrections.
 
 2. **Security Audit (Covers All Possible Vulnerabilities):**  
@@ -91,10 +41,10 @@ Here is the file to examine:
      - **Denial of Service (DoS) Risks** (inefficient loops, uncontrolled recursion, excessive resource consumption)
      - **Race Conditions** (multi-threading issues, improper locking mechanisms)
      - **Supply Chain Risks** (unsafe dependencies, reliance on untrusted libraries)
-   - Assess whether secure coding practices were followed for `{self.language}`.
+   - Assess whether secure coding practices were followed for `{language}`.
 
 3. **Best Practices & Code Maintainability:**  
-   - Ensure the code adheres to `{self.language}`’s best practices:
+   - Ensure the code adheres to `{language}`’s best practices:
      - **Modular design**: Proper function/class usage.
      - **Readability**: Proper naming conventions and formatting.
      - **Avoidance of redundant or inefficient logic**.
@@ -146,7 +96,7 @@ Here is the file to examine:
    - Ensure **syntax highlighting** and **preserve indentation**.
 
 2. **Strict Compilation & Execution Enforcement:**  
-   - If errors exist, the corrected version **must** be executable **as-is** in `{self.language}` without further modification.
+   - If errors exist, the corrected version **must** be executable **as-is** in `{language}` without further modification.
    - The LLM **must verify that the suggested corrections will compile and run correctly**.
 
 3. **Comprehensive Security Assessment:**  
@@ -155,10 +105,78 @@ Here is the file to examine:
 
 4. **Precision & Depth:**  
    - Be **highly specific** with identified issues (include line numbers where possible).
-   - Avoid generic advice—base all feedback on `{self.language}` best practices and security guidelines.
+   - Avoid generic advice—base all feedback on `{language}` best practices and security guidelines.
 
 ---
+        """, user="""
+Here is the file to examine:
+{final_patch}
+        """)
+
+    # with a language the patch is minified for the prompt, elide_unrelated also stubs out
+    # functions the faults never name
+    def __init__(self, model: Any, final_patch: str, faults: Optional[str] = None, language: Optional[str] = None, elide_unrelated: bool = False) -> None:
+        logger.info("Initializing PatchValidation")
+        self.model = model
+        self.final_patch = final_patch
+        self.faults = faults
+        self.language = language
+        self.status: Optional[str] = None
+        self.minified: Optional[MinifiedCode] = None
+        if language:
+            keep = set(re.findall(r"\w+", faults or "")) if elide_unrelated else None
+            self.minified = minify(final_patch, language, keep=keep)
+        logger.debug(f"Initialized validation for final patch")
+
+
+    def parse_llm_response(self, response: str) -> tuple[str, str]:
+        """Extracts the status, issues, corrections, and explanation from LLM responses consistently."""
+        logger.debug("Starting to parse LLM response")
+        
+        # Normalize response formatting
+        response = response.strip()
+        logger.debug("Normalized response formatting")
+
+        # Capture Status (GOOD / BAD) robustly
+        status_match = re.search(r"(?i)\**\s*status\s*\**\s*[:.]?\s*\**\s*(good|bad)\**", response)
+        status = status_match.group(1).upper() if status_match else "UNKNOWN"
+        logger.info(f"Extracted status: {status}")
+
+        # Capture Issues, Corrections, and Explanation
+        issues_match = re.search(r"(?i)\*\*Issues\**:\*\*\s*(.*?)(?=\n\n\*\*Corrections\*\*|\n\n\*\*Explanation\*\*|$)", response, re.DOTALL)
+        corrections_match = re.search(r"(?i)\*\*Corrections\**:\*\*\s*(.*?)(?=\n\n\*\*Explanation\*\*|$)", response, re.DOTALL)
+        explanation_match = re.search(r"(?i)\*\*Explanation\**:\*\*\s*(.*)", response, re.DOTALL)
+
+        issues = issues_match.group(1).strip() if issues_match else "None provided"
+        corrections = corrections_match.group(1).strip() if corrections_match else "None provided"
+        explanation = explanation_match.group(1).strip() if explanation_match else "None provided"
+
+        logger.debug("Extracted issues, corrections, and explanation")
+        logger.debug(f"Issues found: {'Yes' if issues != 'None provided' else 'No'}")
+        logger.debug(f"Corrections provided: {'Yes' if corrections != 'None provided' else 'No'}")
+
+        return status, issues
+    
+    def resolve_sytnax_errors(self, code: str) -> str:
+        logger.debug("Generating syntax error resolution prompt")
+        return f"""
+        You are a software engineer. Analyze the following code and correct any syntax and grammatical errors.
+
+        **Code:**  
+        ```{self.language}
+        {code}  
+        ```  
+
+        Output:
+        ```{self.language}
+        // Provide the detailed code implementation here
+        ```
         """
+
+    def get_validation_prompt(self) -> str:
+        logger.debug("Generating validation prompt")
+        code = self.minified.text if self.minified is not None else self.final_patch
+        prompt = self.VALIDATION_TEMPLATE.render(language=self.language, final_patch=code)
         logger.debug("Validation prompt generated successfully")
         return prompt
 
@@ -170,11 +188,14 @@ Here is the file to examine:
          prompt = self.get_validation_prompt()
          logger.debug("Generated validation prompt")
 
-         response = self.model.generate_response(prompt)
+         response = self.model.generate_response(prompt, task="patch_validation", validate=lambda r: self.parse_llm_response(r)[0] != "UNKNOWN")
          logger.debug("Received response from model")
 
          # parse the response to get status and other information
          status, issues = self.parse_llm_response(response)
+         if self.minified is not None:
+             issues = self.minified.remap_lines(issues)
+         self.status = status
          logger.info(f"Validation complete - Status: {status}")
 
          # return the parsed response regardless of status
@@ -186,3 +207,34 @@ Here is the file to examine:
 {issues}
          """
 
+
+# validates candidates in parallel and stops at the first one the model marks as GOOD,
+# stopping early only saves the validations still queued: ones already sent finish in the
+# background and their tokens reach model.usage after this returns
+def select_first_passing(model: Any, candidates: List[str], faults: Optional[str] = None, language: Optional[str] = None, max_workers: int = 4) -> Tuple[Optional[int], Dict[int, str]]:
+    logger.info(f"Validating {len(candidates)} candidates with {max_workers} workers")
+    reports: Dict[int, str] = {}
+    if not candidates:
+        return None, reports
+
+    validators = [PatchValidation(model, candidate, faults=faults, language=language) for candidate in candidates]
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(candidates))))
+    try:
+        # each task runs in a copy of the caller's context so its spans join the current trace
+        futures = {executor.submit(contextvars.copy_context().run, validator.validate_patches): idx for idx, validator in enumerate(validators)}
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                reports[idx] = future.result()
+            except Exception as e:
+                logger.error(f"Error validating candidate {idx + 1}: {str(e)}")
+                continue
+            if validators[idx].status == "GOOD":
+                logger.info(f"Candidate {idx + 1} passed validation, skipping remaining candidates")
+                return idx, reports
+    finally:
+        # queued validations are dropped, running ones can't be recalled and finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    logger.info("No candidate passed validation")
+    return None, reports
@@ -1,6 +1,8 @@
 import re
 import logging
-from typing import List, Any
+from typing import List, Dict, Any, Optional
+from backend.source.pipeline.rag.context_packing import pack_context
+from backend.source.model.prompt_template import PromptTemplate
 
 # Configure logging
 logging.basicConfig(
@@ -10,27 +12,36 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class PatternMatch:
-    def __init__(self, model: Any, rag: Any, fault_plan: str) -> None:
-        logger.info("Initializing PatternMatch")
-        self.model = model
-        self.rag = rag
-        self.fault_plan = fault_plan
-        self.patterns: List[str] = []
-        self.pre_patterns: List[str] = []
-
-    def get_prompt(self, fault: str, context: str) -> str:
-        logger.debug("Generating prompt with fault and context")
-        return f"""
+    # bump whenever the prompts change so cached stage results are invalidated
+    PROMPT_VERSION = "4"
+    # static instructions go first as the system message, the fault and its context follow as the user message
+    PATTERN_TEMPLATE = PromptTemplate(system="""
         You are an expert software engineer. Given the following fault and context, generate an improved code implementation.
+
+        Generate the solution based on the fault and context, but only return the structured implementation.
+        The solution should just be the small code change and not the entire file. Be sure to follow this guideline.
+
+        ### High-Level Explanation:
+        /// Concise and short explanation goes here
+
+        ### Implementation Plan:
+        #### Code Changes:
+        ```[language]
+        // Provide the detailed code implementation here
+        ```
         
+        Ensure the output follows this format exactly and does not include any references to the provided fault or context.
+        """, user="""
         **Fault Details (Do NOT include in response):**
         {fault}
 
         **Context Information (Do NOT include in response):**
         {context}
+        """)
+    ADAPTATION_TEMPLATE = PromptTemplate(system="""
+        You are an expert software engineer. A fix for a similar fault has already been accepted. Adapt it to the fault and context below.
 
-        Now, generate the solution based on the above fault and context, but only return the structured implementation.
-        The solution should just be the small code change and not the entire file. Be sure to follow this guideline.
+        Only change names and details so the fix applies here, and keep it a small code change.
 
         ### High-Level Explanation:
         /// Concise and short explanation goes here
@@ -38,12 +49,48 @@ class PatternMatch:
         ### Implementation Plan:
         #### Code Changes:
         ```[language]
-        // Provide the detailed code implementation here
+        // Provide the adapted code implementation here
         ```
-        
-        Ensure the output follows this format exactly and does not include any references to the provided fault or context.
-        """
+        """, user="""
+        **Fault Details (Do NOT include in response):**
+        {fault}
+
+        **Accepted Fix (for: {known_fault}):**
+        ```
+        {known_pattern}
+        ```
+
+        **Context Information (Do NOT include in response):**
+        {context}
+        """)
+    # a remembered fault this similar is the same fault, its fix is reused without a model call
+    REUSE_SIMILARITY = 0.97
+
+    # with a context_budget, up to candidates hybrid results are packed into that many tokens,
+    # without one the top 5 are joined as they are. memory is a FixMemory of validated fixes
+    def __init__(self, model: Any, rag: Any, fault_plan: str, context_budget: Optional[int] = None, candidates: int = 20, memory: Optional[Any] = None) -> None:
+        logger.info("Initializing PatternMatch")
+        self.model = model
+        self.rag = rag
+        self.fault_plan = fault_plan
+        self.context_budget = context_budget
+        self.candidates = candidates
+        self.memory = memory
+        self.patterns: List[str] = []
+        self.pre_patterns: List[str] = []
+        # faults answered from memory, verbatim or through an adaptation call
+        self.reused = 0
+        self.adapted = 0
+
+    def get_prompt(self, fault: str, context: str) -> str:
+        logger.debug("Generating prompt with fault and context")
+        return self.PATTERN_TEMPLATE.render(fault=fault, context=context)
     
+    def get_adaptation_prompt(self, fault: str, context: str, known: Dict[str, Any]) -> str:
+        logger.debug("Generating adaptation prompt from a remembered fix")
+        known_fault = known["fault"].splitlines()[0] if known["fault"] else ""
+        return self.ADAPTATION_TEMPLATE.render(fault=fault, context=context, known_fault=known_fault, known_pattern=known["pattern"])
+
     def extract_faults(self, input_string: str) -> List[str]:
         logger.debug("Extracting faults from input string")
         # Regular expression to match "#### Fault X:"
@@ -69,6 +116,12 @@ class PatternMatch:
             logger.warning("No code block found in text")
             return ""
 
+    def get_context(self, fault: str, budget: Optional[int], k: int = 5) -> str:
+        if budget:
+            retrieved_context = self.rag.retrieve_context(fault, k=self.candidates, hybrid=True)
+            return pack_context(retrieved_context, budget, self.model.get_token_count)
+        return pack_context(self.rag.retrieve_context(fault, k=k, hybrid=True))
+
     # based on prompt and number of faults, execute for each fault
     def execute_pattern_matching(self) -> None:
         logger.info("Starting pattern matching execution")
@@ -77,14 +130,26 @@ class PatternMatch:
 
         for i, fault in enumerate(faults, 1):
             logger.info(f"Processing fault {i}/{len(faults)}")
-            retrieved_context = self.rag.retrieve_context(fault)
-            context = "\n".join(entry["code"] for entry in retrieved_context)
-            logger.debug(f"Retrieved context for fault {i}")
-            
-            prompt = self.get_prompt(fault, context)
+            known = self.memory.lookup(fault) if self.memory is not None else None
+            if known is not None and known["similarity"] >= self.REUSE_SIMILARITY and known.get("response"):
+                logger.info(f"Reusing remembered fix for fault {i}")
+                self.reused += 1
+                self.pre_patterns.append(known["response"])
+                continue
+
+            if known is not None:
+                # the remembered fix carries most of the answer, so the code context can be smaller
+                context = self.get_context(fault, self.context_budget // 2 if self.context_budget else None, k=2)
+                prompt = self.get_adaptation_prompt(fault, context, known)
+                task = "pattern_matching.adaptation"
+                self.adapted += 1
+            else:
+                context = self.get_context(fault, self.context_budget)
+                prompt = self.get_prompt(fault, context)
+                task = "pattern_matching"
             logger.debug(f"Generated prompt for fault {i}")
-            
-            response = self.model.generate_response(prompt)
+
+            response = self.model.generate_response(prompt, task=task, validate=lambda r: bool(self.return_code_block(r).strip()))
             logger.debug(f"Received response for fault {i}")
 
             self.pre_patterns.append(response)
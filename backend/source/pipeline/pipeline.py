@@ -1,14 +1,18 @@
 import json
 import sys
 import os
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Callable
 from dotenv import load_dotenv
 
 from backend.source.pipeline.rag.rag import RAG
 from backend.source.pipeline.fault_loc.fault_localization import FaultLocalization
 from backend.source.pipeline.pattern_match.pattern_matching import PatternMatch
 from backend.source.pipeline.patch_gen.patch_generation import PatchGeneration
-from backend.source.pipeline.patch_valid.patch_validation import PatchValidation
+from backend.source.pipeline.patch_valid.patch_validation import PatchValidation, select_first_passing
+from backend.source.pipeline.scheduler.stage_scheduler import Stage, StageScheduler
+from backend.source.pipeline.fix_memory.fix_memory import FixMemory, get_fix_memory, make_diff
+from backend.source.pipeline.minify.minifier import language_for
+from backend.source.telemetry.tracing import tracer
 
 """from rag.rag import RAG
 from fault_loc.fault_localization import FaultLocalization
@@ -28,34 +32,62 @@ fireworks_api_key = os.getenv("FIREWORKS_API_KEY")
 this pipeline will be the main process for the pipeline that is being integrated :)
 """
 class Pipeline:
-    def __init__(self, filename: str, precode_content: str, model: Optional[str] = None, test: bool = False) -> None:
+    def __init__(self, filename: str, precode_content: str, model: Optional[str] = None, test: bool = False, num_candidates: int = 1, max_workers: int = 4, checkpoint_dir: Optional[str] = "pipeline_checkpoints", index_path: Optional[str] = "code_index.faiss", rag: Optional[RAG] = None, tokens: Optional[List[int]] = None, fix_memory_path: Optional[str] = os.getenv("FIX_MEMORY_PATH", "fix_memory"), use_fix_memory: bool = True) -> None:
         self.model: Optional[Model]
         self.rag: Optional[RAG]
+        self.fix_memory: Optional[FixMemory] = None
+
+        # number of patch candidates sampled per run and how many model calls run at once
+        self.num_candidates = num_candidates
+        self.max_workers = max_workers
+        # stage results are persisted here keyed by their inputs, None disables checkpointing
+        self.checkpoint_dir = checkpoint_dir
+        self.scheduler: Optional[StageScheduler] = None
+        # trace of the most recent run_pipline call, used for the run summary
+        self.trace_id: Optional[str] = None
         
         if test:
             self.set_model(test=True)
         else:
             self.set_model(model_selection=model, api_key=fireworks_api_key, provider="fireworks")
-        self.set_rag()
 
         self.precode_content = precode_content
         self.filename = filename
+        self.tokens = tokens
+
+        if rag is not None:
+            # repository mode shares one index that already holds this file
+            self.rag = rag
+        else:
+            self.set_rag(index_path)
 
-        # start rag setup
-        content = [{
-            "filename": self.filename,
-            "content": self.precode_content
-        }]
-        self.rag.embed_code(content)
+            # start rag setup
+            content = [{
+                "filename": self.filename,
+                "content": self.precode_content
+            }]
+            self.rag.embed_code(content)
+
+        # validated fixes from earlier runs, test runs keep theirs in this process only
+        if use_fix_memory:
+            self.fix_memory = get_fix_memory(None if test else fix_memory_path, self.rag.model_name, self.rag.backend)
 
         self.localization: Optional[str] = None
         self.patterns: Optional[List[str]] = [None]
         self.pre_patterns: Optional[List[str]] = [None]
         self.patches: Optional[str] = None
+        self.candidates: List[str] = []
+        self.final_patch: Optional[str] = None
         self.validation: Optional[List[str]] = [None]
+        self.validation_status: Optional[str] = None
+
+    # decides how the source is minified in prompts, so it is part of the fault localization key
+    @property
+    def language(self) -> str:
+        return language_for(self.filename)
 
-    def set_rag(self) -> None:
-        self.rag = RAG()
+    def set_rag(self, index_path: Optional[str] = "code_index.faiss") -> None:
+        self.rag = RAG(index_path=index_path)
 
     # define the model being used throughout the pipeline
     def set_model(self, model_selection: Optional[str] = None, api_key: Optional[str] = None, provider: Optional[str] = None, test: bool = False) -> None:
@@ -66,38 +98,105 @@ class Pipeline:
 
     # first stage which determines where the fault/vulnerability is
     def fault_localization(self):
-        fl = FaultLocalization(self.model, self.precode_content)
-        fl.calculate_fault_localization()
-        self.localization = fl.get_fault_localization()
+        with tracer.span("stage", stage="fault_localization"):
+            fl = FaultLocalization(self.model, self.precode_content, self.tokens, language=self.language)
+            fl.calculate_fault_localization()
+            self.localization = fl.get_fault_localization()
 
     # second stage determines the type of fault/vulnerability
     def pattern_matching(self):
-        pm = PatternMatch(self.model, self.rag, self.localization)
-        pm.execute_pattern_matching()
-        self.patterns = pm.patterns
-        self.pre_patterns = pm.pre_patterns
+        with tracer.span("stage", stage="pattern_matching"):
+            pm = PatternMatch(self.model, self.rag, self.localization, context_budget=self.model.context_budget, memory=self.fix_memory)
+            pm.execute_pattern_matching()
+            self.patterns = pm.patterns
+            self.pre_patterns = pm.pre_patterns
 
     # third stage creates the patches and places them in the code
     def patch_generation(self, output_dir: str = "patch_candidates") -> str:
-        pg = PatchGeneration(self.model, self.precode_content, self.patterns, "java")
-        pg.create_patch_files()
-        self.patches = pg.patches
+        with tracer.span("stage", stage="patch_generation"):
+            pg = PatchGeneration(self.model, self.precode_content, self.patterns, self.language)
+            if self.num_candidates > 1:
+                temperature = self.model.current_config.get("temperature")
+                self.candidates = pg.create_patch_candidates(self.num_candidates, self.max_workers, temperature)
+                # the first candidate stands in as the final patch until validation picks one
+                self.patches = pg.patches + self.candidates[:1]
+            else:
+                pg.create_patch_files()
+                self.candidates = []
+                self.patches = pg.patches
 
     # last stage determines if the fixes are corrected
     def patch_validation(self):
-        validator = PatchValidation(self.model, self.patches[len(self.patches) - 1], faults=self.localization, language="java")
-        self.validation = validator.validate_patches()
+        with tracer.span("stage", stage="patch_validation"):
+            if not self.candidates and not self.patches:
+                # every sample failed or came back empty, e.g. when all provider calls errored
+                self.final_patch = None
+                self.validation = "No patch was generated, so there was nothing to validate."
+                self.validation_status = "BAD"
+            elif len(self.candidates) > 1:
+                winner, reports = select_first_passing(self.model, self.candidates, faults=self.localization, language=self.language, max_workers=self.max_workers)
+                chosen = winner if winner is not None else min(reports, default=0)
+                self.final_patch = self.candidates[chosen]
+                self.validation = reports.get(chosen, "")
+                self.validation_status = "GOOD" if winner is not None else "BAD"
+            else:
+                self.final_patch = self.patches[len(self.patches) - 1]
+                validator = PatchValidation(self.model, self.final_patch, faults=self.localization, language=self.language)
+                self.validation = validator.validate_patches()
+                self.validation_status = validator.status
+            if self.validation_status == "GOOD":
+                self.remember_fix()
 
-    def run_pipline(self) -> None:
+    # only fixes the validator accepted are offered to later runs
+    def remember_fix(self) -> None:
+        if self.fix_memory is None or not self.final_patch:
+            return
+        try:
+            faults = PatternMatch(self.model, self.rag, self.localization).extract_faults(self.localization or "")
+            diff = make_diff(self.precode_content, self.final_patch, self.filename)
+            for fault, pattern, response in zip(faults, self.patterns, self.pre_patterns):
+                if pattern:
+                    self.fix_memory.add(fault, pattern, response or "", diff, {"filename": self.filename})
+        except Exception as e:
+            print(f"Error remembering fix: {e}")
+
+    def no_faults_detected(self) -> bool:
+        return not PatternMatch(self.model, self.rag, self.localization).extract_faults(self.localization or "")
+
+    def get_stages(self) -> List[Stage]:
+        # inputs are hashed to key each stage's checkpoint, so anything that changes a stage's result belongs here
+        return [
+            Stage("fault_localization", self.fault_localization,
+                  inputs=["precode_content", "language", "model.model", "model.routes", "model.generation_profiles"],
+                  outputs=["localization"],
+                  version=FaultLocalization.PROMPT_VERSION,
+                  skip_downstream=self.no_faults_detected),
+            Stage("pattern_matching", self.pattern_matching,
+                  inputs=["precode_content", "rag.content_digest", "model.model", "model.context_budget", "model.generation_profiles", "localization"],
+                  outputs=["patterns", "pre_patterns"],
+                  version=PatternMatch.PROMPT_VERSION),
+            Stage("patch_generation", self.patch_generation,
+                  inputs=["precode_content", "language", "model.model", "model.generation_profiles", "patterns", "num_candidates"],
+                  outputs=["patches", "candidates"],
+                  version=PatchGeneration.PROMPT_VERSION),
+            Stage("patch_validation", self.patch_validation,
+                  inputs=["language", "model.model", "model.generation_profiles", "localization", "patches", "candidates"],
+                  outputs=["validation", "final_patch"],
+                  version=PatchValidation.PROMPT_VERSION),
+        ]
+
+    def run_pipline(self, on_progress: Optional[Callable[[str, str], None]] = None) -> None:
         self.localization = None
         self.patterns = [None]
         self.patches = None
+        self.candidates = []
+        self.final_patch = None
         self.validation = [None]
-        # first stage
-        self.fault_localization()
-        # second stage
-        self.pattern_matching()
-        # third stage
-        self.patch_generation()
-        # fourth stage
-        self.patch_validation()
\ No newline at end of file
+        self.validation_status = None
+
+        with tracer.span("pipeline.run", filename=self.filename) as span:
+            self.trace_id = span.trace_id
+            self.scheduler = StageScheduler(self, self.get_stages(), self.checkpoint_dir, on_progress)
+            self.scheduler.run()
+        if "patch_validation" in self.scheduler.skipped:
+            self.validation = "No faults were detected, so no patches were generated or validated."
@@ -0,0 +1,61 @@
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def merge_overlap(first: str, second: str, max_overlap: int = 200) -> str:
+    # neighbouring chunks from the splitter share up to chunk_overlap characters
+    for size in range(min(len(first), len(second), max_overlap), 0, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return first + "\n" + second
+
+def pack_context(results: List[Dict[str, Any]], token_budget: Optional[int] = None, count_tokens: Optional[Callable[[str], int]] = None, separator: str = "\n") -> str:
+    """
+    Joins retrieval results, most relevant first, into at most token_budget tokens.
+    Duplicate and contained chunks are dropped and consecutive chunks of the same file
+    are stitched together without their overlap. A chunk that doesn't fit is skipped so a
+    smaller, less relevant one can still use the space. No budget keeps everything.
+    """
+    if token_budget is not None and count_tokens is None:
+        raise ValueError("count_tokens is required with a token budget")
+    separator_tokens = count_tokens(separator) if token_budget is not None and separator.strip() else 0
+    selected: List[Dict[str, Any]] = []
+    used = 0
+
+    def fits(cost: int) -> bool:
+        return token_budget is None or used + cost <= token_budget
+
+    for result in results:
+        text = result["code"]
+        if not text or any(text in entry["text"] for entry in selected):
+            continue
+        metadata = result.get("metadata") or {}
+        file_name, number = metadata.get("file_name"), metadata.get("chunk_number")
+
+        neighbour = None
+        if file_name is not None and number is not None:
+            neighbour = next((entry for entry in selected if entry["file"] == file_name and entry["first"] is not None and number in (entry["first"] - 1, entry["last"] + 1)), None)
+        if neighbour is not None:
+            before = number < neighbour["first"]
+            merged = merge_overlap(text, neighbour["text"]) if before else merge_overlap(neighbour["text"], text)
+            tokens = count_tokens(merged) if token_budget is not None else 0
+            if fits(tokens - neighbour["tokens"]):
+                used += tokens - neighbour["tokens"]
+                neighbour.update(text=merged, tokens=tokens, first=min(number, neighbour["first"]), last=max(number, neighbour["last"]))
+            continue
+
+        tokens = count_tokens(text) if token_budget is not None else 0
+        cost = tokens + (separator_tokens if selected else 0)
+        if not fits(cost):
+            continue
+        used += cost
+        selected.append({"file": file_name, "first": number, "last": number, "text": text, "tokens": tokens})
+
+    logger.debug(f"Packed {len(selected)} of {len(results)} retrieved chunks into {used} tokens")
+    return separator.join(entry["text"] for entry in selected)
@@ -0,0 +1,174 @@
+import os
+import time
+import queue
+import logging
+import threading
+import numpy as np
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional
+
+from backend.source.telemetry.tracing import tracer
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class _EncodeRequest:
+    def __init__(self, texts: List[str]) -> None:
+        self.texts = texts
+        self.submitted = time.monotonic()
+        self.offset = 0
+        self.parts: List[np.ndarray] = []
+        self.future: "Future[np.ndarray]" = Future()
+        # the batch spans serving this request are recorded under the caller's trace
+        self.span = tracer.current_span()
+
+    @property
+    def remaining(self) -> int:
+        return len(self.texts) - self.offset
+
+class EmbeddingExecutor:
+    """
+    Queues encode requests from every RAG in the process and runs them through the encoder
+    on one dedicated thread, flushing a batch once it holds max_batch_size texts or the
+    oldest request has waited max_wait_ms. Large requests are split across batches and
+    small ones are served first, so a repository ingest doesn't hold up queries, but the
+    oldest request always gets oldest_share of each batch so a steady stream of queries
+    can't starve an ingest either.
+    """
+    def __init__(self, encoder: Any, max_batch_size: int = 64, max_wait_ms: float = 5.0, torch_threads: Optional[int] = None, name: str = "embedding", oldest_share: float = 0.25) -> None:
+        self.encoder = encoder
+        self.max_batch_size = max_batch_size
+        self.oldest_share = oldest_share
+        self.max_wait = max_wait_ms / 1000.0
+        self.torch_threads = torch_threads
+        self.batches = 0
+        self.requests = 0
+        self._queue: "queue.Queue[Optional[_EncodeRequest]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"{name}-executor", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str]) -> "Future[np.ndarray]":
+        request = _EncodeRequest(list(texts))
+        if not request.texts:
+            request.future.set_result(np.empty((0, 0), dtype="float32"))
+            return request.future
+        self.requests += 1
+        self._queue.put(request)
+        return request.future
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.submit(texts).result()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _set_threads(self) -> None:
+        if self.torch_threads:
+            import torch
+            torch.set_num_threads(self.torch_threads)
+            logger.info(f"Embedding executor using {self.torch_threads} torch threads")
+
+    def _collect(self, pending: List[_EncodeRequest]) -> bool:
+        # blocks for the first request, then gathers more until the batch is full or max_wait passes
+        if not pending:
+            request = self._queue.get()
+            if request is None:
+                return False
+            pending.append(request)
+        # take everything already queued, so a waiting query isn't stuck behind a large request
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return False
+            pending.append(request)
+        deadline = time.monotonic() + self.max_wait
+        while sum(request.remaining for request in pending) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                return False
+            pending.append(request)
+        return True
+
+    def _run(self) -> None:
+        self._set_threads()
+        pending: List[_EncodeRequest] = []
+        while self._collect(pending):
+            # the oldest request's share is set aside, then smallest requests first fill the rest
+            oldest = min(pending, key=lambda request: request.submitted)
+            takes = {oldest: min(oldest.remaining, max(1, int(self.max_batch_size * self.oldest_share)))}
+            room = self.max_batch_size - takes[oldest]
+            pending.sort(key=lambda request: request.remaining)
+            for request in pending:
+                if room <= 0:
+                    break
+                extra = min(request.remaining - takes.get(request, 0), room)
+                takes[request] = takes.get(request, 0) + extra
+                room -= extra
+            slices = []
+            texts: List[str] = []
+            for request in pending:
+                take = takes.get(request, 0)
+                if take <= 0:
+                    continue
+                slices.append((request, request.offset, request.offset + take))
+                texts.extend(request.texts[request.offset:request.offset + take])
+
+            # a batch serves callers from several traces, without any (e.g. an ingest outside a
+            # run) it is only counted, so background batches can't evict the traces of runs
+            callers = [request.span for request, _, _ in slices if request.span is not None]
+            parent = callers[0] if callers else None
+            try:
+                with tracer.span("rag.embedding_batch", parent=parent, links=[span.trace_id for span in callers], keep_trace=parent is not None, texts=len(texts), requests=len(slices)):
+                    embeddings = self.encoder.encode(texts, batch_size=self.max_batch_size, show_progress_bar=False)
+            except Exception as e:
+                logger.error(f"Embedding batch failed: {str(e)}")
+                for request, _, _ in slices:
+                    request.future.set_exception(e)
+                    pending.remove(request)
+                continue
+            self.batches += 1
+
+            position = 0
+            for request, start, end in slices:
+                request.parts.append(embeddings[position:position + end - start])
+                position += end - start
+                request.offset = end
+                if request.remaining == 0:
+                    request.future.set_result(np.concatenate(request.parts) if len(request.parts) > 1 else request.parts[0])
+                    pending.remove(request)
+
+        # shut down, fail anything still waiting
+        for request in pending:
+            request.future.set_exception(RuntimeError("Embedding executor closed"))
+
+_executors: Dict[str, EmbeddingExecutor] = {}
+_executors_lock = threading.Lock()
+
+def get_embedding_executor(model_name: str, encoder: Any) -> EmbeddingExecutor:
+    # one executor per embedding model, shared by every session
+    with _executors_lock:
+        if model_name not in _executors:
+            threads = os.getenv("EMBEDDING_TORCH_THREADS")
+            _executors[model_name] = EmbeddingExecutor(
+                encoder,
+                max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64")),
+                max_wait_ms=float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5")),
+                torch_threads=int(threads) if threads else None,
+                name=model_name,
+                oldest_share=float(os.getenv("EMBEDDING_OLDEST_SHARE", "0.25"))
+            )
+        return _executors[model_name]
@@ -0,0 +1,70 @@
+import re
+import math
+import logging
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Iterable, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+# camelCase, PascalCase, ACRONYMCase and snake_case pieces of an identifier
+PART_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+def tokenize(text: str) -> List[str]:
+    # whole identifiers match exact names from a fault report, their parts match prose like "prepare statement"
+    tokens = []
+    for identifier in IDENTIFIER_PATTERN.findall(text):
+        tokens.append(identifier.lower())
+        parts = PART_PATTERN.findall(identifier)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return tokens
+
+class BM25Index:
+    """
+    Okapi BM25 over code tokens, held as an inverted index of numpy posting arrays.
+    Catches exact identifiers the embedding model tends to blur together.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.lengths = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def build(self, texts: Iterable[str]) -> None:
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        lengths = []
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for token, count in counts.items():
+                ids, tfs = postings.setdefault(token, ([], []))
+                ids.append(doc_id)
+                tfs.append(count)
+        self.postings = {token: (np.array(ids, dtype=np.int32), np.array(tfs, dtype=np.float32)) for token, (ids, tfs) in postings.items()}
+        self.lengths = np.array(lengths, dtype=np.float32)
+        logger.debug(f"Built BM25 index over {len(lengths)} chunks and {len(postings)} terms")
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        if not len(self) or k <= 0:
+            return []
+        scores = np.zeros(len(self), dtype=np.float32)
+        average = max(float(self.lengths.mean()), 1.0)
+        norms = self.k1 * (1 - self.b + self.b * self.lengths / average)
+        for token in set(tokenize(query)):
+            if token not in self.postings:
+                continue
+            ids, tfs = self.postings[token]
+            idf = math.log(1 + (len(self) - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + norms[ids])
+        top = np.argsort(-scores)[:k]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in top if scores[doc_id] > 0]
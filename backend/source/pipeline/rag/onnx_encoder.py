@@ -0,0 +1,135 @@
+import os
+import json
+import logging
+import numpy as np
+from typing import Any, List, Optional
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_ONNX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "code-repair", "onnx")
+POOLING_MODES = ("mean", "cls", "max")
+
+class OnnxEncoder:
+    """
+    Runs a SentenceTransformer's transformer through ONNX Runtime with int8 dynamic
+    quantization. The model is exported once into cache_dir together with its tokenizer
+    and pooling settings, so later loads never touch torch. Provides the encode() call RAG
+    makes on a SentenceTransformer. Needs onnx and onnxruntime installed.
+    """
+    def __init__(self, model_name: str, cache_dir: Optional[str] = None, quantize: bool = True, threads: Optional[int] = None) -> None:
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The onnx embedding backend needs onnxruntime and onnx, install them with `pip install onnxruntime onnx`") from e
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.directory = os.path.join(cache_dir or os.getenv("EMBEDDING_ONNX_DIR", DEFAULT_ONNX_DIR), model_name.strip("/").replace("/", "__"))
+        model_file = os.path.join(self.directory, "model_int8.onnx" if quantize else "model.onnx")
+        if not os.path.exists(model_file):
+            self.export(model_name, self.directory, quantize)
+
+        with open(os.path.join(self.directory, "encoder_config.json"), "r", encoding="utf-8") as f:
+            config = json.load(f)
+        self.pooling: str = config["pooling"]
+        self.normalize: bool = config["normalize"]
+        self.max_seq_length: int = config["max_seq_length"]
+        self.tokenizer = AutoTokenizer.from_pretrained(self.directory)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        logger.info(f"Loaded ONNX embedding model from {model_file}")
+
+    @staticmethod
+    def export(model_name: str, directory: str, quantize: bool = True) -> None:
+        import torch
+        from sentence_transformers import SentenceTransformer
+        from sentence_transformers.models import Normalize, Pooling
+
+        logger.info(f"Exporting {model_name} to ONNX in {directory}")
+        source = SentenceTransformer(model_name, device="cpu")
+        pooling = next((module for module in source if isinstance(module, Pooling)), None)
+        # sentence_transformers 3.x names the mode with get_pooling_mode_str, later versions store pooling_mode
+        if pooling is None:
+            mode = "mean"
+        elif hasattr(pooling, "get_pooling_mode_str"):
+            mode = pooling.get_pooling_mode_str()
+        else:
+            mode = pooling.pooling_mode
+        if mode not in POOLING_MODES:
+            raise ValueError(f"Unsupported pooling mode for the onnx backend: {mode}")
+
+        os.makedirs(directory, exist_ok=True)
+        transformer = source[0].auto_model.eval()
+
+        class HiddenStates(torch.nn.Module):
+            # positional inputs in input_names order, last hidden state out
+            def __init__(self) -> None:
+                super().__init__()
+                self.transformer = transformer
+
+            def forward(self, *args: Any) -> Any:
+                return self.transformer(**dict(zip(input_names, args)))[0]
+
+        inputs = source.tokenizer(["public class Example { }"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in inputs]
+        fp32_file = os.path.join(directory, "model.onnx")
+        with torch.no_grad():
+            torch.onnx.export(
+                HiddenStates(),
+                tuple(inputs[name] for name in input_names),
+                fp32_file,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+                opset_version=17,
+                dynamo=False,
+            )
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(fp32_file, os.path.join(directory, "model_int8.onnx"), weight_type=QuantType.QInt8)
+
+        source.tokenizer.save_pretrained(directory)
+        with open(os.path.join(directory, "encoder_config.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "model_name": model_name,
+                "pooling": mode,
+                "normalize": any(isinstance(module, Normalize) for module in source),
+                "max_seq_length": source.max_seq_length,
+            }, f, indent=2)
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            return hidden[:, 0]
+        mask = mask[:, :, None].astype(hidden.dtype)
+        if self.pooling == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False, **kwargs: Any) -> np.ndarray:
+        # longest first so each batch pads to similar lengths, results go back in input order
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        embeddings: List[np.ndarray] = []
+        for start in range(0, len(order), batch_size):
+            batch = [texts[i] for i in order[start:start + batch_size]]
+            encoded = self.tokenizer(batch, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np")
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            pooled = self._pool(hidden, encoded["attention_mask"])
+            if self.normalize:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            embeddings.append(pooled.astype("float32"))
+        if not embeddings:
+            return np.empty((0, 0), dtype="float32")
+        result = np.empty((len(texts), embeddings[0].shape[1]), dtype="float32")
+        result[order] = np.concatenate(embeddings)
+        return result
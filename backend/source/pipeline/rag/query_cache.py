@@ -0,0 +1,65 @@
+import os
+import re
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_query(query: str) -> str:
+    # whitespace doesn't change what a fault description means, case can (class and variable names)
+    return _WHITESPACE.sub(" ", query).strip()
+
+class LRUCache:
+    """
+    Thread-safe bounded mapping that evicts the least recently used entry once it holds
+    maxsize items. maxsize 0 disables it: nothing is stored and every get misses.
+    """
+    def __init__(self, maxsize: int, name: str = "cache") -> None:
+        self.maxsize = maxsize
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+# query embeddings keyed by (encoder key, normalized query), shared by every RAG in the process
+# so a fault description seen in another session skips the forward pass
+query_embeddings = LRUCache(int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024")), name="rag.query_embeddings")
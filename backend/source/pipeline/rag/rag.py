@@ -1,14 +1,24 @@
-import faiss
+import hashlib
 import numpy as np
 import os
 import logging
-from sentence_transformers import SentenceTransformer
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from langchain_text_splitters import (
     Language,
     RecursiveCharacterTextSplitter,
 )
 from enum import Enum
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Union, Tuple
+
+from backend.source.telemetry.tracing import tracer
+from backend.source.concurrency.singleflight import embedding_flights
+from backend.source.pipeline.rag.onnx_encoder import OnnxEncoder
+from backend.source.pipeline.rag.storage import ChunkStore, ExactVectors, build_index
+from backend.source.pipeline.rag.lexical import BM25Index
+from backend.source.pipeline.rag.query_cache import LRUCache, normalize_query, query_embeddings
+from backend.source.pipeline.rag.embedding_executor import EmbeddingExecutor, get_embedding_executor
+from backend.source.model_server.client import RemoteEncoder, get_client
 
 # Configure logging
 logging.basicConfig(
@@ -17,14 +27,82 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# embedding models are shared by every RAG in the process so repeated pipelines skip the load
+_encoder_cache: Dict[str, Any] = {}
+_encoder_lock = threading.Lock()
+
+EMBEDDING_BACKENDS = ("torch", "onnx")
+
+def encoder_key(model_name: str, backend: str = "torch") -> str:
+    return model_name if backend == "torch" else f"{model_name}[{backend}]"
+
+def load_encoder(model_name: str, backend: str = "torch") -> Any:
+    # backend="onnx" runs an int8 quantized ONNX export of the same model, see onnx_encoder.py
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unsupported embedding backend: {backend}")
+    key = encoder_key(model_name, backend)
+    with _encoder_lock:
+        if key not in _encoder_cache:
+            logger.info(f"Loading embedding model {model_name} with the {backend} backend")
+            if backend == "onnx":
+                _encoder_cache[key] = OnnxEncoder(model_name)
+            else:
+                # imported here, sentence_transformers pulls in torch and takes seconds to import
+                from sentence_transformers import SentenceTransformer
+                _encoder_cache[key] = SentenceTransformer(model_name)
+        return _encoder_cache[key]
+
+def chunk_file(file_dict: Dict[str, str]) -> Tuple[str, List[str]]:
+    # module level so it can be sent to worker processes
+    filename = file_dict.get('filename', 'direct_input')
+    try:
+        logger.debug(f"Processing file: {filename}")
+
+        # get the language of the file
+        language = os.path.splitext(filename)[1][1:].upper() if os.path.splitext(filename)[1] else "TXT"
+        logger.debug(f"Detected language: {language}")
+
+        # split into meaningful chunks
+        return filename, RAG._split_into_chunks(file_dict['content'], language)
+    except Exception as e:
+        logger.warning(f"Could not process file {filename}: {str(e)}")
+        return filename, []
+
 class RAG:
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', index_path: str = 'code_index.faiss'):
+    # index_path=None keeps the index in memory only, use_executor=False encodes on the calling thread,
+    # backend is "torch" or "onnx" and defaults to EMBEDDING_BACKEND, index_type is "flat", "fp16", "sq8"
+    # or "pq" and defaults to EMBEDDING_INDEX_TYPE, chunk_compression is None, "zlib" or "zstd" and
+    # defaults to CHUNK_COMPRESSION, compressed indexes rerank rerank * k candidates on exact vectors
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', index_path: Optional[str] = 'code_index.faiss', use_executor: bool = True, backend: Optional[str] = None,
+                 index_type: Optional[str] = None, chunk_compression: Optional[str] = None, rerank: int = 4):
         logger.info("Initializing RAG")
-        self.model: SentenceTransformer = SentenceTransformer(model_name)
-        self.index_path: str = index_path
-        self.index: Optional[faiss.Index] = None
-        self.code_chunks: List[str] = []
+        self.model_name = model_name
+        self.backend = backend or os.getenv("EMBEDDING_BACKEND", "torch")
+        self.encoder_key = encoder_key(model_name, self.backend)
+        # with a model server running the encoder lives there and batches across workers itself
+        client = get_client()
+        # a SentenceTransformer, OnnxEncoder or RemoteEncoder
+        self.model: Any = RemoteEncoder(model_name, client, self.backend) if client is not None else load_encoder(model_name, self.backend)
+        self.executor: Optional[EmbeddingExecutor] = get_embedding_executor(self.encoder_key, self.model) if use_executor and client is None else None
+        self.index_path: Optional[str] = index_path
+        # a faiss.Index, faiss is imported on first use since it is only needed once code is indexed
+        self.index: Any = None
+        self.index_type = index_type or os.getenv("EMBEDDING_INDEX_TYPE", "flat")
+        self.chunk_compression = chunk_compression or os.getenv("CHUNK_COMPRESSION") or None
+        self.rerank = rerank
+        # full precision vectors on disk, only needed when the index itself is lossy
+        self.exact: Optional[ExactVectors] = None
+        if self.index_type != "flat":
+            self.exact = ExactVectors(f"{index_path}.vectors.npy" if index_path else None)
+        self.code_chunks: Union[List[str], ChunkStore] = []
+        # identifiers and words of the chunks, for hybrid retrieval
+        self.lexical = BM25Index()
         self.metadata: List[Dict[str, Any]] = []
+        # bumped whenever the index changes, so cached results from before never match again
+        self.index_version = 0
+        # hash of every file embedded so far, the same across processes, stage checkpoints key on it
+        self.content_digest = ""
+        self.results = LRUCache(int(os.getenv("RAG_RESULT_CACHE_SIZE", "256")), name="rag.results")
         logger.debug(f"Model name: {model_name}, Index path: {index_path}")
 
         # initializes faiss index if not found then must be first run
@@ -33,6 +111,7 @@ class RAG:
             self.index = None
         else:
             try:
+                import faiss
                 logger.debug(f"Loading existing index from {self.index_path}")
                 self.index = faiss.read_index(self.index_path)
                 logger.info("Successfully loaded existing index")
@@ -69,64 +148,93 @@ class RAG:
             return {"filename": "", "content": ""}
 
 
-    def embed_code(self, code_files: List[Dict[str, str]]) -> None:
+    def embed_code(self, code_files: List[Dict[str, str]], max_workers: int = 1, batch_size: int = 32) -> None:
         logger.info(f"Starting code embedding process for {len(code_files)} files")
         code_chunks = []
         metadata = []
 
-        # Process each dictionary of code content
-        for file_dict in code_files:
-            try:
-                content = file_dict['content']
-                filename = file_dict['filename']
-                logger.debug(f"Processing file: {filename}")
+        # chunking is pure python, so large inputs are split across processes
+        if max_workers > 1 and len(code_files) > 1:
+            logger.debug(f"Chunking files with {max_workers} processes")
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                chunked = list(executor.map(chunk_file, code_files, chunksize=max(1, len(code_files) // (max_workers * 4))))
+        else:
+            chunked = [chunk_file(file_dict) for file_dict in code_files]
 
-                # get the language of the file
-                language = os.path.splitext(filename)[1][1:].upper() if os.path.splitext(filename)[1] else "TXT"
-                logger.debug(f"Detected language: {language}")
-                
-                # split into meaningful chunks
-                chunks = self._split_into_chunks(content, language)
-                code_chunks.extend(chunks)
-                logger.debug(f"Created {len(chunks)} chunks for {filename}")
-                
-                # store metadata for each chunk
-                for i, chunk in enumerate(chunks):
-                    metadata.append({
-                        'file_name': filename,
-                        'chunk_number': i,
-                        'start_line': i * 10,
-                    })
-            except Exception as e:
-                logger.warning(f"Could not process file {filename}: {str(e)}")
-                continue
+        for filename, chunks in chunked:
+            code_chunks.extend(chunks)
+            logger.debug(f"Created {len(chunks)} chunks for {filename}")
+
+            # store metadata for each chunk
+            for i, chunk in enumerate(chunks):
+                metadata.append({
+                    'file_name': filename,
+                    'chunk_number': i,
+                    'start_line': i * 10,
+                })
 
         if not code_chunks:
             logger.error("No valid code chunks were extracted from the files")
             raise ValueError("No valid code chunks were extracted from the files.")
 
-        self.code_chunks = code_chunks
+        self.code_chunks = ChunkStore(code_chunks, self.chunk_compression) if self.chunk_compression else code_chunks
         self.metadata = metadata
+        digest = hashlib.sha256(f"{self.content_digest}\0{self.encoder_key}\0{self.index_type}".encode("utf-8"))
+        for file_dict in code_files:
+            digest.update(f"\0{file_dict.get('filename', '')}\0{file_dict.get('content', '')}".encode("utf-8"))
+        self.content_digest = digest.hexdigest()
+        self.lexical.build(code_chunks)
         logger.info(f"Total chunks created: {len(code_chunks)}")
         
         # create embeddings for each chunk
         logger.info("Creating embeddings for chunks")
-        embeddings = self.model.encode(code_chunks, show_progress_bar=True)
+        with tracer.span("rag.embed_code", chunks=len(code_chunks), files=len(code_files)):
+            embeddings = self.encode(code_chunks, batch_size=batch_size, show_progress_bar=True)
         logger.debug(f"Created embeddings with shape: {embeddings.shape}")
 
-        # initialize or update faiss index
-        if self.index is None:
-            logger.debug("Initializing new FAISS index")
-            self.index = faiss.IndexFlatL2(embeddings.shape[1])
+        # initialize or update faiss index, compressed types are trained on the first batch
+        if self.index is None or self.index.ntotal == 0:
+            logger.debug(f"Initializing new {self.index_type} FAISS index")
+            self.index = build_index(np.array(embeddings), self.index_type)
         self.index.add(np.array(embeddings))
+        if self.exact is not None:
+            self.exact.add(embeddings)
+        self._index_changed()
         logger.debug(f"Added {len(embeddings)} embeddings to index")
         
         # save index
-        logger.info(f"Saving index to {self.index_path}")
-        faiss.write_index(self.index, self.index_path)
-        logger.info("Index saved successfully")
+        if self.index_path:
+            import faiss
+            logger.info(f"Saving index to {self.index_path}")
+            faiss.write_index(self.index, self.index_path)
+            logger.info("Index saved successfully")
+
+    def encode(self, texts: List[str], **kwargs: Any) -> np.ndarray:
+        # identical encodes running at the same time, e.g. the same file in two sessions, share one pass
+        digest = hashlib.sha256("\0".join(texts).encode("utf-8")).hexdigest()
+        if self.executor is not None:
+            # batched with encodes from every other session, the executor picks the batch size
+            return embedding_flights.do((self.encoder_key, len(texts), digest), lambda: self.executor.encode(texts))
+        return embedding_flights.do((self.encoder_key, len(texts), digest), lambda: self.model.encode(texts, **kwargs))
 
-    def _split_into_chunks(self, content: str, lang: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+    def encode_query(self, query: str) -> np.ndarray:
+        # repeated fault descriptions ("SQL injection", "null pointer dereference") skip the encoder entirely
+        text = normalize_query(query)
+        key = (self.encoder_key, text)
+        embedding = query_embeddings.get(key)
+        if embedding is None:
+            embedding = np.asarray(self.encode([text]))
+            query_embeddings.put(key, embedding)
+        else:
+            logger.debug("Query embedding served from cache")
+        return embedding
+
+    def _index_changed(self) -> None:
+        self.index_version += 1
+        self.results.clear()
+
+    @staticmethod
+    def _split_into_chunks(content: str, lang: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
         logger.debug(f"Starting content splitting with lang={lang}, chunk_size={chunk_size}, overlap={overlap}")
         # error catching
         if not content:
@@ -187,16 +295,32 @@ class RAG:
             raise RuntimeError(f"Error splitting content into chunks: {str(e)}")
 
 
-    def retrieve_context(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+    # hybrid=True also searches the BM25 index and fuses both rankings, each side supplies up to
+    # candidates results (default 4 * k) before the fused top k are returned
+    def retrieve_context(self, query: str, k: int = 5, hybrid: bool = False, candidates: Optional[int] = None) -> List[Dict[str, Any]]:
         logger.debug(f"Starting context retrieval for query with k={k}")
         if self.index is None or self.index.ntotal == 0:
             logger.error("Attempted to query empty Faiss index")
             raise ValueError("The Faiss index is empty. Please embed code before querying.")
 
-        logger.debug("Encoding query")
-        query_embedding = self.model.encode([query])
-        logger.debug("Searching index")
-        distances, indices = self.index.search(np.array(query_embedding), k)
+        # results are only reused for the index version they were computed against
+        digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+        cache_key = (self.index_version, digest, k, hybrid, candidates)
+        cached = self.results.get(cache_key)
+        if cached is not None:
+            logger.debug("Retrieval results served from cache")
+            return [dict(result) for result in cached]
+
+        fetch = max(k, candidates or 4 * k) if hybrid else k
+        with tracer.span("rag.retrieve_context", k=k):
+            logger.debug("Encoding query")
+            query_embedding = self.encode_query(query)
+            logger.debug("Searching index")
+            if self.exact is not None and len(self.exact) == self.index.ntotal:
+                distances, indices = self._search_and_rerank(np.array(query_embedding), fetch)
+            else:
+                distances, indices = self.index.search(np.array(query_embedding), fetch)
+            lexical_hits = self.lexical.search(query, fetch) if hybrid else []
 
         results = []
         logger.debug(f"Processing {len(indices[0])} search results")
@@ -205,26 +329,55 @@ class RAG:
                 results.append({
                     'code': self.code_chunks[idx],
                     'metadata': self.metadata[idx],
-                    'similarity_score': float(1 / (1 + distances[0][i]))
+                    'similarity_score': float(1 / (1 + distances[0][i])),
+                    'chunk_id': int(idx)
                 })
                 logger.debug(f"Added result {i+1} with similarity score {float(1 / (1 + distances[0][i]))}")
             else:
                 logger.warning(f"Skipping invalid index {idx}")
+        if hybrid:
+            results = self._fuse(results, lexical_hits, k)
 
         if not results:
             logger.error("No relevant context found in search results")
             raise ValueError("No relevant context found. The index may not be populated correctly.")
 
+        self.results.put(cache_key, [dict(result) for result in results])
         logger.info(f"Successfully retrieved {len(results)} context results")
         return results
 
+    def _fuse(self, vector_results: List[Dict[str, Any]], lexical_hits: List[Tuple[int, float]], k: int, rrf_k: int = 60) -> List[Dict[str, Any]]:
+        # reciprocal rank fusion, ranks are comparable where BM25 and L2 scores are not
+        fused: Dict[int, Dict[str, Any]] = {}
+        for rank, result in enumerate(vector_results):
+            fused[result['chunk_id']] = dict(result, fused_score=1 / (rrf_k + rank + 1))
+        for rank, (idx, score) in enumerate(lexical_hits):
+            if idx not in fused:
+                if idx >= len(self.code_chunks):
+                    continue
+                fused[idx] = {'code': self.code_chunks[idx], 'metadata': self.metadata[idx], 'similarity_score': 0.0, 'chunk_id': idx, 'fused_score': 0.0}
+            fused[idx]['fused_score'] += 1 / (rrf_k + rank + 1)
+            fused[idx]['lexical_score'] = score
+        return sorted(fused.values(), key=lambda result: -result['fused_score'])[:k]
+
+    def _search_and_rerank(self, query_embedding: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # the compressed index picks candidates, exact vectors decide their order and distances
+        _, candidates = self.index.search(query_embedding, k * self.rerank)
+        ids = candidates[0][candidates[0] >= 0]
+        distances = self.exact.distances(query_embedding[0], ids)
+        order = np.argsort(distances)[:k]
+        return distances[order][None, :], ids[order][None, :]
+
     def clear_index(self) -> None:
+        import faiss
         # Check if index exists
         if not hasattr(self, 'index') or self.index is None:
             logger.info("Index doesn't exist, creating new empty index")
             self.index = faiss.IndexFlatL2(384)
             self.code_chunks = []
             self.metadata = []
+            self.content_digest = ""
+            self._index_changed()
         # Check if index is already empty
         elif self.index.ntotal == 0 and not self.code_chunks and not self.metadata:
             logger.info("Index is already empty, no action needed")
@@ -234,8 +387,14 @@ class RAG:
             self.index = faiss.IndexFlatL2(384)
             self.code_chunks = []
             self.metadata = []
+            self.lexical = BM25Index()
+            if self.exact is not None:
+                self.exact.clear()
+            self.content_digest = ""
+            self._index_changed()
         
         # Write the empty index to disk
-        logger.debug("Writing empty index to disk")
-        faiss.write_index(self.index, self.index_path)
+        if self.index_path:
+            logger.debug("Writing empty index to disk")
+            faiss.write_index(self.index, self.index_path)
         logger.info("Index cleared successfully")
\ No newline at end of file
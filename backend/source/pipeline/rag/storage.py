@@ -0,0 +1,198 @@
+import os
+import zlib
+import logging
+import tempfile
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator, List, Optional, Union
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# faiss index_factory strings, "flat" keeps the original exact fp32 IndexFlatL2
+INDEX_TYPES = {
+    "flat": "Flat",
+    "fp16": "SQfp16",
+    "sq8": "SQ8",
+    "pq": "PQ{m}x8",
+}
+# PQ with 8 bit codes needs at least this many vectors to train its 256 centroids
+PQ_MIN_TRAINING = 256
+
+def build_index(embeddings: np.ndarray, index_type: str = "flat") -> Any:
+    import faiss
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type: {index_type}")
+    dim = embeddings.shape[1]
+    description = INDEX_TYPES[index_type]
+    if index_type == "pq":
+        if len(embeddings) < PQ_MIN_TRAINING:
+            # too few vectors to train the codebooks, int8 scalar quantization needs no minimum
+            logger.info(f"Only {len(embeddings)} vectors, using sq8 instead of pq")
+            description = INDEX_TYPES["sq8"]
+        else:
+            # 8 dimensions per sub-quantizer: 384-d MiniLM vectors become 48 byte codes
+            m = next(m for m in (dim // 8, dim // 4, dim // 2, dim) if m and dim % m == 0)
+            description = description.format(m=m)
+    index = faiss.index_factory(dim, description, faiss.METRIC_L2)
+    if not index.is_trained:
+        index.train(embeddings)
+    return index
+
+class ChunkStore:
+    """
+    List-like store for chunk text. Chunks are utf-8 encoded into blocks of block_size
+    and each full block is compressed (zstd when the zstandard package is installed,
+    zlib otherwise). Access decodes the block and keeps a few recent ones decoded.
+    """
+    def __init__(self, chunks: Iterable[str] = (), compression: Optional[str] = "zstd", block_size: int = 64, cache_blocks: int = 8) -> None:
+        self.block_size = block_size
+        self.compression = self._resolve(compression)
+        self._blocks: List[bytes] = []
+        self._offsets: List[np.ndarray] = []
+        self._tail: List[str] = []
+        self._cache: "OrderedDict[int, List[str]]" = OrderedDict()
+        self._cache_blocks = cache_blocks
+        self._lock = threading.Lock()
+        if self.compression == "zstd":
+            import zstandard
+            self._compressor = zstandard.ZstdCompressor(level=3)
+            self._decompressor = zstandard.ZstdDecompressor()
+        self.extend(chunks)
+
+    @staticmethod
+    def _resolve(compression: Optional[str]) -> Optional[str]:
+        if compression == "zstd":
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                logger.info("zstandard is not installed, compressing chunks with zlib")
+                return "zlib"
+        if compression not in (None, "zlib", "zstd"):
+            raise ValueError(f"Unsupported chunk compression: {compression}")
+        return compression
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.compression == "zstd":
+            return self._compressor.compress(data)
+        if self.compression == "zlib":
+            return zlib.compress(data, 6)
+        return data
+
+    def _decompress(self, data: bytes) -> bytes:
+        if self.compression == "zstd":
+            return self._decompressor.decompress(data)
+        if self.compression == "zlib":
+            return zlib.decompress(data)
+        return data
+
+    def _seal(self) -> None:
+        encoded = [chunk.encode("utf-8") for chunk in self._tail]
+        self._offsets.append(np.cumsum([0] + [len(data) for data in encoded], dtype=np.uint32))
+        self._blocks.append(self._compress(b"".join(encoded)))
+        self._tail = []
+
+    def append(self, chunk: str) -> None:
+        with self._lock:
+            self._tail.append(chunk)
+            if len(self._tail) == self.block_size:
+                self._seal()
+
+    def extend(self, chunks: Iterable[str]) -> None:
+        for chunk in chunks:
+            self.append(chunk)
+
+    def _block(self, number: int) -> List[str]:
+        with self._lock:
+            if number == len(self._blocks):
+                return list(self._tail)
+            if number in self._cache:
+                self._cache.move_to_end(number)
+                return self._cache[number]
+            data = self._decompress(self._blocks[number])
+            offsets = self._offsets[number]
+            chunks = [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+            self._cache[number] = chunks
+            if len(self._cache) > self._cache_blocks:
+                self._cache.popitem(last=False)
+            return chunks
+
+    def __len__(self) -> int:
+        return len(self._blocks) * self.block_size + len(self._tail)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        return self._block(index // self.block_size)[index % self.block_size]
+
+    def __iter__(self) -> Iterator[str]:
+        for number in range(len(self._blocks) + (1 if self._tail else 0)):
+            yield from self._block(number)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (list, ChunkStore)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def nbytes(self) -> int:
+        return sum(len(block) for block in self._blocks) + sum(offsets.nbytes for offsets in self._offsets) + sum(len(chunk) for chunk in self._tail)
+
+class ExactVectors:
+    """
+    Full precision copies of the indexed vectors in a memory-mapped file, used only to
+    rerank the few candidates a compressed index returns. Pages are read on demand, so
+    the vectors don't count against resident memory the way an IndexFlatL2 does.
+    """
+    def __init__(self, path: Optional[str] = None) -> None:
+        self._temporary = path is None
+        if path is None:
+            handle, path = tempfile.mkstemp(suffix=".vectors.npy")
+            os.close(handle)
+        self.path = path
+        self.vectors: Optional[np.ndarray] = None
+        if not self._temporary and os.path.exists(path):
+            self.vectors = np.load(path, mmap_mode="r")
+
+    def __len__(self) -> int:
+        return 0 if self.vectors is None else len(self.vectors)
+
+    def add(self, embeddings: np.ndarray) -> None:
+        embeddings = np.asarray(embeddings, dtype="float32")
+        previous = self.vectors
+        total = len(embeddings) + (0 if previous is None else len(previous))
+        # write the combined array to a new file, then swap it in
+        staging = self.path + ".tmp"
+        vectors = np.lib.format.open_memmap(staging, mode="w+", dtype="float32", shape=(total, embeddings.shape[1]))
+        if previous is not None:
+            vectors[:len(previous)] = previous
+        vectors[total - len(embeddings):] = embeddings
+        vectors.flush()
+        del vectors
+        os.replace(staging, self.path)
+        self.vectors = np.load(self.path, mmap_mode="r")
+
+    def distances(self, query: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        # squared L2, the same measure IndexFlatL2 reports
+        diff = np.asarray(self.vectors[ids]) - query[None, :]
+        return np.einsum("ij,ij->i", diff, diff)
+
+    def clear(self) -> None:
+        self.vectors = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __del__(self) -> None:
+        if getattr(self, "_temporary", False):
+            try:
+                self.clear()
+            except Exception:
+                pass
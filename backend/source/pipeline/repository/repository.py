@@ -0,0 +1,139 @@
+import os
+import sys
+import tarfile
+import zipfile
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional
+
+from backend.source.pipeline.rag.rag import RAG
+from backend.source.pipeline.pipeline import Pipeline, fireworks_api_key
+from backend.source.pipeline.batch.batch_runner import SUPPORTED_EXTENSIONS
+from backend.source.pipeline.minify.minifier import language_for, minify
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../')))
+from source.model.model import Model
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+"""
+repository mode: the whole repository is chunked, embedded and tokenized once, then every file
+runs through its own Pipeline that shares the repository-wide index for pattern matching
+"""
+class RepositoryPipeline:
+    def __init__(self, source: str, model: Optional[str] = None, test: bool = False, max_workers: int = 4, batch_size: int = 64, checkpoint_dir: Optional[str] = "pipeline_checkpoints", index_path: Optional[str] = None) -> None:
+        logger.info(f"Initializing RepositoryPipeline for {source}")
+        self.source = source
+        self.model_selection = model
+        self.test = test
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.checkpoint_dir = checkpoint_dir
+        self.index_path = index_path
+
+        self.files: List[Dict[str, str]] = []
+        self.tokens: Dict[str, List[int]] = {}
+        self.model: Optional[Model] = None
+        self.rag: Optional[RAG] = None
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def _is_source_file(self, name: str) -> bool:
+        parts = name.replace("\\", "/").split("/")
+        return name.lower().endswith(SUPPORTED_EXTENSIONS) and not any(part.startswith(".") for part in parts[:-1])
+
+    def load_files(self) -> List[Dict[str, str]]:
+        # filenames are kept relative to the repository root so context from other files is identifiable
+        files: List[Dict[str, str]] = []
+        if os.path.isdir(self.source):
+            for dirpath, dirnames, filenames in os.walk(self.source):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+                for filename in sorted(filenames):
+                    path = os.path.join(dirpath, filename)
+                    relpath = os.path.relpath(path, self.source)
+                    if self._is_source_file(relpath):
+                        with open(path, "r", encoding="utf-8", errors="replace") as f:
+                            files.append({"filename": relpath, "content": f.read()})
+        elif zipfile.is_zipfile(self.source):
+            with zipfile.ZipFile(self.source) as archive:
+                for name in sorted(archive.namelist()):
+                    if not name.endswith("/") and self._is_source_file(name):
+                        files.append({"filename": name, "content": archive.read(name).decode("utf-8", errors="replace")})
+        elif tarfile.is_tarfile(self.source):
+            with tarfile.open(self.source) as archive:
+                for member in sorted(archive.getmembers(), key=lambda m: m.name):
+                    if member.isfile() and self._is_source_file(member.name):
+                        files.append({"filename": member.name, "content": archive.extractfile(member).read().decode("utf-8", errors="replace")})
+        else:
+            raise ValueError(f"Repository source must be a directory, zip or tar archive: {self.source}")
+
+        # empty files have nothing to embed or analyze
+        self.files = [f for f in files if f["content"].strip()]
+        logger.info(f"Loaded {len(self.files)} source files")
+        return self.files
+
+    def set_model(self) -> None:
+        if self.test:
+            self.model = Model(None, None, None, test=True)
+        else:
+            self.model = Model(self.model_selection, fireworks_api_key, "fireworks")
+
+    def ingest(self) -> None:
+        logger.info("Starting repository ingestion")
+        if not self.files:
+            self.load_files()
+        if not self.files:
+            raise ValueError("No source files found in repository")
+        if self.model is None:
+            self.set_model()
+
+        # one index for the whole repository, built with parallel chunking and batched embeddings
+        self.rag = RAG(index_path=self.index_path)
+        self.rag.embed_code(self.files, max_workers=self.max_workers, batch_size=self.batch_size)
+
+        # tokenize every file in one batched call so per-file fault localization never re-encodes,
+        # its prompts carry the minified file so those are the tokens it needs
+        contents = [minify(f["content"], language_for(f["filename"])).text for f in self.files]
+        encoded = self.model.tokenizer(contents, add_special_tokens=False)["input_ids"]
+        self.tokens = {f["filename"]: ids for f, ids in zip(self.files, encoded)}
+        logger.info(f"Ingested {len(self.files)} files into {len(self.rag.code_chunks)} chunks")
+
+    def run_file(self, file_dict: Dict[str, str]) -> Dict[str, Any]:
+        filename = file_dict["filename"]
+        pipeline = Pipeline(
+            filename,
+            file_dict["content"],
+            self.model_selection,
+            test=self.test,
+            checkpoint_dir=self.checkpoint_dir,
+            rag=self.rag,
+            tokens=self.tokens.get(filename)
+        )
+        pipeline.run_pipline()
+        return {
+            "localization": pipeline.localization,
+            "final_patch": pipeline.final_patch,
+            "validation": pipeline.validation,
+        }
+
+    def run(self, filenames: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        if self.rag is None:
+            self.ingest()
+
+        selected = [f for f in self.files if filenames is None or f["filename"] in filenames]
+        logger.info(f"Running pipeline on {len(selected)} files")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.run_file, file_dict): file_dict["filename"] for file_dict in selected}
+            for future in as_completed(futures):
+                filename = futures[future]
+                try:
+                    self.results[filename] = future.result()
+                    logger.info(f"Completed {filename}")
+                except Exception as e:
+                    logger.error(f"Error processing {filename}: {str(e)}")
+                    self.results[filename] = {"error": str(e)}
+        return self.results
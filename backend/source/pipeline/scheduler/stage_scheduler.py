@@ -0,0 +1,168 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import List, Dict, Any, Callable, Optional, Set
+
+from backend.source.telemetry.tracing import tracer
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class Stage:
+    def __init__(self, name: str, run: Callable[[], None], inputs: List[str], outputs: List[str], version: str = "1", skip_downstream: Optional[Callable[[], bool]] = None) -> None:
+        # inputs and outputs are (dotted) attribute names on the scheduler state
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.version = version
+        self.skip_downstream = skip_downstream
+
+class StageScheduler:
+    def __init__(self, state: Any, stages: List[Stage], checkpoint_dir: Optional[str] = None, on_progress: Optional[Callable[[str, str], None]] = None) -> None:
+        logger.info("Initializing StageScheduler")
+        self.state = state
+        self.stages: Dict[str, Stage] = {stage.name: stage for stage in stages}
+        self.checkpoint_dir = checkpoint_dir
+        # called with (stage, status) as each stage starts, finishes, is restored or skipped
+        self.on_progress = on_progress
+        self.order: List[str] = self._topological_order()
+        self.executed: List[str] = []
+        self.restored: List[str] = []
+        self.skipped: List[str] = []
+        logger.debug(f"Stage order: {self.order}")
+
+    def _producers(self) -> Dict[str, str]:
+        producers: Dict[str, str] = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"Output '{output}' is produced by both {producers[output]} and {stage.name}")
+                producers[output] = stage.name
+        return producers
+
+    def dependencies(self, name: str) -> Set[str]:
+        producers = self._producers()
+        return {producers[i] for i in self.stages[name].inputs if i in producers and producers[i] != name}
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        visiting: Set[str] = set()
+
+        def visit(name: str) -> None:
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage graph has a cycle through {name}")
+            visiting.add(name)
+            for dependency in sorted(self.dependencies(name)):
+                visit(dependency)
+            visiting.discard(name)
+            order.append(name)
+
+        # stages are declared in run order, keep that order among independent stages
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def downstream(self, name: str) -> Set[str]:
+        reached: Set[str] = set()
+        frontier = [name]
+        while frontier:
+            current = frontier.pop()
+            for other in self.order:
+                if other not in reached and current in self.dependencies(other):
+                    reached.add(other)
+                    frontier.append(other)
+        return reached
+
+    def _resolve(self, path: str) -> Any:
+        value = self.state
+        for attr in path.split("."):
+            value = getattr(value, attr, None)
+        return value
+
+    def stage_key(self, name: str) -> str:
+        stage = self.stages[name]
+        payload = {
+            "stage": stage.name,
+            "version": stage.version,
+            "inputs": {path: self._resolve(path) for path in stage.inputs}
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _checkpoint_path(self, name: str, key: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"{name}-{key}.json")
+
+    def _load_checkpoint(self, name: str, key: str) -> Optional[Dict[str, Any]]:
+        if not self.checkpoint_dir:
+            return None
+        path = self._checkpoint_path(name, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {path}: {str(e)}")
+            return None
+
+    def _save_checkpoint(self, name: str, key: str) -> None:
+        if not self.checkpoint_dir:
+            return
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        outputs = {output: getattr(self.state, output) for output in self.stages[name].outputs}
+        path = self._checkpoint_path(name, key)
+        # write then rename so a crash never leaves a truncated checkpoint behind
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(outputs, f)
+        os.replace(tmp_path, path)
+        logger.debug(f"Saved checkpoint {path}")
+
+    def _report(self, name: str, status: str) -> None:
+        if self.on_progress is not None:
+            self.on_progress(name, status)
+
+    def run(self) -> None:
+        logger.info("Starting scheduled pipeline run")
+        self.executed, self.restored, self.skipped = [], [], []
+        skipped: Set[str] = set()
+
+        for name in self.order:
+            stage = self.stages[name]
+            if name in skipped:
+                logger.info(f"Skipping stage {name}")
+                self.skipped.append(name)
+                self._report(name, "skipped")
+                continue
+
+            key = self.stage_key(name)
+            checkpoint = self._load_checkpoint(name, key)
+            if checkpoint is not None:
+                logger.info(f"Restoring stage {name} from checkpoint")
+                with tracer.span("stage", stage=name, cache_hit=True):
+                    for output, value in checkpoint.items():
+                        setattr(self.state, output, value)
+                self.restored.append(name)
+                self._report(name, "restored")
+            else:
+                logger.info(f"Running stage {name}")
+                self._report(name, "running")
+                stage.run()
+                self._save_checkpoint(name, key)
+                self.executed.append(name)
+                self._report(name, "done")
+
+            if stage.skip_downstream is not None and stage.skip_downstream():
+                logger.info(f"Stage {name} requested downstream stages be skipped")
+                skipped |= self.downstream(name)
+
+        logger.info(f"Scheduled run complete - executed: {self.executed}, restored: {self.restored}, skipped: {self.skipped}")
@@ -0,0 +1,64 @@
+import os
+import re
+import sys
+import json
+import logging
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# "import time: self [us] | cumulative | imported package", nesting shown by indentation
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+# run in a fresh interpreter so nothing is imported before the clock starts
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from components.front_page import create_full_ui
+imported = time.perf_counter()
+create_full_ui()
+built = time.perf_counter()
+print(json.dumps({"import_seconds": imported - start, "build_seconds": built - imported}))
+"""
+
+def parse_importtime(output: str) -> List[Tuple[str, int, int, int]]:
+    # (module, self microseconds, cumulative microseconds, depth) for every line of python -X importtime
+    modules = []
+    for line in output.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            modules.append((match.group(4), int(match.group(1)), int(match.group(2)), (len(match.group(3)) - 1) // 2))
+    return modules
+
+def profile_startup(root: Optional[str] = None) -> Tuple[List[Tuple[str, int, int, int]], Dict[str, float]]:
+    root = root or os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..'))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT], cwd=root, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup profile failed: {result.stderr.strip().splitlines()[-1:] or result.returncode}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return parse_importtime(result.stderr), timings
+
+def format_report(modules: List[Tuple[str, int, int, int]], timings: Dict[str, float], top: int = 25) -> str:
+    lines = [
+        f"UI imports: {timings['import_seconds']:.2f}s, UI build: {timings['build_seconds']:.2f}s",
+        "",
+        "Slowest packages (including what they import):",
+    ]
+    # a package's own line covers its submodules and dependencies, nested packages count in both
+    packages = {module: cumulative for module, _, cumulative, _ in modules if "." not in module}
+    for package, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"  {cumulative / 1e6:8.3f}s  {package}")
+    lines += ["", "Slowest modules (self):"]
+    for module, own, _, _ in sorted(modules, key=lambda item: -item[1])[:top]:
+        lines.append(f"  {own / 1e6:8.3f}s  {module}")
+    return "\n".join(lines)
+
+def main(top: int = 25) -> None:
+    modules, timings = profile_startup()
+    print(format_report(modules, timings, top))
@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, List, Iterable, Iterator
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# attributes that are summed into counters rather than kept per span only
+COUNTER_ATTRIBUTES = ("prompt_tokens", "completion_tokens", "retries", "hedges", "escalated", "coalesced", "capped", "prefix_tokens", "cached_tokens")
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start = time.time()
+        self.duration: float = 0.0
+        self.error: Optional[str] = None
+        # other traces this span also counts towards, see Tracer.span
+        self.links: List[str] = []
+        self.keep_trace = True
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def increment(self, attribute: str, amount: int = 1) -> None:
+        self.attributes[attribute] = self.attributes.get(attribute, 0) + amount
+
+    @property
+    def label(self) -> str:
+        # stage spans are reported per stage rather than lumped together
+        stage = self.attributes.get("stage")
+        return f"{self.name}[{stage}]" if stage else self.name
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "links": self.links,
+            "start": self.start,
+            "duration": self.duration,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+class Tracer:
+    def __init__(self, trace_path: Optional[str] = None, max_traces: int = 100, max_bytes: int = 50 * 1024 * 1024) -> None:
+        self.trace_path = trace_path
+        self.max_traces = max_traces
+        # past this size the trace file moves to <trace_path>.1, replacing the previous one
+        self.max_bytes = max_bytes
+        self._current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+        self._lock = threading.Lock()
+        # only serializes file writes, spans are recorded under _lock without waiting on the disk
+        self._file_lock = threading.Lock()
+        self._traces: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._durations: Dict[str, float] = defaultdict(float)
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._cache_hits: Dict[str, int] = defaultdict(int)
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def current_span(self) -> Optional[Span]:
+        return self._current.get()
+
+    def current_trace_id(self) -> Optional[str]:
+        span = self._current.get()
+        return span.trace_id if span is not None else None
+
+    # work done on another thread for several callers (e.g. a shared embedding batch) passes the
+    # first caller's span as parent and the other callers' traces as links, keep_trace=False
+    # counts a span in the metrics without keeping it as a trace of its own
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, links: Iterable[str] = (), keep_trace: bool = True, **attributes: Any) -> Iterator[Span]:
+        if parent is None:
+            parent = self._current.get()
+        trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        span = Span(name, trace_id, parent.span_id if parent is not None else None, attributes)
+        span.links = [link for link in dict.fromkeys(links) if link != trace_id]
+        span.keep_trace = keep_trace
+        token = self._current.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            self._current.reset(token)
+            self._record(span)
+
+    def add(self, **attributes: Any) -> None:
+        # annotate whatever span is active, a no-op outside any span
+        span = self._current.get()
+        if span is not None:
+            span.set(**attributes)
+
+    def _record(self, span: Span) -> None:
+        with self._lock:
+            for trace_id in ([span.trace_id] if span.keep_trace else []) + span.links:
+                self._traces.setdefault(trace_id, []).append(span)
+                self._traces.move_to_end(trace_id)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+            label = span.label
+            self._durations[label] += span.duration
+            self._counts[label] += 1
+            if span.error:
+                self._errors[label] += 1
+            if span.attributes.get("cache_hit"):
+                self._cache_hits[label] += 1
+            for attribute in COUNTER_ATTRIBUTES:
+                value = span.attributes.get(attribute)
+                if isinstance(value, (int, float)):
+                    self._counters[attribute][label] += value
+
+        if self.trace_path:
+            self._export(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def _export(self, line: str) -> None:
+        with self._file_lock:
+            try:
+                if self.max_bytes and os.path.exists(self.trace_path) and os.path.getsize(self.trace_path) + len(line) > self.max_bytes:
+                    os.replace(self.trace_path, f"{self.trace_path}.1")
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                logger.warning(f"Could not write span to {self.trace_path}: {str(e)}")
+
+    def spans(self, trace_id: str) -> List[Span]:
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+    def summary(self, trace_id: str) -> Dict[str, Dict[str, Any]]:
+        rows: Dict[str, Dict[str, Any]] = {}
+        for span in self.spans(trace_id):
+            row = rows.setdefault(span.label, {"count": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cache_hits": 0, "retries": 0, "capped": 0, "errors": 0})
+            row["count"] += 1
+            row["seconds"] += span.duration
+            row["prompt_tokens"] += span.attributes.get("prompt_tokens", 0) or 0
+            row["completion_tokens"] += span.attributes.get("completion_tokens", 0) or 0
+            row["cache_hits"] += 1 if span.attributes.get("cache_hit") else 0
+            row["retries"] += span.attributes.get("retries", 0) or 0
+            row["capped"] += span.attributes.get("capped", 0) or 0
+            row["errors"] += 1 if span.error else 0
+        return rows
+
+    def format_summary(self, trace_id: Optional[str]) -> str:
+        if not trace_id:
+            return "No run recorded yet."
+        rows = self.summary(trace_id)
+        if not rows:
+            return "No spans recorded for this run."
+        lines = [
+            "| Span | Calls | Seconds | Prompt tokens | Completion tokens | Cache hits | Retries | Capped | Errors |",
+            "| --- | --- | --- | --- | --- | --- | --- | --- | --- |",
+        ]
+        for label, row in sorted(rows.items(), key=lambda item: -item[1]["seconds"]):
+            lines.append(
+                f"| {label} | {row['count']} | {row['seconds']:.2f} | {row['prompt_tokens']} | "
+                f"{row['completion_tokens']} | {row['cache_hits']} | {row['retries']} | {row['capped']} | {row['errors']} |"
+            )
+        return "\n".join(lines)
+
+    def render_prometheus(self) -> str:
+        def escape(value: str) -> str:
+            return value.replace("\\", "\\\\").replace('"', '\\"')
+
+        with self._lock:
+            lines = [
+                "# HELP pipeline_span_seconds Wall time spent in spans.",
+                "# TYPE pipeline_span_seconds summary",
+            ]
+            for label in sorted(self._counts):
+                lines.append(f'pipeline_span_seconds_sum{{span="{escape(label)}"}} {self._durations[label]:.6f}')
+                lines.append(f'pipeline_span_seconds_count{{span="{escape(label)}"}} {self._counts[label]}')
+            for metric, values, help_text in [
+                ("pipeline_span_errors_total", self._errors, "Spans that raised an exception."),
+                ("pipeline_span_cache_hits_total", self._cache_hits, "Spans served from a cache."),
+            ]:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for label in sorted(values):
+                    lines.append(f'{metric}{{span="{escape(label)}"}} {values[label]}')
+            for attribute in COUNTER_ATTRIBUTES:
+                metric = f"pipeline_{attribute}_total"
+                lines.append(f"# HELP {metric} Sum of {attribute} recorded on spans.")
+                lines.append(f"# TYPE {metric} counter")
+                for label in sorted(self._counters[attribute]):
+                    lines.append(f'{metric}{{span="{escape(label)}"}} {self._counters[attribute][label]}')
+        return "\n".join(lines) + "\n"
+
+# process wide tracer, spans go to a JSONL file only when PIPELINE_TRACE_PATH is set
+tracer = Tracer(os.getenv("PIPELINE_TRACE_PATH") or None, max_bytes=int(os.getenv("PIPELINE_TRACE_MAX_BYTES", str(50 * 1024 * 1024))))
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = tracer.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            logger.debug(format % args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving Prometheus metrics on {host}:{server.server_address[1]}/metrics")
+    return server
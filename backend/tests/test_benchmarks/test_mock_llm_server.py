@@ -0,0 +1,65 @@
+import unittest
+import sys
+import os
+import json
+import time
+import urllib.request
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from backend.benchmarks.mock_llm_server import MockLLMServer
+from backend.benchmarks.run_benchmarks import make_corpus
+
+
+class TestMockLLMServer(unittest.TestCase):
+    def post(self, server: MockLLMServer, prompt: str) -> dict:
+        body = json.dumps({"model": "mock-llm", "messages": [{"role": "user", "content": prompt}]}).encode("utf-8")
+        request = urllib.request.Request(f"{server.url}/chat/completions", data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def test_pick_response_per_stage(self) -> None:
+        """Test that each stage's prompt gets its canned response."""
+        server = MockLLMServer(num_faults=3)
+        self.assertEqual(server.pick_response("Analyze the following code file")[0], "fault")
+        self.assertEqual(server.pick_response("Given the following fault and context")[0], "pattern")
+        self.assertEqual(server.pick_response("Apply the given pattern fix to the current code")[0], "patch")
+        self.assertEqual(server.pick_response("### **Strict Code Review and Fault Verification Task**")[0], "validation")
+        self.assertEqual(server.pick_response("hello")[0], "default")
+        self.assertEqual(server.responses["fault"].count("#### Fault"), 3)
+
+    def test_completion_round_trip(self) -> None:
+        """Test the OpenAI-compatible response shape and configured latency."""
+        with MockLLMServer(latency=0.05, responses={"patch": "```java\nclass A {}\n```"}) as server:
+            start = time.perf_counter()
+            payload = self.post(server, "Apply the provided pattern fix to the given file contents")
+            self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+        self.assertEqual(payload["choices"][0]["message"]["content"], "```java\nclass A {}\n```")
+        self.assertEqual(payload["choices"][0]["finish_reason"], "stop")
+        self.assertGreater(payload["usage"]["prompt_tokens"], 0)
+        self.assertEqual(server.request_counts, {"patch": 1})
+
+    def test_generation_limits(self) -> None:
+        """Test that stop sequences and max_tokens shorten the response like a real server."""
+        with MockLLMServer(responses={"patch": "```java\nclass A {}\n```\nDone."}) as server:
+            body = {"model": "mock-llm", "messages": [{"role": "user", "content": "Apply the given pattern fix"}], "stop": ["\n```\n"]}
+            request = urllib.request.Request(f"{server.url}/chat/completions", data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(request) as response:
+                stopped = json.loads(response.read())
+            body.update(stop=None, max_tokens=2)
+            request = urllib.request.Request(f"{server.url}/chat/completions", data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(request) as response:
+                capped = json.loads(response.read())
+
+        self.assertEqual(stopped["choices"][0]["message"]["content"], "```java\nclass A {}")
+        self.assertEqual(stopped["choices"][0]["finish_reason"], "stop")
+        self.assertEqual(capped["choices"][0]["message"]["content"], "```java\n")
+        self.assertEqual(capped["choices"][0]["finish_reason"], "length")
+
+    def test_corpus_is_deterministic(self) -> None:
+        """Test that the synthetic benchmark corpus is the same on every run."""
+        self.assertEqual(make_corpus(5), make_corpus(5))
+        self.assertEqual(len(make_corpus(5, methods_per_file=2)), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
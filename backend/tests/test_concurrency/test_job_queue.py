@@ -0,0 +1,140 @@
+import unittest
+import sys
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from backend.source.concurrency.job_queue import JobQueue, JobCancelled, QueueFull, raise_if_cancelled
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self) -> None:
+        """Start a queue with one worker and room for two waiting jobs."""
+        self.jobs = JobQueue(workers=1, max_pending=2, max_finished=3)
+        self.addCleanup(self.jobs.shutdown)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def blocker(self, job) -> str:
+        # holds the only worker until the test lets it go
+        self.release.wait(5)
+        return "released"
+
+    def test_result_and_progress(self) -> None:
+        """Test that a job gets an id, reports stage progress and keeps its result."""
+        def work(job, value):
+            job.report("first", "running")
+            job.report("first", "done")
+            job.report("second", "skipped")
+            return value * 2
+
+        job = self.jobs.submit(work, 21)
+        self.assertTrue(job.wait(5))
+        self.assertEqual((job.state, job.result), ("done", 42))
+        self.assertEqual(job.progress(), {"first": "done", "second": "skipped"})
+        self.assertIs(self.jobs.get(job.id), job)
+
+    def test_failed_job(self) -> None:
+        """Test that an exception fails the job without stopping the worker."""
+        def fail(job):
+            raise RuntimeError("boom")
+
+        failed = self.jobs.submit(fail)
+        after = self.jobs.submit(lambda job: "ok")
+        self.assertTrue(after.wait(5))
+        self.assertEqual((failed.state, failed.error), ("failed", "boom"))
+        self.assertEqual(after.result, "ok")
+
+    def test_queue_is_bounded(self) -> None:
+        """Test that submits past max_pending are rejected instead of piling up."""
+        running = self.jobs.submit(self.blocker)
+        while running.state != "running":
+            running.wait(0.01)
+        waiting = [self.jobs.submit(self.blocker) for _ in range(2)]
+        self.assertEqual([self.jobs.position(job.id) for job in waiting], [1, 2])
+        with self.assertRaises(QueueFull):
+            self.jobs.submit(self.blocker)
+        with self.assertRaises(QueueFull):
+            self.jobs.submit(self.blocker, timeout=0.05)
+        self.assertEqual(self.jobs.stats()["queued"], 2)
+
+        self.release.set()
+        self.assertTrue(all(job.wait(5) for job in waiting))
+
+    def test_cancelled_jobs_free_their_place(self) -> None:
+        """Test that cancelling a waiting job makes room for a new one straight away."""
+        running = self.jobs.submit(self.blocker)
+        while running.state != "running":
+            running.wait(0.01)
+        waiting = [self.jobs.submit(self.blocker) for _ in range(2)]
+        self.assertTrue(self.jobs.cancel(waiting[0].id))
+
+        replacement = self.jobs.submit(self.blocker)
+        self.assertEqual(self.jobs.position(replacement.id), 2)
+        with self.assertRaises(QueueFull):
+            self.jobs.submit(self.blocker)
+
+        # a submit waiting for room gets in once a queued job starts
+        threading.Timer(0.05, self.release.set).start()
+        self.assertTrue(self.jobs.submit(lambda job: "late", timeout=5).wait(5))
+
+    def test_cancel_queued_job(self) -> None:
+        """Test that a cancelled job that has not started never runs."""
+        calls = []
+        running = self.jobs.submit(self.blocker)
+        queued = self.jobs.submit(lambda job: calls.append(job.id))
+        self.assertTrue(self.jobs.cancel(queued.id))
+        self.assertEqual(queued.state, "cancelled")
+
+        self.release.set()
+        self.assertTrue(running.wait(5))
+        self.jobs.submit(lambda job: None).wait(5)
+        self.assertEqual(calls, [])
+        self.assertFalse(self.jobs.cancel(queued.id))
+
+    def test_cancel_running_job(self) -> None:
+        """Test that a running job stops at its next check, even in executor threads and past except Exception."""
+        started = threading.Event()
+        steps = []
+
+        def step(n):
+            raise_if_cancelled()
+            steps.append(n)
+
+        def work(job):
+            started.set()
+            self.release.wait(5)
+            try:
+                step(1)
+            except Exception:
+                steps.append("swallowed")
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(contextvars.copy_context().run, step, 2).result()
+
+        job = self.jobs.submit(work)
+        started.wait(5)
+        job.cancel()
+        self.release.set()
+        self.assertTrue(job.wait(5))
+        self.assertEqual((job.state, steps), ("cancelled", []))
+
+    def test_raise_if_cancelled_outside_job(self) -> None:
+        """Test that the cancellation check does nothing outside a job."""
+        raise_if_cancelled()
+        self.assertTrue(issubclass(JobCancelled, BaseException))
+        self.assertFalse(issubclass(JobCancelled, Exception))
+
+    def test_finished_jobs_are_evicted(self) -> None:
+        """Test that only the newest max_finished finished jobs are kept."""
+        jobs = []
+        for _ in range(5):
+            jobs.append(self.jobs.submit(lambda job: None))
+            jobs[-1].wait(5)
+        self.jobs.submit(lambda job: None).wait(5)
+        self.assertIsNone(self.jobs.get(jobs[0].id))
+        self.assertIsNotNone(self.jobs.get(jobs[-1].id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import sys
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from backend.source.concurrency.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def run_concurrently(self, flight, keys, func):
+        # every caller is released at once while the leader is still running
+        release = threading.Event()
+        calls = []
+
+        def work(key):
+            calls.append(key)
+            release.wait(1)
+            return func(key)
+
+        with ThreadPoolExecutor(max_workers=len(keys)) as executor:
+            futures = [executor.submit(flight.do, key, lambda key=key: work(key)) for key in keys]
+            deadline = time.monotonic() + 2
+            while flight.stats()["executed"] + flight.stats()["coalesced"] < len(keys) and time.monotonic() < deadline:
+                time.sleep(0.001)
+            release.set()
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(e)
+        return calls, results
+
+    def test_identical_calls_share_one_execution(self) -> None:
+        """Test that concurrent calls with the same key run the function once."""
+        flight = SingleFlight("test")
+        calls, results = self.run_concurrently(flight, ["a"] * 5, lambda key: key.upper())
+        self.assertEqual(calls, ["a"])
+        self.assertEqual(results, ["A"] * 5)
+        self.assertEqual(flight.stats(), {"executed": 1, "coalesced": 4, "in_flight": 0})
+
+    def test_distinct_keys_run_separately(self) -> None:
+        """Test that different keys are not coalesced."""
+        flight = SingleFlight("test")
+        calls, results = self.run_concurrently(flight, ["a", "b"], lambda key: key)
+        self.assertEqual(sorted(calls), ["a", "b"])
+        self.assertEqual(flight.stats()["coalesced"], 0)
+
+    def test_errors_are_shared(self) -> None:
+        """Test that every waiter sees the leader's exception."""
+        flight = SingleFlight("test")
+
+        def fail(key):
+            raise RuntimeError("provider down")
+
+        calls, results = self.run_concurrently(flight, ["a"] * 3, fail)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    def test_results_are_not_cached(self) -> None:
+        """Test that a finished call is not reused by later callers."""
+        flight = SingleFlight("test")
+        self.assertEqual(flight.do("a", lambda: 1), 1)
+        self.assertEqual(flight.do("a", lambda: 2), 2)
+        self.assertEqual(flight.stats()["executed"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
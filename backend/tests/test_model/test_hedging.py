@@ -0,0 +1,123 @@
+import unittest
+import sys
+import os
+import time
+import asyncio
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from backend.source.model.hedging import LatencyTracker, CircuitBreaker, CircuitOpenError, hedged, event_loop, mark_sent
+
+
+def attempt(result, delay=0.0, error=None, log=None):
+    async def run():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(f"cancelled {result}")
+            raise
+        if error is not None:
+            raise error
+        return result
+    return run
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_percentile(self) -> None:
+        """Test percentiles over the rolling window and the minimum sample count."""
+        tracker = LatencyTracker(window=100)
+        for value in range(1, 101):
+            tracker.record("fireworks/model", float(value))
+        self.assertEqual(tracker.percentile("fireworks/model", 95), 95.0)
+        self.assertEqual(tracker.percentile("fireworks/model", 50), 51.0)
+        self.assertIsNone(tracker.percentile("fireworks/model", 95, min_samples=101))
+        self.assertIsNone(tracker.percentile("unknown", 95))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_open_half_open_closed(self) -> None:
+        """Test the breaker opens on failures and closes after a successful trial."""
+        breaker = CircuitBreaker("provider", failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, "half_open")
+        self.assertTrue(breaker.allow())
+        # only one trial at a time
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_trial_reopens(self) -> None:
+        """Test that a failed trial request opens the circuit again."""
+        breaker = CircuitBreaker("provider", failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+
+class TestHedged(unittest.TestCase):
+    def test_fast_primary_needs_no_hedge(self) -> None:
+        """Test that no hedge is sent when the primary answers in time."""
+        log = []
+        result = event_loop.run(hedged([attempt("primary", 0.01, log=log), attempt("fallback", log=log)], delay=1.0))
+        self.assertEqual(result, ("primary", 0))
+        self.assertEqual(log, [])
+
+    def test_slow_primary_is_hedged_and_cancelled(self) -> None:
+        """Test that a duplicate is sent after the delay and the loser is cancelled."""
+        log = []
+        calls = []
+
+        def primary():
+            calls.append(len(calls))
+            # the first call hangs, the hedge answers quickly
+            return attempt("primary", 5.0 if len(calls) == 1 else 0.01, log=log)()
+
+        start = time.perf_counter()
+        result = event_loop.run(hedged([primary, attempt("fallback")], delay=0.05))
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(result, ("primary", 0))
+        self.assertEqual(len(calls), 2)
+        time.sleep(0.05)
+        self.assertEqual(log, ["cancelled primary"])
+
+    def test_hedge_with_fallbacks(self) -> None:
+        """Test that hedges can go to the next fallback instead."""
+        result = event_loop.run(hedged([attempt("primary", 5.0), attempt("fallback", 0.01)], delay=0.05, hedge_with_fallbacks=True))
+        self.assertEqual(result, ("fallback", 1))
+
+    def test_hedge_clock_starts_when_sent(self) -> None:
+        """Test that time spent before mark_sent, e.g. waiting on the limiter, does not trigger a hedge."""
+        calls = []
+
+        async def queued_primary():
+            calls.append("primary")
+            await asyncio.sleep(0.15)
+            mark_sent()
+            await asyncio.sleep(0.05)
+            return "primary"
+
+        result = event_loop.run(hedged([queued_primary, attempt("fallback")], delay=0.1, clock_from_send=True))
+        self.assertEqual(result, ("primary", 0))
+        self.assertEqual(calls, ["primary"])
+
+        calls.clear()
+        result = event_loop.run(hedged([queued_primary, attempt("fallback", 0.01)], delay=0.1, hedge_with_fallbacks=True))
+        self.assertEqual(result, ("fallback", 1))
+
+    def test_failover_and_exhaustion(self) -> None:
+        """Test that failures fail over immediately and the last error is raised."""
+        result = event_loop.run(hedged([attempt("primary", error=CircuitOpenError("open")), attempt("fallback")], delay=None))
+        self.assertEqual(result, ("fallback", 1))
+        with self.assertRaises(ValueError):
+            event_loop.run(hedged([attempt("primary", error=RuntimeError("a")), attempt("fallback", error=ValueError("b"))], delay=None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,258 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import time
+import litellm
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from backend.source.model.model import Model
+from backend.source.model.prompt_template import PromptTemplate
+from backend.source.pipeline.patch_gen.patch_generation import PatchGeneration
+from backend.source.concurrency.job_queue import JobQueue
+from backend.source.model.rate_limiter import ProviderLimiter
+from backend.benchmarks.mock_llm_server import MockLLMServer
+import backend.source.model.model as model_module
+
+
+class TestModel(unittest.TestCase):
+    def setUp(self) -> None:
+        """Patch the tokenizer download and start a local mock LLM server."""
+        tokenizer_patcher = patch("transformers.AutoTokenizer")
+        self.mock_auto_tokenizer = tokenizer_patcher.start()
+        self.addCleanup(tokenizer_patcher.stop)
+        self.mock_auto_tokenizer.from_pretrained.return_value.encode.return_value = [1, 2, 3]
+        cache_patcher = patch.dict(model_module._tokenizer_cache, clear=True)
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+        self.server = MockLLMServer().start()
+        self.addCleanup(self.server.stop)
+        env_patcher = patch.dict(os.environ, {"LOCAL_LLM_BASE_URL": self.server.url})
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+
+    def test_initialization(self) -> None:
+        """Test that the config, tokenizer and local client are set up."""
+        model = Model("mock-llm", None, "local")
+        self.assertEqual(model.max_context, 8192)
+        self.assertEqual(model.max_response, 4096)
+        self.assertEqual(model.client["base_url"], self.server.url)
+        self.assertEqual(model.client["model_prefix"], "openai/")
+        self.assertEqual(model.client["api_key"], "local")
+        self.mock_auto_tokenizer.from_pretrained.assert_called_once_with("meta-llama/Meta-Llama-3-8B-Instruct")
+
+    def test_tokenizer_is_cached(self) -> None:
+        """Test that a second model reuses the loaded tokenizer."""
+        Model("mock-llm", None, "local")
+        Model("mock-llm", None, "local")
+        self.mock_auto_tokenizer.from_pretrained.assert_called_once()
+
+    def test_unsupported_model_and_provider(self) -> None:
+        """Test that unknown models and providers are rejected."""
+        with self.assertRaises(ValueError):
+            Model("not-a-model", None, "local")
+        with self.assertRaises(ValueError):
+            Model("mock-llm", None, "not-a-provider")
+
+    def test_generate_response(self) -> None:
+        """Test a completion round trip against the mock server."""
+        model = Model("mock-llm", None, "local")
+        response = model.generate_response("Analyze the following code file\nclass A {}")
+
+        self.assertIn("#### Fault 1:", response)
+        self.assertEqual(self.server.request_counts, {"fault": 1})
+        self.assertGreater(model.usage["prompt_tokens"], 0)
+        self.assertGreater(model.usage["completion_tokens"], 0)
+
+    def test_generate_response_retries_rate_limits(self) -> None:
+        """Test that a 429 with Retry-After is retried instead of returned as text."""
+        model = Model("mock-llm", None, "local")
+        self.server.fail_next(1, status=429, retry_after=0)
+
+        response = model.generate_response("Strict Code Review")
+
+        self.assertIn("**Status:** GOOD", response)
+        self.assertEqual(self.server.request_counts, {"failed": 1, "validation": 1})
+
+    def test_generate_response_raises(self) -> None:
+        """Test that provider errors are raised rather than returned as an "Error:" string."""
+        model = Model("mock-llm", None, "local")
+        self.server.fail_next(1, status=400)
+        with self.assertRaises(Exception):
+            model.generate_response("Strict Code Review")
+        model.client = {}
+        with self.assertRaises(ValueError):
+            model.generate_response("Strict Code Review")
+
+    def test_generate_response_hedges_hung_call(self) -> None:
+        """Test that a hung call is hedged and the duplicate's answer is used."""
+        model = Model("mock-llm", None, "local")
+        model.model_configs["hedging"] = {"initial_delay": 0.2, "min_samples": 1000, "max_hedges": 1}
+        self.server.stall_next(1, seconds=5)
+
+        start = time.perf_counter()
+        response = model.generate_response("Strict Code Review")
+
+        self.assertLess(time.perf_counter() - start, 3)
+        self.assertIn("**Status:** GOOD", response)
+        self.assertEqual(self.server.request_counts, {"validation": 2})
+
+    def test_identical_concurrent_requests_are_coalesced(self) -> None:
+        """Test that identical in-flight prompts share one provider call, but samples don't."""
+        model = Model("mock-llm", None, "local")
+        self.server.latency = 0.3
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            responses = list(executor.map(lambda _: model.generate_response("Strict Code Review"), range(3)))
+        self.assertEqual(len(set(responses)), 1)
+        self.assertEqual(self.server.request_counts, {"validation": 1})
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(lambda _: model.generate_response("Strict Code Review", temperature=0.7), range(2)))
+        self.assertEqual(self.server.request_counts, {"validation": 3})
+
+    def test_generation_params(self) -> None:
+        """Test that sampling settings, task profiles and an explicit temperature are layered in order."""
+        model = Model("mock-llm", None, "local")
+        self.assertEqual(model.generation_params(), {"temperature": 0.7, "top_p": 0.95, "top_k": 50, "max_tokens": 4096})
+        validation = model.generation_params("patch_validation")
+        self.assertEqual((validation["max_tokens"], validation["temperature"]), (768, 0.0))
+        # a closing-fence stop also matches a bare opening fence, so patch generation has none
+        self.assertNotIn("stop", model.generation_params("patch_generation"))
+        self.assertEqual(model.generation_params("patch_validation", temperature=0.9)["temperature"], 0.9)
+        # a profile never asks for more than the model's response window
+        model.generation_profiles["patch_validation"]["max_tokens"] = 10000
+        self.assertEqual(model.generation_params("patch_validation")["max_tokens"], 4096)
+
+    def test_capped_responses_are_recorded(self) -> None:
+        """Test that a response cut off at max_tokens is counted for its task."""
+        model = Model("mock-llm", None, "local")
+        model.generation_profiles["patch_validation"]["max_tokens"] = 4
+        response = model.generate_response("Strict Code Review", task="patch_validation")
+
+        self.assertLessEqual(len(response), 16)
+        self.assertEqual((model.task_usage["patch_validation"]["calls"], model.task_usage["patch_validation"]["capped"]), (1, 1))
+        model.generate_response("Analyze the following code file", task="fault_localization.triage")
+        self.assertEqual(model.task_usage["fault_localization.triage"]["capped"], 0)
+
+    def test_bare_opening_fence_keeps_the_code(self) -> None:
+        """Test that a patch opening with a fence without a language tag comes back whole."""
+        model = Model("mock-llm", None, "local")
+        reply = "Here is the fix:\n```\nclass A {}\n```\nThis patch fixes the injection."
+        self.server.responses["patch"] = reply
+        response = model.generate_response("Apply the given pattern fix to the current code", task="patch_generation")
+        self.assertEqual(response, reply)
+        self.assertEqual(PatchGeneration(model, "", [], "java").return_code_block(response), "class A {}\n")
+
+    def test_chat_prompt_is_sent_as_messages(self) -> None:
+        """Test that a chat prompt goes out as system and user messages and its prefix is counted."""
+        model = Model("mock-llm", None, "local")
+        prompt = PromptTemplate(system="Strict Code Review", user="{code}").render(code="class A {}")
+        with patch.object(litellm, "acompletion", wraps=litellm.acompletion) as acompletion:
+            response = model.generate_response(prompt, task="patch_validation")
+
+        self.assertIn("**Status:** GOOD", response)
+        self.assertEqual(acompletion.call_args.kwargs["messages"], prompt.messages)
+        usage = model.task_usage["patch_validation"]
+        self.assertEqual(usage["prefix_tokens"], 3)
+        self.assertGreater(usage["prompt_tokens"], 0)
+
+    def test_cancelled_job_stops_before_next_call(self) -> None:
+        """Test that a cancelled job's next model call raises instead of reaching the provider."""
+        model = Model("mock-llm", None, "local")
+        jobs = JobQueue(workers=1)
+        self.addCleanup(jobs.shutdown)
+
+        def work(job):
+            model.generate_response("Strict Code Review")
+            job.cancel()
+            model.generate_response("Analyze the following code file")
+
+        job = jobs.submit(work)
+        self.assertTrue(job.wait(10))
+        self.assertEqual(job.state, "cancelled")
+        self.assertEqual(self.server.request_counts, {"validation": 1})
+
+    def test_fallback_token_bucket_gets_estimate(self) -> None:
+        """Test that the prompt is estimated when only a fallback provider limits tokens."""
+        model = Model("mock-llm", None, "local")
+        self.assertIsNone(model.targets[0]["limiter"].tokens)
+        model.targets.append(dict(model.targets[0], limiter=ProviderLimiter("fallback-test", tokens_per_minute=10000)))
+        primary = model.targets[0]["limiter"]
+        with patch.object(primary, "aexecute", wraps=primary.aexecute) as aexecute:
+            model.generate_response("Strict Code Review")
+        self.assertEqual(aexecute.call_args.args[1], 3)
+
+    def test_token_windows(self) -> None:
+        """Test token counting and context/response window checks."""
+        model = Model("mock-llm", None, "local")
+        self.assertEqual(model.get_token_count("some text"), 3)
+        self.assertTrue(model.is_within_context_window("some text"))
+        model.max_response = 2
+        self.assertFalse(model.is_within_response_window("some text"))
+
+
+
+class TestModelRouting(unittest.TestCase):
+    def setUp(self) -> None:
+        """Route a task to a second, cheaper model without any network calls."""
+        tokenizer_patcher = patch("transformers.AutoTokenizer")
+        mock_auto_tokenizer = tokenizer_patcher.start()
+        self.addCleanup(tokenizer_patcher.stop)
+        mock_auto_tokenizer.from_pretrained.return_value.encode.return_value = [1, 2, 3]
+        cache_patcher = patch.dict(model_module._tokenizer_cache, clear=True)
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+        configs = Model("mock-llm", None, "local").model_configs
+        configs["models"]["mock-llm-small"] = dict(configs["models"]["mock-llm"])
+        configs["models"]["mock-llm"] = dict(configs["models"]["mock-llm"], routes={"triage": {"model": "mock-llm-small", "min_chars": 10}})
+        configs_patcher = patch.object(Model, "_load_model_configs", return_value=configs)
+        configs_patcher.start()
+        self.addCleanup(configs_patcher.stop)
+
+        self.answers = {"mock-llm": "#### Fault 1: from the large model", "mock-llm-small": "#### Fault 1: from the small model"}
+        self.calls = []
+
+        def generate(model, prompt, temperature=None, task=None):
+            self.calls.append(model.model)
+            answer = self.answers[model.model]
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+
+        generate_patcher = patch.object(Model, "_generate", autospec=True, side_effect=generate)
+        generate_patcher.start()
+        self.addCleanup(generate_patcher.stop)
+        self.model = Model("mock-llm", None, "local")
+
+    def test_unrouted_task_uses_selected_model(self) -> None:
+        """Test that tasks without a route go to the selected model."""
+        self.assertIn("large", self.model.generate_response("prompt", task="patch_generation"))
+        self.assertIn("large", self.model.generate_response("prompt"))
+        self.assertEqual(self.calls, ["mock-llm", "mock-llm"])
+
+    def test_routed_task_uses_cheap_model(self) -> None:
+        """Test that a valid, confident answer from the routed model is kept."""
+        response = self.model.generate_response("prompt", task="triage", validate=lambda r: "Fault" in r)
+        self.assertIn("small", response)
+        self.assertEqual(self.calls, ["mock-llm-small"])
+        self.assertIs(self.model._routed_model("mock-llm-small").usage, self.model.usage)
+
+    def test_escalation(self) -> None:
+        """Test escalation on failed validation, low confidence, short output and errors."""
+        self.assertIn("large", self.model.generate_response("prompt", task="triage", validate=lambda r: False))
+        for answer in ["I'm not sure, but #### Fault 1 maybe", "short", "```java\nclass A {", RuntimeError("boom")]:
+            self.answers["mock-llm-small"] = answer
+            self.assertIn("large", self.model.generate_response("prompt", task="triage"))
+        self.assertEqual(self.calls, ["mock-llm-small", "mock-llm"] * 5)
+
+    def test_large_prompts_skip_cheap_model(self) -> None:
+        """Test that prompts over max_prompt_tokens go straight to the selected model."""
+        self.model.routes["triage"]["max_prompt_tokens"] = 2
+        self.assertIn("large", self.model.generate_response("prompt", task="triage"))
+        self.assertEqual(self.calls, ["mock-llm"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from backend.source.model.prompt_template import ChatPrompt, PromptTemplate
+from backend.source.pipeline.patch_valid.patch_validation import PatchValidation
+
+
+class TestPromptTemplate(unittest.TestCase):
+    def test_render(self) -> None:
+        """Test that the payload only ends up in the user message and the string joins both."""
+        template = PromptTemplate(system="Review this {language} code.", user="Code:\n{code}")
+        prompt = template.render(language="java", code="int x = 1;")
+
+        self.assertIsInstance(prompt, ChatPrompt)
+        self.assertEqual(prompt.system, "Review this java code.")
+        self.assertEqual(prompt.user, "Code:\nint x = 1;")
+        self.assertEqual(prompt, "Review this java code.\nCode:\nint x = 1;")
+        self.assertEqual(prompt.messages, [
+            {"role": "system", "content": "Review this java code."},
+            {"role": "user", "content": "Code:\nint x = 1;"},
+        ])
+        self.assertEqual("".join(prompt.segments), str(prompt))
+
+    def test_stage_prefix_is_stable(self) -> None:
+        """Test that a stage's system message is identical whatever code it is asked about."""
+        first = PatchValidation(None, "class A {}", language="java").get_validation_prompt()
+        second = PatchValidation(None, "class B { void f() {} }", language="java").get_validation_prompt()
+
+        self.assertEqual(first.system, second.system)
+        self.assertNotIn("class A", first.system)
+        self.assertIn("class A {}", first.user)
+        self.assertIn("**Status:**", first.system)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+import sys
+import os
+import asyncio
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from backend.source.model.rate_limiter import TokenBucket, AdaptiveConcurrency, ProviderLimiter, retry_after, is_retryable, get_limiter
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int, headers: dict = None) -> None:
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.headers = headers
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_wait(self) -> None:
+        """Test that a full bucket serves a burst and then makes callers wait."""
+        bucket = TokenBucket(rate_per_minute=600, capacity=2)
+        self.assertEqual(bucket.reserve(1), 0.0)
+        self.assertEqual(bucket.reserve(1), 0.0)
+        self.assertAlmostEqual(bucket.reserve(1), 0.1, delta=0.02)
+
+    def test_oversized_request_goes_into_debt(self) -> None:
+        """Test that a request larger than the bucket is let through when full."""
+        bucket = TokenBucket(rate_per_minute=60, capacity=10)
+        self.assertEqual(bucket.reserve(25), 0.0)
+        self.assertLess(bucket.tokens, 0)
+        self.assertGreater(bucket.reserve(1), 0)
+
+    def test_adjust(self) -> None:
+        """Test settling an estimate against actual usage."""
+        bucket = TokenBucket(rate_per_minute=60, capacity=100)
+        bucket.reserve(50)
+        bucket.adjust(-20)
+        self.assertAlmostEqual(bucket.tokens, 70, delta=1)
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+    def test_additive_increase_multiplicative_decrease(self) -> None:
+        """Test that successes grow the limit and a 429 halves it."""
+        concurrency = AdaptiveConcurrency(initial=4, maximum=8)
+        for _ in range(4):
+            concurrency.release(concurrency.try_acquire())
+        self.assertAlmostEqual(concurrency.limit, 5, delta=0.1)
+
+        concurrency.release(concurrency.try_acquire(), throttled=True)
+        self.assertAlmostEqual(concurrency.limit, 2.5, delta=0.1)
+
+    def test_single_decrease_per_window(self) -> None:
+        """Test that requests in flight during a cut don't cut the limit again."""
+        concurrency = AdaptiveConcurrency(initial=8)
+        started = [concurrency.try_acquire() for _ in range(4)]
+        for start in started:
+            concurrency.release(start, throttled=True)
+        self.assertEqual(concurrency.limit, 4)
+
+    def test_refuses_at_limit(self) -> None:
+        """Test that no slot is handed out while the limit is reached."""
+        concurrency = AdaptiveConcurrency(initial=1)
+        start = concurrency.try_acquire()
+        self.assertIsNone(concurrency.try_acquire())
+        concurrency.release(start)
+        self.assertIsNotNone(concurrency.try_acquire())
+
+
+class TestProviderLimiter(unittest.TestCase):
+    def test_retry_after_parsing(self) -> None:
+        """Test Retry-After in seconds, on the response object, and as an HTTP date."""
+        self.assertEqual(retry_after(StatusError(429, {"retry-after": "3"})), 3.0)
+        error = StatusError(429)
+        error.response = Mock(headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+        self.assertEqual(retry_after(error), 0.0)
+        self.assertIsNone(retry_after(StatusError(429)))
+
+    def test_is_retryable(self) -> None:
+        """Test which failures are retried."""
+        self.assertTrue(is_retryable(StatusError(429)))
+        self.assertTrue(is_retryable(StatusError(503)))
+        self.assertTrue(is_retryable(ConnectionError()))
+        self.assertFalse(is_retryable(StatusError(400)))
+        self.assertFalse(is_retryable(ValueError()))
+
+    @patch("backend.source.model.rate_limiter.asyncio.sleep", new_callable=AsyncMock)
+    def test_aexecute_retries_throttled_requests(self, mock_sleep) -> None:
+        """Test that 429s are retried, honouring Retry-After, and the limit is cut."""
+        limiter = ProviderLimiter("test", initial_concurrency=4, max_retries=3, backoff_base=0.01)
+        send = AsyncMock(side_effect=[StatusError(429, {"retry-after": "2"}), "ok"])
+
+        self.assertEqual(asyncio.run(limiter.aexecute(send)), "ok")
+        self.assertEqual(send.call_count, 2)
+        self.assertGreaterEqual(mock_sleep.call_args_list[0].args[0], 2)
+        self.assertLess(limiter.concurrency.limit, 4)
+
+    @patch("backend.source.model.rate_limiter.asyncio.sleep", new_callable=AsyncMock)
+    def test_aexecute_raises(self, mock_sleep) -> None:
+        """Test that non-retryable errors and exhausted retries are raised."""
+        limiter = ProviderLimiter("test", max_retries=2, backoff_base=0.01)
+        send = AsyncMock(side_effect=StatusError(400))
+        with self.assertRaises(StatusError):
+            asyncio.run(limiter.aexecute(send))
+        self.assertEqual(send.call_count, 1)
+
+        send = AsyncMock(side_effect=StatusError(503))
+        with self.assertRaises(StatusError):
+            asyncio.run(limiter.aexecute(send))
+        self.assertEqual(send.call_count, 3)
+        self.assertEqual(limiter.concurrency.in_flight, 0)
+
+    def test_aexecute_refunds_when_cancelled_before_send(self) -> None:
+        """Test that a call cancelled while waiting for a slot gives back the tokens it reserved."""
+        limiter = ProviderLimiter("test", tokens_per_minute=6000, initial_concurrency=1)
+        held = limiter.concurrency.try_acquire()
+        send = AsyncMock(return_value="ok")
+
+        async def run():
+            task = asyncio.create_task(limiter.aexecute(send, estimated_tokens=1000))
+            await asyncio.sleep(0.1)
+            self.assertLess(limiter.tokens.tokens, 5100)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        send.assert_not_called()
+        self.assertGreater(limiter.tokens.tokens, 5900)
+        limiter.concurrency.release(held)
+
+    def test_get_limiter_is_shared(self) -> None:
+        """Test that one limiter is kept per provider."""
+        limiter = get_limiter("shared-test", {"requests_per_minute": 60})
+        self.assertIs(get_limiter("shared-test"), limiter)
+        self.assertIsNotNone(limiter.requests)
+        self.assertIsNone(limiter.tokens)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import Mock
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from backend.source.model.token_counter import SegmentedPrompt, TokenCounter
+
+
+class WordTokenizer:
+    # one token per word plus a BOS token, with the fast tokenizer's encode and batch call
+    def __init__(self) -> None:
+        self.encode = Mock(side_effect=lambda text, add_special_tokens=True: ([0] if add_special_tokens else []) + [1] * len(text.split()))
+        self.batches = []
+
+    def __call__(self, texts, add_special_tokens=True):
+        self.batches.append(list(texts))
+        return {"input_ids": [self.encode(text, add_special_tokens=add_special_tokens) for text in texts]}
+
+
+class TestTokenCounter(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create a counter over a word level tokenizer."""
+        self.tokenizer = WordTokenizer()
+        self.counter = TokenCounter(self.tokenizer)
+
+    def test_counts_are_cached(self) -> None:
+        """Test that a text is only tokenized the first time it is counted."""
+        self.assertEqual(self.counter.count("one two three"), 4)
+        self.assertEqual(self.counter.count("one two three"), 4)
+        self.assertEqual(self.tokenizer.encode.call_count, 1)
+        self.assertEqual(self.counter.stats(), {"hits": 1, "misses": 1, "size": 1})
+
+    def test_count_many_batches_misses(self) -> None:
+        """Test that uncached texts are counted in one batch call."""
+        self.counter.count("a b")
+        self.assertEqual(self.counter.count_many(["a b", "c d e", "f"]), [3, 4, 2])
+        self.assertEqual(self.tokenizer.batches, [["c d e", "f"]])
+
+    def test_segmented_prompt(self) -> None:
+        """Test that a segmented prompt is the formatted string and its template text is counted once."""
+        template = "Review this {language} code:\n{code}\nReply in {language} please"
+        prompt = SegmentedPrompt.from_template(template, language="java", code="int x = 1;")
+        self.assertEqual(prompt, template.format(language="java", code="int x = 1;"))
+        self.assertIsInstance(prompt, str)
+        self.assertEqual(self.counter.count(prompt), len(prompt.split()) + 1)
+
+        self.tokenizer.batches.clear()
+        other = SegmentedPrompt.from_template(template, language="java", code="return a + b;")
+        self.assertEqual(self.counter.count(other), len(other.split()) + 1)
+        self.assertEqual(self.tokenizer.encode.call_args.args[0], "return a + b;")
+        self.assertEqual(self.tokenizer.batches, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+from unittest.mock import Mock, patch
+import sys
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from backend.source.model_server import server as server_module
+from backend.source.model_server.server import ModelServer
+from backend.source.model_server.client import ModelServerClient, ModelServerError, RemoteTokenizer, RemoteEncoder, get_client
+from backend.source.pipeline.fault_loc.fault_localization import FaultLocalization
+from backend.source.pipeline.rag.rag import RAG
+from backend.source.model.model import Model
+
+
+class FakeTokenizer:
+    # one token per whitespace separated word, ids index into a growing vocabulary
+    def __init__(self) -> None:
+        self.vocab = {}
+
+    def encode(self, text, add_special_tokens=True):
+        ids = [self.vocab.setdefault(word, len(self.vocab) + 1) for word in text.split()]
+        return ([0] if add_special_tokens else []) + ids
+
+    def __call__(self, texts, add_special_tokens=True):
+        return {"input_ids": [self.encode(text, add_special_tokens) for text in texts]}
+
+    def batch_decode(self, ids, skip_special_tokens=False):
+        words = {index: word for word, index in self.vocab.items()}
+        return [" ".join(words.get(i, "<s>") for i in seq if not (skip_special_tokens and i == 0)) for seq in ids]
+
+
+def fake_encode(texts, **kwargs):
+    return np.array([[len(t), 1.0, 2.0] for t in texts], dtype="float32")
+
+
+class TestModelServer(unittest.TestCase):
+    def setUp(self) -> None:
+        """Start a model server with a fake tokenizer and encoder on a temporary socket."""
+        self.tokenizer = FakeTokenizer()
+        self.encoder = Mock()
+        self.encoder.encode.side_effect = fake_encode
+        for name, value in (("load_tokenizer", Mock(return_value=self.tokenizer)), ("load_encoder", Mock(return_value=self.encoder))):
+            patcher = patch.object(server_module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.socket_path = os.path.join(self.directory, "models.sock")
+        self.server = ModelServer(self.socket_path).start()
+        self.addCleanup(self.server.stop)
+        self.client = ModelServerClient(self.socket_path, timeout=5)
+        self.addCleanup(self.client.close)
+
+    def test_tokenizer_methods(self) -> None:
+        """Test counting, encoding, decoding and windowing through the server."""
+        tokenizer = RemoteTokenizer("fake", self.client)
+        ids = tokenizer.encode("a b c d e", add_special_tokens=False)
+        self.assertEqual(ids, [1, 2, 3, 4, 5])
+        self.assertEqual(tokenizer.count_tokens("a b c"), 4)
+        self.assertEqual(tokenizer.decode(ids), "a b c d e")
+        self.assertEqual(tokenizer(["a b", "c"], add_special_tokens=False), {"input_ids": [[1, 2], [3]]})
+        self.assertEqual(tokenizer.encode_windows(2, text="a b c d e"), ["a b", "c d", "e"])
+        self.assertEqual(tokenizer.encode_windows(3, tokens=ids), ["a b c", "d e"])
+
+    def test_embed(self) -> None:
+        """Test that embeddings come back as float32 arrays of the right shape."""
+        encoder = RemoteEncoder("test-model-server-embedder", self.client)
+        embeddings = encoder.encode(["short", "a longer text"], batch_size=8)
+        self.assertEqual(embeddings.dtype, np.float32)
+        np.testing.assert_array_equal(embeddings, fake_encode(["short", "a longer text"]))
+
+    def test_errors_are_raised(self) -> None:
+        """Test that failures in the server are raised in the client."""
+        server_module.load_tokenizer.side_effect = OSError("no such tokenizer")
+        with self.assertRaises(ModelServerError):
+            self.client.count_tokens("missing", ["text"])
+        with self.assertRaises(ModelServerError):
+            self.client.call("unknown")
+
+    def test_reconnects_after_restart(self) -> None:
+        """Test that a client recovers when the server is restarted."""
+        first = self.client.ping()["pid"]
+        self.server.stop()
+        self.server = ModelServer(self.socket_path).start()
+        self.assertEqual(self.client.ping()["pid"], first)
+
+    def test_timeout_is_not_retried(self) -> None:
+        """Test that a call the server is too slow to answer fails once instead of being sent again."""
+        slow = Mock(side_effect=lambda name: time.sleep(0.5) or self.tokenizer)
+        with patch.object(server_module, "load_tokenizer", slow):
+            client = ModelServerClient(self.socket_path, timeout=0.1)
+            self.addCleanup(client.close)
+            client.ping()
+            with self.assertRaises(ModelServerError):
+                client.count_tokens("slow", ["text"])
+            time.sleep(0.6)
+        self.assertEqual(slow.call_count, 1)
+
+    def test_unavailable_server(self) -> None:
+        """Test that a missing server raises a ModelServerError."""
+        client = ModelServerClient(os.path.join(self.directory, "missing.sock"))
+        with self.assertRaises(ModelServerError):
+            client.ping()
+
+    def test_get_client(self) -> None:
+        """Test that the client is only used when MODEL_SERVER_SOCKET is set."""
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("MODEL_SERVER_SOCKET", None)
+            self.assertIsNone(get_client())
+        with patch.dict(os.environ, {"MODEL_SERVER_SOCKET": self.socket_path}):
+            self.assertEqual(get_client().socket_path, self.socket_path)
+
+    def test_fault_localization_uses_windows(self) -> None:
+        """Test that fault localization chunks through the server in one call."""
+        model = Mock()
+        model.max_context = 252
+        model.max_response = 252
+        model.tokenizer = RemoteTokenizer("fake", self.client)
+        fault_localization = FaultLocalization(model, "a b c d e")
+        self.assertEqual(fault_localization.chunks, [(0, "a b"), (1, "c d"), (2, "e")])
+
+    def test_model_and_rag_use_the_server(self) -> None:
+        """Test that Model and RAG switch to the server when MODEL_SERVER_SOCKET is set."""
+        with patch.dict(os.environ, {"MODEL_SERVER_SOCKET": self.socket_path}):
+            model = Model("mock-llm", None, "local")
+            rag = RAG(model_name="test-model-server-rag", index_path=None)
+        self.assertIsInstance(model.tokenizer, RemoteTokenizer)
+        self.assertEqual(model.get_token_count("a b c"), 4)
+        self.assertIsInstance(rag.model, RemoteEncoder)
+        self.assertIsNone(rag.executor)
+        rag.embed_code([{"filename": "A.java", "content": "class A {}"}])
+        self.assertEqual(rag.retrieve_context("class A {}", k=1)[0]["metadata"]["file_name"], "A.java")
+
+
+if __name__ == '__main__':
+    unittest.main()
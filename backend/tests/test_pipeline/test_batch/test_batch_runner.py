@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import json
+import tempfile
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from backend.source.pipeline.batch.batch_runner import collect_files, load_completed, run_file, BatchRunner
+
+
+class TestBatchRunner(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create a small source tree to scan."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.root = self.tmp_dir.name
+        os.makedirs(os.path.join(self.root, "src"))
+        os.makedirs(os.path.join(self.root, ".git"))
+        for name in ["src/A.java", "src/b.py", "src/notes.txt", ".git/config.py"]:
+            with open(os.path.join(self.root, name), "w", encoding="utf-8") as f:
+                f.write("code")
+
+    def test_collect_files_from_directory(self) -> None:
+        """Test that only supported source files outside hidden directories are collected."""
+        paths = collect_files(self.root)
+        self.assertEqual([os.path.relpath(p, self.root) for p in paths], ["src/A.java", "src/b.py"])
+
+    def test_collect_files_from_manifest(self) -> None:
+        """Test reading a manifest with relative paths and comments."""
+        manifest = os.path.join(self.root, "manifest.txt")
+        with open(manifest, "w", encoding="utf-8") as f:
+            f.write("# nightly\nsrc/b.py\n\n")
+        self.assertEqual(collect_files(manifest=manifest), [os.path.join(self.root, "src/b.py")])
+
+    def test_load_completed(self) -> None:
+        """Test that only successful records count as done and partial lines are ignored."""
+        output = os.path.join(self.root, "results.jsonl")
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"path": "a", "status": "ok"}) + "\n")
+            f.write(json.dumps({"path": "b", "status": "error"}) + "\n")
+            f.write('{"path": "c", "sta')
+        self.assertEqual(load_completed(output), {"a"})
+        self.assertEqual(load_completed(os.path.join(self.root, "missing.jsonl")), set())
+
+    @patch("backend.source.pipeline.pipeline.Pipeline")
+    def test_run_file(self, mock_pipeline_cls) -> None:
+        """Test that a file's result and token usage are recorded."""
+        pipeline = mock_pipeline_cls.return_value
+        pipeline.localization = "faults"
+        pipeline.final_patch = "patch"
+        pipeline.validation = "GOOD"
+        pipeline.model.usage = {"prompt_tokens": 10, "completion_tokens": 5}
+
+        record = run_file(os.path.join(self.root, "src/b.py"), None, True, None)
+
+        self.assertEqual(record["status"], "ok")
+        self.assertEqual(record["final_patch"], "patch")
+        self.assertEqual(record["prompt_tokens"] + record["completion_tokens"], 15)
+        self.assertIsNone(mock_pipeline_cls.call_args.kwargs["index_path"])
+
+    def test_run_file_error(self) -> None:
+        """Test that an unreadable file is recorded as an error."""
+        record = run_file(os.path.join(self.root, "missing.py"), None, True, None)
+        self.assertEqual(record["status"], "error")
+
+    def test_run_skips_completed(self) -> None:
+        """Test that resuming with everything done does no work."""
+        output = os.path.join(self.root, "results.jsonl")
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"path": "a", "status": "ok"}) + "\n")
+        stats = BatchRunner(output, processes=1).run(["a"])
+        self.assertEqual(stats["files"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
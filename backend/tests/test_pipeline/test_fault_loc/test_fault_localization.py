@@ -127,6 +127,31 @@ class TestFaultLocalization(unittest.TestCase):
         self.assertEqual(chunks[0][0], 0)  # First chunk index
         self.assertEqual(chunks[1][0], 1)  # Second chunk index
 
+    def test_precomputed_tokens(self) -> None:
+        """Test that precomputed token ids are chunked without re-encoding"""
+        self.mock_model.tokenizer.encode.reset_mock()
+        self.mock_model.tokenizer.decode.return_value = "chunk"
+
+        fault_loc = FaultLocalization(self.mock_model, "code", tokens=list(range(600)))
+
+        self.mock_model.tokenizer.encode.assert_not_called()
+        self.assertEqual(len(fault_loc.chunks), 2)
+
+    def test_minified_line_numbers(self) -> None:
+        """Test that the prompt carries minified code and reported lines refer to the original file"""
+        code = "/* License */\npackage demo;\n\n// helper\nclass A {\n    void f() {}\n}"
+        self.mock_model.tokenizer.decode.return_value = "chunk"
+        fault_loc = FaultLocalization(self.mock_model, code, language="java")
+        self.assertEqual(fault_loc.prompt_code, "package demo;\nclass A {\nvoid f() {}\n}")
+        self.mock_model.tokenizer.encode.assert_any_call(fault_loc.prompt_code, add_special_tokens=False)
+
+        self.mock_model.generate_response.side_effect = ["Fault on line 3", "Fault on line 1", "Combined"]
+        fault_loc.chunks = [(0, "package demo;\nclass A {\n"), (1, "void f() {}\n}")]
+        fault_loc.calculate_fault_localization()
+
+        combine_prompt = self.mock_model.generate_response.call_args_list[2][0][0]
+        self.assertIn("Fault on line 6\nFault on line 6", combine_prompt)
+
     def test_model_response_error_handling(self) -> None:
         """Test handling of model response errors"""
         self.mock_model.generate_response.side_effect = Exception("Model error")
@@ -142,6 +167,17 @@ class TestFaultLocalization(unittest.TestCase):
         with self.assertRaises(Exception):
             self.fault_loc._chunk_code()
 
+    def test_response_validators(self) -> None:
+        """Test the checks used to decide whether a routed model's analysis is usable."""
+        self.assertTrue(self.fault_loc.is_valid_analysis("#### Fault 1:\n- **Fault Detected**: x"))
+        self.assertTrue(self.fault_loc.is_valid_analysis("The code appears to be fault-free."))
+        self.assertFalse(self.fault_loc.is_valid_analysis("Here is some unrelated text."))
+
+        analysis = "#### Fault 1: a\n#### Fault 2: b"
+        self.assertTrue(self.fault_loc.is_valid_consolidation("#### Fault 1: a and b", analysis))
+        self.assertFalse(self.fault_loc.is_valid_consolidation("The code appears to be fault-free.", analysis))
+        self.assertTrue(self.fault_loc.is_valid_consolidation("The code appears to be fault-free.", "fault-free"))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from backend.source.pipeline.fix_memory.fix_memory import FixMemory, make_diff
+
+
+def fake_encode(text):
+    # 3-d "embeddings" that separate injection, null pointer and other faults
+    return np.array([[text.count("SQL") + 0.1, text.count("null"), 0.1]], dtype="float32")
+
+
+class TestFixMemory(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create a directory the memory can persist into."""
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.path = os.path.join(self.directory, "fix_memory")
+
+    def test_lookup_above_threshold(self) -> None:
+        """Test that a similar fault finds the remembered fix and a different one doesn't."""
+        memory = FixMemory(fake_encode, "fake", threshold=0.9)
+        self.assertIsNone(memory.lookup("#### Fault 1: SQL injection"))
+        self.assertTrue(memory.add("#### Fault 1: SQL injection in find", "ps.setString(1, id);", response="```java\nps.setString(1, id);\n```"))
+
+        match = memory.lookup("#### Fault 2: SQL injection in delete")
+        self.assertEqual(match["pattern"], "ps.setString(1, id);")
+        self.assertGreater(match["similarity"], 0.99)
+        self.assertIsNone(memory.lookup("#### Fault 1: null dereference"))
+
+    def test_duplicates_and_empty_fixes_are_skipped(self) -> None:
+        """Test that the same fix is stored once and empty patterns aren't stored."""
+        memory = FixMemory(fake_encode, "fake")
+        self.assertTrue(memory.add("SQL injection", "fix"))
+        self.assertFalse(memory.add("SQL injection", "fix"))
+        self.assertFalse(memory.add("null dereference", "  "))
+        self.assertEqual(len(memory), 1)
+
+    def test_persists_across_runs(self) -> None:
+        """Test that fixes are reloaded from disk, but not by a different encoder."""
+        memory = FixMemory(fake_encode, "fake", path=self.path)
+        memory.add("SQL injection", "fix", diff=make_diff("a\nb\n", "a\nc\n", "Dao.java"), metadata={"filename": "Dao.java"})
+
+        reloaded = FixMemory(fake_encode, "fake", path=self.path)
+        self.assertEqual(len(reloaded), 1)
+        self.assertIn("+c", reloaded.lookup("SQL injection")["diff"])
+        self.assertEqual(reloaded.entries[0]["metadata"], {"filename": "Dao.java"})
+        self.assertEqual(len(FixMemory(fake_encode, "other", path=self.path)), 0)
+
+    def test_processes_share_one_directory(self) -> None:
+        """Test that two memories writing one directory see each other's fixes and stay consistent."""
+        first = FixMemory(fake_encode, "fake", path=self.path, threshold=0.9)
+        second = FixMemory(fake_encode, "fake", path=self.path, threshold=0.9)
+        self.assertTrue(first.add("null dereference in loop", "if (x != null)"))
+        self.assertTrue(second.add("SQL injection in find", "ps.setString(1, id);"))
+        self.assertTrue(second.add("SQL injection SQL in delete", "ps.setString(2, id);"))
+        # the same fix stored by the other process isn't written twice
+        self.assertFalse(first.add("SQL injection in find", "ps.setString(1, id);"))
+
+        self.assertEqual(first.lookup("null dereference")["pattern"], "if (x != null)")
+        self.assertEqual(second.lookup("null dereference")["pattern"], "if (x != null)")
+        reloaded = FixMemory(fake_encode, "fake", path=self.path, threshold=0.9)
+        self.assertEqual(len(reloaded), 3)
+        self.assertEqual(reloaded.lookup("null dereference")["pattern"], "if (x != null)")
+        self.assertIn("ps.setString", reloaded.lookup("SQL injection")["pattern"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from backend.source.pipeline.minify.minifier import language_for, minify, restore_header, split_header
+
+JAVA = """/*
+ * Copyright 2024 Example
+ * Licensed under the Apache License
+ */
+package demo;
+
+public class UserDao {
+    // looks the user up by id
+    public User find(String id) {
+        String sql = "SELECT *  FROM users // WHERE id = '" + id + "'";
+        return db.query(sql);
+    }
+
+    /** Deletes the user. */
+    public void delete(String id) {
+        db.execute("DELETE FROM users WHERE id = ?", id);
+        audit.log(id);
+    }
+}
+"""
+
+
+class TestMinifier(unittest.TestCase):
+    def test_language_for(self) -> None:
+        """Test that languages are derived from file extensions."""
+        self.assertEqual(language_for("src/UserDao.java"), "java")
+        self.assertEqual(language_for("tool.PY"), "python")
+        self.assertEqual(language_for("README"), "text")
+
+    def test_strips_comments_and_keeps_literals(self) -> None:
+        """Test that comments and indentation go while string literals stay untouched."""
+        minified = minify(JAVA, "java")
+        self.assertNotIn("Copyright", minified.text)
+        self.assertNotIn("looks the user up", minified.text)
+        self.assertNotIn("Deletes the user", minified.text)
+        self.assertIn('"SELECT *  FROM users // WHERE id = \'"', minified.text)
+        self.assertTrue(minified.text.startswith("package demo;"))
+        self.assertTrue(minified.header.startswith("/*\n * Copyright"))
+        self.assertLess(len(minified.text), len(JAVA))
+
+    def test_line_map_and_remap(self) -> None:
+        """Test that minified line numbers map back to the original file, also after an offset."""
+        minified = minify(JAVA, "java")
+        lines = minified.text.split("\n")
+        original = JAVA.split("\n")
+        for number, line in enumerate(lines, start=1):
+            self.assertIn(line.split(" ")[0], original[minified.original_line(number) - 1])
+
+        find = lines.index('public User find(String id) {') + 1
+        self.assertEqual(minified.remap_lines(f"Fault on line {find}"), "Fault on line 9")
+        self.assertEqual(minified.remap_lines(f"Lines {find} - {find + 2}"), "Lines 9 - 11")
+        self.assertEqual(minified.remap_lines(f"line {find - 2}", offset=2), "line 9")
+
+    def test_header_round_trip(self) -> None:
+        """Test that the split off header and the rest make up the file and the header comes back once."""
+        header, rest = split_header(JAVA, "java")
+        self.assertEqual(header + rest, JAVA)
+        self.assertTrue(rest.startswith("package demo;"))
+        self.assertEqual(restore_header(header, rest), JAVA)
+        self.assertEqual(restore_header(header, JAVA), JAVA)
+        self.assertEqual(restore_header(header, ""), "")
+
+    def test_python_comments(self) -> None:
+        """Test that python comments go while indentation and docstrings stay."""
+        code = "# module comment\ndef f(x):\n    # inner\n    s = '# not a comment'\n    return x  # trailing\n"
+        minified = minify(code, "python")
+        self.assertEqual(minified.text, "def f(x):\n    s = '# not a comment'\n    return x")
+        self.assertEqual(minified.line_map, [2, 4, 5])
+
+    def test_elide_unrelated_functions(self) -> None:
+        """Test that bodies of unrelated functions become stubs only when a related one exists."""
+        minified = minify(JAVA, "java", keep={"find"})
+        self.assertIn("db.query(sql);", minified.text)
+        self.assertNotIn("audit.log", minified.text)
+        self.assertIn("/* ... */", minified.text)
+
+        untouched = minify(JAVA, "java", keep={"unknown"})
+        self.assertIn("audit.log", untouched.text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from unittest.mock import Mock
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from backend.source.pipeline.patch_gen.patch_generation import PatchGeneration
+from backend.source.pipeline.pipeline import Pipeline
+
+
+class TestPatchGeneration(unittest.TestCase):
+    def setUp(self) -> None:
+        """Set up test fixtures before each test method."""
+        self.mock_model = Mock()
+        self.file_contents = "public class Test {\n    void run() {}\n}"
+        self.patterns = ["pattern1", "pattern2"]
+        self.patch_gen = PatchGeneration(self.mock_model, self.file_contents, self.patterns, "java")
+
+    def test_initialization(self) -> None:
+        """Test proper initialization of PatchGeneration."""
+        self.assertEqual(self.patch_gen.model, self.mock_model)
+        self.assertEqual(self.patch_gen.patterns, self.patterns)
+        self.assertEqual(self.patch_gen.patches, [])
+        self.assertEqual(self.patch_gen.candidates, [])
+
+    def test_return_code_block(self) -> None:
+        """Test extracting the code block from a response."""
+        text = "Here you go\n```java\nclass A {}\n```\n"
+        self.assertEqual(self.patch_gen.return_code_block(text).strip(), "class A {}")
+        self.assertEqual(self.patch_gen.return_code_block("no code"), "")
+
+    def test_create_patch_files(self) -> None:
+        """Test that each pattern produces one patch built on the previous one."""
+        self.mock_model.generate_response.side_effect = [
+            "```java\nclass A {}\n```",
+            "```java\nclass B {}\n```"
+        ]
+        self.patch_gen.create_patch_files()
+
+        self.assertEqual(self.mock_model.generate_response.call_count, 2)
+        self.assertEqual([patch.strip() for patch in self.patch_gen.patches], ["class A {}", "class B {}"])
+        second_prompt = self.mock_model.generate_response.call_args_list[1][0][0]
+        self.assertIn("class A {}", second_prompt)
+
+    def test_license_header_restored(self) -> None:
+        """Test that the license header is left out of the prompt and put back on the patch."""
+        header = "/*\n * Copyright Example\n */\n"
+        patch_gen = PatchGeneration(self.mock_model, header + self.file_contents, ["pattern1"], "java")
+        self.mock_model.generate_response.return_value = "```java\npublic class Test {}\n```"
+        patch_gen.create_patch_files()
+
+        self.assertNotIn("Copyright", self.mock_model.generate_response.call_args[0][0])
+        self.assertTrue(patch_gen.patches[0].startswith(header + "public class Test {}"))
+
+    def test_screen_candidate_brace_language(self) -> None:
+        """Test local screening for brace-delimited languages."""
+        self.assertTrue(self.patch_gen.screen_candidate("class A { void f() { g(\"}\"); } }"))
+        self.assertFalse(self.patch_gen.screen_candidate("class A { void f() { }"))
+        self.assertFalse(self.patch_gen.screen_candidate("   "))
+
+    def test_screen_candidate_python(self) -> None:
+        """Test local screening parses Python candidates."""
+        patch_gen = PatchGeneration(self.mock_model, "", ["p"], "python")
+        self.assertTrue(patch_gen.screen_candidate("def f():\n    return 1\n"))
+        self.assertFalse(patch_gen.screen_candidate("def f(:\n    return 1\n"))
+
+    def test_create_patch_candidates(self) -> None:
+        """Test sampling candidates for the final pattern and dropping ones that fail screening."""
+        responses = iter([
+            "```java\nclass A {}\n```",
+            "```java\nclass B { }\n```",
+            "```java\nclass C {\n```",
+            "no code block"
+        ])
+        self.mock_model.generate_response.side_effect = lambda *args, **kwargs: next(responses)
+
+        candidates = self.patch_gen.create_patch_candidates(3, max_workers=1, temperature=0.7)
+
+        # one serial call for the first pattern, three samples for the last one
+        self.assertEqual(self.mock_model.generate_response.call_count, 4)
+        self.assertEqual([patch.strip() for patch in self.patch_gen.patches], ["class A {}"])
+        self.assertEqual([code.strip() for code in candidates], ["class B { }"])
+        for call in self.mock_model.generate_response.call_args_list[1:]:
+            self.assertEqual(call.kwargs["temperature"], 0.7)
+
+    def test_create_patch_candidates_no_patterns(self) -> None:
+        """Test that no candidates are created without patterns."""
+        patch_gen = PatchGeneration(self.mock_model, self.file_contents, [], "java")
+        self.assertEqual(patch_gen.create_patch_candidates(3), [])
+        self.mock_model.generate_response.assert_not_called()
+
+    def test_pipeline_screens_python_candidates(self) -> None:
+        """Test that the pipeline screens candidates of a Python file by parsing them."""
+        pipeline = Pipeline.__new__(Pipeline)
+        pipeline.model = self.mock_model
+        pipeline.model.current_config = {"temperature": 0.7}
+        pipeline.filename = "app.py"
+        pipeline.precode_content = "def f():\n    return 1\n"
+        pipeline.patterns = ["pattern1"]
+        pipeline.num_candidates, pipeline.max_workers = 2, 1
+        responses = iter([
+            # valid Python whose comment would fail a bracket count
+            "```python\ndef f():\n    # returns (1\n    return 1\n```",
+            "```python\ndef f(:\n    return 1\n```"
+        ])
+        self.mock_model.generate_response.side_effect = lambda *args, **kwargs: next(responses)
+
+        pipeline.patch_generation()
+
+        self.assertEqual(len(pipeline.candidates), 1)
+        self.assertIn("# returns (1", pipeline.candidates[0])
+        self.assertIn("python", self.mock_model.generate_response.call_args[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
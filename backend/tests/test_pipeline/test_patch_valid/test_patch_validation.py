@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import Mock
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from backend.source.pipeline.patch_valid.patch_validation import PatchValidation, select_first_passing
+from backend.source.pipeline.pipeline import Pipeline
+
+
+class TestPatchValidation(unittest.TestCase):
+    def setUp(self) -> None:
+        """Set up test fixtures before each test method."""
+        self.mock_model = Mock()
+        self.validator = PatchValidation(self.mock_model, "class A {}", faults="#### Fault 1:\nfault", language="java")
+
+    def test_parse_llm_response(self) -> None:
+        """Test extracting status and issues from a model response."""
+        response = "**Status:** GOOD\n\n**Issues:** None\n\n**Explanation:** fine"
+        status, _ = self.validator.parse_llm_response(response)
+        self.assertEqual(status, "GOOD")
+
+        status, _ = self.validator.parse_llm_response("no verdict here")
+        self.assertEqual(status, "UNKNOWN")
+
+    def test_get_validation_prompt(self) -> None:
+        """Test the validation prompt includes the patch and language."""
+        prompt = self.validator.get_validation_prompt()
+        self.assertIn("class A {}", prompt)
+        self.assertIn("java", prompt)
+
+    def test_validate_patches_sets_status(self) -> None:
+        """Test that validation records the parsed status."""
+        self.mock_model.generate_response.return_value = "**Status:** BAD"
+        result = self.validator.validate_patches()
+        self.assertEqual(self.validator.status, "BAD")
+        self.assertIn("### Status: BAD", result)
+
+    def test_select_first_passing(self) -> None:
+        """Test that the first GOOD candidate is selected."""
+        verdicts = {"bad": "**Status:** BAD", "good": "**Status:** GOOD"}
+        self.mock_model.generate_response.side_effect = lambda prompt, **kwargs: verdicts["good" if "good_patch" in prompt else "bad"]
+
+        winner, reports = select_first_passing(self.mock_model, ["bad_patch", "good_patch"], language="java", max_workers=1)
+
+        self.assertEqual(winner, 1)
+        self.assertIn("### Status: GOOD", reports[1])
+
+    def test_select_first_passing_stops_early(self) -> None:
+        """Test that remaining candidates are skipped once one passes."""
+        self.mock_model.generate_response.return_value = "**Status:** GOOD"
+
+        winner, reports = select_first_passing(self.mock_model, ["a", "b", "c"], max_workers=1)
+
+        self.assertEqual(winner, 0)
+        self.assertEqual(list(reports), [0])
+        self.assertLess(self.mock_model.generate_response.call_count, 3)
+
+    def test_select_first_passing_none(self) -> None:
+        """Test the result when no candidate passes."""
+        self.mock_model.generate_response.return_value = "**Status:** BAD"
+        winner, reports = select_first_passing(self.mock_model, ["a", "b"], max_workers=2)
+        self.assertIsNone(winner)
+        self.assertEqual(sorted(reports), [0, 1])
+
+        self.assertEqual(select_first_passing(self.mock_model, []), (None, {}))
+
+    def test_pipeline_without_any_patch(self) -> None:
+        """Test that validation reports BAD instead of failing when no candidate was generated."""
+        pipeline = Pipeline.__new__(Pipeline)
+        pipeline.model = self.mock_model
+        pipeline.localization = "#### Fault 1:\nfault"
+        pipeline.candidates, pipeline.patches = [], []
+        pipeline.fix_memory = None
+
+        pipeline.patch_validation()
+
+        self.assertEqual(pipeline.validation_status, "BAD")
+        self.assertIsNone(pipeline.final_patch)
+        self.mock_model.generate_response.assert_not_called()
+
+    def test_pipeline_validates_in_source_language(self) -> None:
+        """Test that the pipeline validates a patch in the language of the file it came from."""
+        pipeline = Pipeline.__new__(Pipeline)
+        pipeline.model = self.mock_model
+        pipeline.filename = "app.py"
+        pipeline.localization = "#### Fault 1:\nfault"
+        pipeline.candidates, pipeline.patches = [], ["def f():\n    return 1\n"]
+        pipeline.fix_memory = None
+        self.mock_model.generate_response.return_value = "**Status:** BAD"
+
+        pipeline.patch_validation()
+
+        prompt = self.mock_model.generate_response.call_args[0][0]
+        self.assertIn("`python`", prompt)
+        self.assertNotIn("`java`", prompt)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -135,6 +135,44 @@ class TestPatternMatch(unittest.TestCase):
         for pattern in self.pattern_match.patterns:
             self.assertIsInstance(pattern, str)
 
+    def test_execute_pattern_matching_with_context_budget(self) -> None:
+        """Test that hybrid candidates are packed into the context budget before prompting."""
+        self.mock_rag.retrieve_context.return_value = [
+            {"code": "first chunk of code", "metadata": {"file_name": "A.java", "chunk_number": 0}},
+            {"code": "a second chunk that is far too long to fit", "metadata": {"file_name": "B.java", "chunk_number": 0}},
+            {"code": "third", "metadata": {"file_name": "C.java", "chunk_number": 0}},
+        ]
+        self.mock_model.get_token_count.side_effect = lambda text: len(text.split())
+        self.mock_model.generate_response.return_value = "```java\nfix();\n```"
+        pattern_match = PatternMatch(self.mock_model, self.mock_rag, "#### Fault 1:\nTest fault", context_budget=5, candidates=12)
+        pattern_match.get_prompt = Mock(return_value="prompt")
+
+        pattern_match.execute_pattern_matching()
+
+        self.mock_rag.retrieve_context.assert_called_once_with("#### Fault 1:\nTest fault", k=12, hybrid=True)
+        pattern_match.get_prompt.assert_called_once_with("#### Fault 1:\nTest fault", "first chunk of code\nthird")
+        self.assertEqual(pattern_match.patterns, ["fix();\n"])
+
+    def test_execute_pattern_matching_with_memory(self) -> None:
+        """Test that remembered fixes are reused verbatim or adapted instead of generated from scratch."""
+        memory = Mock()
+        memory.lookup.side_effect = [
+            {"fault": "#### Fault 1:\nSQL injection", "pattern": "ps.setString(1, id);\n", "response": "```java\nps.setString(1, id);\n```", "similarity": 0.99},
+            {"fault": "#### Fault 1:\nSQL injection", "pattern": "ps.setString(1, id);\n", "response": "```java\nps.setString(1, id);\n```", "similarity": 0.9},
+        ]
+        self.mock_rag.retrieve_context.return_value = [{"code": "test code", "metadata": {}}]
+        self.mock_model.generate_response.return_value = "```java\nps.setString(1, name);\n```"
+        pattern_match = PatternMatch(self.mock_model, self.mock_rag, self.fault_plan, memory=memory)
+
+        pattern_match.execute_pattern_matching()
+
+        self.assertEqual((pattern_match.reused, pattern_match.adapted), (1, 1))
+        self.mock_model.generate_response.assert_called_once()
+        prompt = self.mock_model.generate_response.call_args.args[0]
+        self.assertIn("ps.setString(1, id);", prompt)
+        self.assertEqual(self.mock_model.generate_response.call_args.kwargs["task"], "pattern_matching.adaptation")
+        self.assertEqual(pattern_match.patterns, ["ps.setString(1, id);\n", "ps.setString(1, name);\n"])
+
     def test_execute_pattern_matching_no_faults(self) -> None:
         """Test pattern matching execution with no faults."""
         self.pattern_match.fault_plan = ""
@@ -0,0 +1,44 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from backend.source.pipeline.rag.context_packing import merge_overlap, pack_context
+
+
+def result(code, file_name, chunk_number):
+    return {"code": code, "metadata": {"file_name": file_name, "chunk_number": chunk_number}}
+
+
+def count_words(text):
+    return len(text.split())
+
+
+class TestContextPacking(unittest.TestCase):
+    def test_merge_overlap(self) -> None:
+        """Test that the text shared by neighbouring chunks appears once."""
+        self.assertEqual(merge_overlap("a b c d", "c d e f"), "a b c d e f")
+        self.assertEqual(merge_overlap("a b", "x y"), "a b\nx y")
+
+    def test_without_budget(self) -> None:
+        """Test that everything is kept, minus duplicates and chunks contained in others."""
+        results = [result("class A { void f() {} }", "A.java", 0), result("void f() {}", "A.java", 3), result("class A { void f() {} }", "B.java", 0), result("int x;", "C.java", 0)]
+        self.assertEqual(pack_context(results), "class A { void f() {} }\nint x;")
+
+    def test_stitches_adjacent_chunks(self) -> None:
+        """Test that consecutive chunks of a file are merged whichever order they were retrieved in."""
+        results = [result("b c d", "A.java", 1), result("x y", "B.java", 0), result("d e f", "A.java", 2), result("a b", "A.java", 0)]
+        self.assertEqual(pack_context(results), "a b c d e f\nx y")
+
+    def test_budget(self) -> None:
+        """Test that chunks that don't fit are skipped and smaller ones still use the space."""
+        results = [result("one two three", "A.java", 0), result("four five six seven", "B.java", 0), result("eight", "C.java", 0)]
+        packed = pack_context(results, token_budget=4, count_tokens=count_words)
+        self.assertEqual(packed, "one two three\neight")
+        self.assertLessEqual(count_words(packed), 4)
+        self.assertEqual(pack_context(results, token_budget=2, count_tokens=count_words), "eight")
+        with self.assertRaises(ValueError):
+            pack_context(results, token_budget=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+from unittest.mock import Mock, patch
+import sys
+import os
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from backend.source.pipeline.rag.embedding_executor import EmbeddingExecutor, get_embedding_executor
+from backend.source.telemetry.tracing import tracer
+
+
+def fake_encode(texts, **kwargs):
+    return np.array([[len(t), 1.0] for t in texts], dtype="float32")
+
+
+class TestEmbeddingExecutor(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create an executor around a fake encoder."""
+        self.encoder = Mock()
+        self.encoder.encode.side_effect = fake_encode
+
+    def make_executor(self, **kwargs) -> EmbeddingExecutor:
+        executor = EmbeddingExecutor(self.encoder, **kwargs)
+        self.addCleanup(executor.close)
+        return executor
+
+    def test_single_request(self) -> None:
+        """Test that a lone request is encoded once the wait time passes."""
+        executor = self.make_executor(max_wait_ms=1)
+        np.testing.assert_array_equal(executor.encode(["a", "bb"]), fake_encode(["a", "bb"]))
+        self.encoder.encode.assert_called_once_with(["a", "bb"], batch_size=64, show_progress_bar=False)
+        self.assertEqual(executor.encode([]).shape[0], 0)
+
+    def test_concurrent_requests_share_a_batch(self) -> None:
+        """Test that requests from several threads are flushed as one batch."""
+        executor = self.make_executor(max_batch_size=8, max_wait_ms=2000)
+        queries = [[f"query {i}" * (i + 1)] for i in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(executor.encode, queries))
+
+        # the batch fills up long before the wait time runs out
+        self.assertEqual(executor.batches, 1)
+        self.assertEqual(self.encoder.encode.call_count, 1)
+        for query, result in zip(queries, results):
+            np.testing.assert_array_equal(result, fake_encode(query))
+
+    def test_batches_join_the_callers_trace(self) -> None:
+        """Test that a batch is recorded in the trace of the run it served and nowhere else."""
+        executor = self.make_executor(max_wait_ms=1)
+        with tracer.span("pipeline.run") as run:
+            executor.encode(["query"])
+        self.assertIn("rag.embedding_batch", [span.name for span in tracer.spans(run.trace_id)])
+
+        executor.encode(["ingest outside any run"])
+        kept = [span for spans in tracer._traces.values() for span in spans if span.name == "rag.embedding_batch"]
+        self.assertFalse(any(span.attributes["texts"] == 1 and span.parent_id is None for span in kept))
+
+    def test_large_request_is_split_and_queries_go_first(self) -> None:
+        """Test that a large request spans several batches and a query waiting with it is served first."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking_encode(texts, **kwargs):
+            started.set()
+            release.wait(2)
+            return fake_encode(texts)
+
+        self.encoder.encode.side_effect = blocking_encode
+        executor = self.make_executor(max_batch_size=4, max_wait_ms=1)
+        # holds the worker so the next two requests queue up together
+        first = executor.submit(["warm up"])
+        self.assertTrue(started.wait(2))
+        documents = [f"doc {i}" for i in range(10)]
+        ingest = executor.submit(documents)
+        query = executor.submit(["query"])
+        release.set()
+
+        np.testing.assert_array_equal(ingest.result(2), fake_encode(documents))
+        np.testing.assert_array_equal(query.result(2), fake_encode(["query"]))
+        first.result(2)
+        batches = [call.args[0] for call in self.encoder.encode.call_args_list]
+        self.assertEqual(batches[1][0], "query")
+        self.assertTrue(all(len(batch) <= 4 for batch in batches))
+        self.assertEqual(sum(len(batch) for batch in batches), 12)
+
+    def test_queries_dont_starve_an_ingest(self) -> None:
+        """Test that the oldest request gets a share of every batch while queries keep filling it."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking_encode(texts, **kwargs):
+            started.set()
+            release.wait(2)
+            return fake_encode(texts)
+
+        self.encoder.encode.side_effect = blocking_encode
+        executor = self.make_executor(max_batch_size=4, max_wait_ms=1, oldest_share=0.25)
+        first = executor.submit(["warm up"])
+        self.assertTrue(started.wait(2))
+        documents = [f"doc {i}" for i in range(3)]
+        ingest = executor.submit(documents)
+        queries = [executor.submit([f"query {i}"]) for i in range(9)]
+        release.set()
+
+        np.testing.assert_array_equal(ingest.result(2), fake_encode(documents))
+        for query in queries:
+            query.result(2)
+        first.result(2)
+        batches = [call.args[0] for call in self.encoder.encode.call_args_list][1:]
+        # one document rides along with three queries in each batch, queries still lead
+        self.assertEqual([sum(text.startswith("doc") for text in batch) for batch in batches], [1, 1, 1])
+        self.assertTrue(all(batch[0].startswith("query") for batch in batches))
+
+    def test_failed_batch_raises_to_callers(self) -> None:
+        """Test that an encoder error reaches every request in the batch and the executor keeps going."""
+        executor = self.make_executor(max_wait_ms=1)
+        self.encoder.encode.side_effect = RuntimeError("out of memory")
+        with self.assertRaises(RuntimeError):
+            executor.encode(["a"])
+        self.encoder.encode.side_effect = fake_encode
+        np.testing.assert_array_equal(executor.encode(["b"]), fake_encode(["b"]))
+
+    @patch.dict(os.environ, {"EMBEDDING_MAX_BATCH_SIZE": "16", "EMBEDDING_MAX_WAIT_MS": "3"})
+    def test_get_embedding_executor(self) -> None:
+        """Test that executors are shared per model and configured from the environment."""
+        executor = get_embedding_executor("test-executor-model", self.encoder)
+        self.assertIs(get_embedding_executor("test-executor-model", Mock()), executor)
+        self.assertEqual(executor.max_batch_size, 16)
+        self.assertAlmostEqual(executor.max_wait, 0.003)
+
+
+if __name__ == '__main__':
+    unittest.main()
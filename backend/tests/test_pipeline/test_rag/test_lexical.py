@@ -0,0 +1,36 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from backend.source.pipeline.rag.lexical import BM25Index, tokenize
+
+
+class TestLexical(unittest.TestCase):
+    def test_tokenize_splits_identifiers(self) -> None:
+        """Test that identifiers are kept whole and split into camel and snake case parts."""
+        tokens = tokenize("conn.prepareStatement(SQL_QUERY); parseHTTPResponse")
+        self.assertIn("preparestatement", tokens)
+        self.assertIn("prepare", tokens)
+        self.assertIn("statement", tokens)
+        self.assertIn("sql_query", tokens)
+        self.assertIn("query", tokens)
+        self.assertIn("http", tokens)
+        self.assertIn("response", tokens)
+
+    def test_search_ranks_exact_identifiers(self) -> None:
+        """Test that the chunk using the queried identifier ranks first and unmatched chunks are left out."""
+        index = BM25Index()
+        index.build([
+            "int add(int a, int b) { return a + b; }",
+            "ResultSet rs = stmt.executeQuery(\"SELECT * FROM users WHERE id = \" + id);",
+            "PreparedStatement ps = conn.prepareStatement(sql); ps.setString(1, id);",
+        ])
+        results = index.search("prepareStatement is missing in executeQuery", k=5)
+        self.assertEqual({doc_id for doc_id, _ in results}, {1, 2})
+        self.assertEqual(index.search("executeQuery", k=1)[0][0], 1)
+        self.assertEqual(index.search("nothing matches", k=3), [])
+        self.assertEqual(BM25Index().search("executeQuery", k=3), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
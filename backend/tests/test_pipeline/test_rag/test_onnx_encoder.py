@@ -0,0 +1,89 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import importlib.util
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from backend.source.pipeline.rag.onnx_encoder import OnnxEncoder
+from backend.source.pipeline.rag.rag import load_encoder
+
+HAS_ONNXRUNTIME = importlib.util.find_spec("onnxruntime") is not None and importlib.util.find_spec("onnx") is not None
+
+TEXTS = [
+    "public class Dao { ResultSet find(String id) { return query(\"SELECT * FROM users WHERE id = \" + id); } }",
+    "int total = 0; for (int i = 0; i <= values.size(); i++) { total += values.get(i); }",
+    "BufferedReader reader = new BufferedReader(new FileReader(path));",
+    "return a + b;",
+]
+
+
+def build_tiny_model(directory: str) -> str:
+    # a small random BERT with a word level tokenizer, so the test never downloads anything
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import BertConfig, BertModel, PreTrainedTokenizerFast
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling, Transformer
+
+    words = sorted({word for text in TEXTS for word in text.split()})
+    vocab = {token: i for i, token in enumerate(["[PAD]", "[UNK]", "[CLS]", "[SEP]"] + words)}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    hf_tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]", pad_token="[PAD]", cls_token="[CLS]", sep_token="[SEP]")
+    transformer_dir = os.path.join(directory, "transformer")
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2, intermediate_size=64, max_position_embeddings=128)
+    BertModel(config).save_pretrained(transformer_dir)
+    hf_tokenizer.save_pretrained(transformer_dir)
+
+    model_dir = os.path.join(directory, "model")
+    transformer = Transformer(transformer_dir, max_seq_length=64)
+    SentenceTransformer(modules=[transformer, Pooling(32, "mean"), Normalize()], device="cpu").save(model_dir)
+    return model_dir
+
+
+@unittest.skipUnless(HAS_ONNXRUNTIME, "onnxruntime and onnx are not installed")
+class TestOnnxEncoder(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Build a tiny sentence transformer and export it once for every test."""
+        from sentence_transformers import SentenceTransformer
+        cls.directory = tempfile.mkdtemp()
+        cls.model_dir = build_tiny_model(cls.directory)
+        cls.cache_dir = os.path.join(cls.directory, "onnx")
+        cls.expected = SentenceTransformer(cls.model_dir, device="cpu").encode(TEXTS)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def test_fp32_export_matches_torch(self) -> None:
+        """Test that the unquantized export reproduces the torch embeddings."""
+        encoder = OnnxEncoder(self.model_dir, cache_dir=self.cache_dir, quantize=False)
+        np.testing.assert_allclose(encoder.encode(TEXTS, batch_size=3), self.expected, atol=1e-4)
+
+    def test_int8_export_agrees_with_torch(self) -> None:
+        """Test that the quantized model is close to torch and returns results in input order."""
+        encoder = OnnxEncoder(self.model_dir, cache_dir=self.cache_dir)
+        embeddings = encoder.encode(TEXTS, batch_size=2)
+        self.assertEqual(embeddings.shape, self.expected.shape)
+        self.assertEqual(embeddings.dtype, np.float32)
+        cosine = np.sum(embeddings * self.expected, axis=1)
+        self.assertTrue(np.all(cosine > 0.98), cosine)
+        self.assertTrue(os.path.exists(os.path.join(encoder.directory, "encoder_config.json")))
+
+    def test_empty_input(self) -> None:
+        """Test that encoding nothing returns an empty array."""
+        encoder = OnnxEncoder(self.model_dir, cache_dir=self.cache_dir)
+        self.assertEqual(encoder.encode([]).shape[0], 0)
+
+
+class TestLoadEncoder(unittest.TestCase):
+    def test_unknown_backend(self) -> None:
+        """Test that an unsupported backend is rejected before anything is loaded."""
+        with self.assertRaises(ValueError):
+            load_encoder("all-MiniLM-L6-v2", backend="tensorrt")
+
+
+if __name__ == '__main__':
+    unittest.main()
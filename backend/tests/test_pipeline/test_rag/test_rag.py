@@ -0,0 +1,192 @@
+import unittest
+from unittest.mock import Mock, patch
+import sys
+import os
+import time
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from backend.source.pipeline.rag.rag import RAG, chunk_file
+from backend.source.pipeline.rag.embedding_executor import EmbeddingExecutor
+from backend.source.pipeline.rag.query_cache import LRUCache, query_embeddings
+from backend.source.concurrency.singleflight import embedding_flights
+
+
+def fake_encode(texts, **kwargs):
+    # deterministic 4-d "embeddings" based on the text contents
+    return np.array([[len(t), t.count("SELECT"), t.count("class"), 1.0] for t in texts], dtype="float32")
+
+
+class TestRAG(unittest.TestCase):
+    def setUp(self) -> None:
+        """Use an in-memory index and a fake embedding model."""
+        patcher = patch("backend.source.pipeline.rag.rag.load_encoder")
+        self.mock_load_encoder = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.encoder = Mock()
+        self.encoder.encode.side_effect = fake_encode
+        self.mock_load_encoder.return_value = self.encoder
+        # a private executor so the shared one never holds on to this test's fake encoder
+        self.executor = EmbeddingExecutor(self.encoder, max_wait_ms=1)
+        self.addCleanup(self.executor.close)
+        patcher = patch("backend.source.pipeline.rag.rag.get_embedding_executor", return_value=self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # the query embedding cache is process wide, start and end every test without the fake's vectors
+        query_embeddings.clear()
+        self.addCleanup(query_embeddings.clear)
+        self.rag = RAG(index_path=None)
+        self.files = [
+            {"filename": "Dao.java", "content": "class Dao { String q(String id) { return \"SELECT \" + id; } }"},
+            {"filename": "Util.java", "content": "class Util { int add(int a, int b) { return a + b; } }"},
+        ]
+
+    def test_chunk_file(self) -> None:
+        """Test chunking a file by its extension."""
+        filename, chunks = chunk_file(self.files[0])
+        self.assertEqual(filename, "Dao.java")
+        self.assertEqual(chunks, [self.files[0]["content"]])
+        self.assertEqual(chunk_file({"filename": "empty.java", "content": ""}), ("empty.java", []))
+
+    def test_embed_and_retrieve(self) -> None:
+        """Test that embedded chunks can be retrieved with metadata."""
+        self.rag.embed_code(self.files)
+        self.assertEqual(self.rag.index.ntotal, 2)
+
+        results = self.rag.retrieve_context(self.files[0]["content"], k=1)
+        self.assertEqual(results[0]["metadata"]["file_name"], "Dao.java")
+        self.assertEqual(results[0]["similarity_score"], 1.0)
+
+    def test_content_digest(self) -> None:
+        """Test that the digest changes with any embedded file and is reproducible."""
+        self.assertEqual(self.rag.content_digest, "")
+        self.rag.embed_code(self.files)
+        digest = self.rag.content_digest
+
+        same = RAG(index_path=None)
+        same.embed_code(self.files)
+        self.assertEqual(same.content_digest, digest)
+        edited = RAG(index_path=None)
+        edited.embed_code([self.files[0], dict(self.files[1], content="class Util { }")])
+        self.assertNotEqual(edited.content_digest, digest)
+
+        self.rag.clear_index()
+        self.assertEqual(self.rag.content_digest, "")
+
+    def test_retrieve_from_empty_index(self) -> None:
+        """Test that querying before embedding raises."""
+        with self.assertRaises(ValueError):
+            self.rag.retrieve_context("query")
+
+    def test_identical_encodes_are_coalesced(self) -> None:
+        """Test that concurrent identical encodes share one model call."""
+        release = threading.Event()
+
+        def slow_encode(texts, **kwargs):
+            release.wait(1)
+            return fake_encode(texts)
+
+        self.encoder.encode.side_effect = slow_encode
+        before = embedding_flights.stats()
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(self.rag.encode, ["same query"]) for _ in range(3)]
+            deadline = time.monotonic() + 2
+            while embedding_flights.stats()["coalesced"] - before["coalesced"] < 2 and time.monotonic() < deadline:
+                time.sleep(0.001)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(self.encoder.encode.call_count, 1)
+        for result in results:
+            np.testing.assert_array_equal(result, fake_encode(["same query"]))
+
+    def test_encode_without_executor(self) -> None:
+        """Test that use_executor=False encodes on the calling thread with the caller's arguments."""
+        rag = RAG(index_path=None, use_executor=False)
+        self.assertIsNone(rag.executor)
+        np.testing.assert_array_equal(rag.encode(["query"], batch_size=8), fake_encode(["query"]))
+        self.encoder.encode.assert_called_once_with(["query"], batch_size=8)
+
+    def test_compressed_storage(self) -> None:
+        """Test that a quantized index with compressed chunks still retrieves exact matches after reranking."""
+        rag = RAG(index_path=None, index_type="sq8", chunk_compression="zlib")
+        rag.embed_code(self.files)
+        self.assertEqual(rag.index.ntotal, 2)
+        self.assertEqual(len(rag.exact), 2)
+        self.assertEqual(list(rag.code_chunks), [f["content"] for f in self.files])
+
+        results = rag.retrieve_context(self.files[1]["content"], k=2)
+        self.assertEqual(results[0]["metadata"]["file_name"], "Util.java")
+        self.assertEqual(results[0]["similarity_score"], 1.0)
+
+        rag.clear_index()
+        self.assertEqual(len(rag.exact), 0)
+        rag.embed_code(self.files)
+        self.assertEqual(type(rag.index).__name__, "IndexScalarQuantizer")
+
+    def test_hybrid_retrieval(self) -> None:
+        """Test that lexical matches on identifiers are fused with the vector ranking."""
+        self.rag.embed_code(self.files)
+        query = "q(String id)"
+        self.assertEqual(self.rag.retrieve_context(query, k=1)[0]["metadata"]["file_name"], "Util.java")
+
+        results = self.rag.retrieve_context(query, k=1, hybrid=True)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["metadata"]["file_name"], "Dao.java")
+        self.assertGreater(results[0]["lexical_score"], 0)
+        self.assertGreater(results[0]["fused_score"], 0)
+
+        self.rag.clear_index()
+        self.assertEqual(self.rag.lexical.search(query, k=1), [])
+
+    def test_repeated_queries_are_cached(self) -> None:
+        """Test that repeated queries skip the encoder and the search until the index changes."""
+        self.rag.embed_code(self.files)
+        first = self.rag.retrieve_context("SQL   injection ", k=1)
+        calls = self.encoder.encode.call_count
+
+        self.assertEqual(self.rag.retrieve_context("SQL injection", k=1), first)
+        self.assertEqual(self.encoder.encode.call_count, calls)
+        self.assertEqual(self.rag.results.stats()["hits"], 1)
+
+        # a new RAG has its own results but shares the query embeddings
+        other = RAG(index_path=None)
+        other.embed_code(self.files)
+        calls = self.encoder.encode.call_count
+        self.assertEqual(other.retrieve_context("SQL injection", k=1), first)
+        self.assertEqual(self.encoder.encode.call_count, calls)
+
+        version = self.rag.index_version
+        self.rag.clear_index()
+        self.assertGreater(self.rag.index_version, version)
+        self.assertEqual(len(self.rag.results), 0)
+        self.rag.embed_code(self.files[1:])
+        self.assertEqual(self.rag.retrieve_context("SQL injection", k=1)[0]["metadata"]["file_name"], "Util.java")
+
+    def test_lru_cache(self) -> None:
+        """Test that the least recently used entry is evicted and a zero size cache stores nothing."""
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 1, "size": 2, "maxsize": 2})
+        disabled = LRUCache(0)
+        disabled.put("a", 1)
+        self.assertIsNone(disabled.get("a"))
+
+    def test_backend_selection(self) -> None:
+        """Test that the embedding backend comes from the constructor or EMBEDDING_BACKEND."""
+        rag = RAG(index_path=None, backend="onnx")
+        self.mock_load_encoder.assert_called_with("all-MiniLM-L6-v2", "onnx")
+        self.assertEqual(rag.encoder_key, "all-MiniLM-L6-v2[onnx]")
+        with patch.dict(os.environ, {"EMBEDDING_BACKEND": "onnx"}):
+            self.assertEqual(RAG(index_path=None).backend, "onnx")
+        self.assertEqual(self.rag.encoder_key, "all-MiniLM-L6-v2")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import shutil
+import tempfile
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from backend.source.pipeline.rag.storage import ChunkStore, ExactVectors, build_index, PQ_MIN_TRAINING
+
+
+class TestChunkStore(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create chunks that span several blocks, including non-ascii text."""
+        self.chunks = [f"class Service{i} {{ String q = \"SELECT * FROM t{i}\"; }} // é{i}" for i in range(23)]
+
+    def test_behaves_like_a_list(self) -> None:
+        """Test indexing, slicing, iteration and length across sealed blocks and the tail."""
+        for compression in (None, "zlib", "zstd"):
+            store = ChunkStore(self.chunks, compression=compression, block_size=5, cache_blocks=1)
+            self.assertEqual(len(store), 23)
+            self.assertEqual(store[0], self.chunks[0])
+            self.assertEqual(store[7], self.chunks[7])
+            self.assertEqual(store[-1], self.chunks[-1])
+            self.assertEqual(store[3:12], self.chunks[3:12])
+            self.assertEqual(list(store), self.chunks)
+            self.assertEqual(store, self.chunks)
+            with self.assertRaises(IndexError):
+                store[23]
+
+    def test_compresses_text(self) -> None:
+        """Test that sealed blocks take less space than the raw text."""
+        store = ChunkStore(self.chunks * 10, compression="zlib", block_size=64)
+        self.assertLess(store.nbytes(), sum(len(chunk.encode("utf-8")) for chunk in self.chunks * 10) / 2)
+
+    def test_falls_back_without_zstandard(self) -> None:
+        """Test that zstd falls back to zlib when zstandard is missing, and unknown codecs are rejected."""
+        with patch.dict(sys.modules, {"zstandard": None}):
+            self.assertEqual(ChunkStore(self.chunks, compression="zstd").compression, "zlib")
+        with self.assertRaises(ValueError):
+            ChunkStore(compression="lz4")
+
+
+class TestIndexes(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create random vectors to index."""
+        self.vectors = np.random.default_rng(0).standard_normal((PQ_MIN_TRAINING + 44, 32)).astype("float32")
+
+    def test_build_index(self) -> None:
+        """Test every index type and that pq falls back to sq8 when there is too little to train on."""
+        for index_type in ("flat", "fp16", "sq8", "pq"):
+            index = build_index(self.vectors, index_type)
+            index.add(self.vectors)
+            _, ids = index.search(self.vectors[:1], 1)
+            self.assertEqual(ids[0][0], 0, index_type)
+        self.assertEqual(type(build_index(self.vectors[:10], "pq")).__name__, "IndexScalarQuantizer")
+        with self.assertRaises(ValueError):
+            build_index(self.vectors, "hnsw")
+
+    def test_exact_vectors(self) -> None:
+        """Test that exact vectors are appended on disk and give squared L2 distances."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        path = os.path.join(directory, "index.faiss.vectors.npy")
+        exact = ExactVectors(path)
+        exact.add(self.vectors[:10])
+        exact.add(self.vectors[10:20])
+        self.assertEqual(len(exact), 20)
+        ids = np.array([15, 2, 7])
+        expected = ((self.vectors[ids] - self.vectors[2]) ** 2).sum(axis=1)
+        np.testing.assert_allclose(exact.distances(self.vectors[2], ids), expected, rtol=1e-5)
+
+        self.assertEqual(len(ExactVectors(path)), 20)
+        exact.clear()
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from unittest.mock import Mock, patch
+import sys
+import os
+import tarfile
+import tempfile
+import zipfile
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from backend.source.pipeline.repository.repository import RepositoryPipeline
+
+
+class TestRepositoryPipeline(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create a small repository on disk."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.repo = os.path.join(self.tmp_dir.name, "repo")
+        self.sources = {
+            "src/Dao.java": "class Dao { String q(String id) { return \"SELECT \" + id; } }",
+            "src/Service.java": "class Service { Dao dao; }",
+            "src/empty.py": "   ",
+            "README.md": "docs",
+        }
+        for name, content in self.sources.items():
+            path = os.path.join(self.repo, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+
+    def test_load_files_from_directory(self) -> None:
+        """Test that only non-empty source files are loaded with relative names."""
+        files = RepositoryPipeline(self.repo).load_files()
+        self.assertEqual([f["filename"] for f in files], ["src/Dao.java", "src/Service.java"])
+
+    def test_load_files_from_archives(self) -> None:
+        """Test loading the same repository from zip and tar archives."""
+        zip_path = os.path.join(self.tmp_dir.name, "repo.zip")
+        with zipfile.ZipFile(zip_path, "w") as archive:
+            for name, content in self.sources.items():
+                archive.writestr(name, content)
+        tar_path = os.path.join(self.tmp_dir.name, "repo.tar.gz")
+        with tarfile.open(tar_path, "w:gz") as archive:
+            archive.add(os.path.join(self.repo, "src"), arcname="src")
+
+        for path in [zip_path, tar_path]:
+            files = RepositoryPipeline(path).load_files()
+            self.assertEqual([f["filename"] for f in files], ["src/Dao.java", "src/Service.java"])
+
+    def test_load_files_invalid_source(self) -> None:
+        """Test that a plain file is rejected."""
+        with self.assertRaises(ValueError):
+            RepositoryPipeline(os.path.join(self.repo, "README.md")).load_files()
+
+    @patch("backend.source.pipeline.repository.repository.RAG")
+    def test_ingest_embeds_and_tokenizes_once(self, mock_rag_cls) -> None:
+        """Test that the repository is embedded and tokenized in one pass."""
+        repository = RepositoryPipeline(self.repo, max_workers=2, batch_size=16)
+        repository.model = Mock()
+        repository.model.tokenizer.return_value = {"input_ids": [[1, 2], [3]]}
+
+        repository.ingest()
+
+        mock_rag_cls.return_value.embed_code.assert_called_once_with(repository.files, max_workers=2, batch_size=16)
+        repository.model.tokenizer.assert_called_once()
+        self.assertEqual(repository.tokens, {"src/Dao.java": [1, 2], "src/Service.java": [3]})
+
+    @patch("backend.source.pipeline.repository.repository.Pipeline")
+    def test_run_shares_index(self, mock_pipeline_cls) -> None:
+        """Test that every file's pipeline reuses the shared index and tokens."""
+        repository = RepositoryPipeline(self.repo, max_workers=1)
+        repository.load_files()
+        repository.rag = Mock()
+        repository.tokens = {"src/Dao.java": [1], "src/Service.java": [2]}
+        mock_pipeline_cls.return_value.final_patch = "patch"
+
+        results = repository.run()
+
+        self.assertEqual(sorted(results), ["src/Dao.java", "src/Service.java"])
+        for call in mock_pipeline_cls.call_args_list:
+            self.assertIs(call.kwargs["rag"], repository.rag)
+            self.assertEqual(call.kwargs["tokens"], repository.tokens[call.args[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
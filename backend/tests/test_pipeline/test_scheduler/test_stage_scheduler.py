@@ -0,0 +1,139 @@
+import unittest
+from unittest.mock import Mock
+import sys
+import os
+import tempfile
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from backend.source.pipeline.scheduler.stage_scheduler import Stage, StageScheduler
+from backend.source.pipeline.pipeline import Pipeline
+
+
+class FakeState:
+    def __init__(self) -> None:
+        self.source = "code"
+        self.config = Mock(name="config")
+        self.config.model = "model-a"
+        self.first = None
+        self.second = None
+        self.third = None
+        self.calls = []
+
+    def run_first(self) -> None:
+        self.calls.append("first")
+        self.first = f"first({self.source})"
+
+    def run_second(self) -> None:
+        self.calls.append("second")
+        self.second = f"second({self.first})"
+
+    def run_third(self) -> None:
+        self.calls.append("third")
+        self.third = f"third({self.second})"
+
+
+class TestStageScheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        """Set up a temporary checkpoint directory and a three stage chain."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.versions = {"first": "1", "second": "1", "third": "1"}
+
+    def make_scheduler(self, state: FakeState, skip_after_first: bool = False, on_progress=None) -> StageScheduler:
+        # declared out of order on purpose, the scheduler sorts by dependencies
+        stages = [
+            Stage("third", state.run_third, inputs=["second"], outputs=["third"], version=self.versions["third"]),
+            Stage("first", state.run_first, inputs=["source", "config.model"], outputs=["first"],
+                  version=self.versions["first"], skip_downstream=lambda: skip_after_first),
+            Stage("second", state.run_second, inputs=["first"], outputs=["second"], version=self.versions["second"]),
+        ]
+        return StageScheduler(state, stages, self.tmp_dir.name, on_progress)
+
+    def test_topological_order(self) -> None:
+        """Test that stages run after the stages producing their inputs."""
+        scheduler = self.make_scheduler(FakeState())
+        self.assertEqual(scheduler.order, ["first", "second", "third"])
+        self.assertEqual(scheduler.downstream("first"), {"second", "third"})
+
+    def test_cycle_detection(self) -> None:
+        """Test that cyclic stage graphs are rejected."""
+        stages = [
+            Stage("a", Mock(), inputs=["y"], outputs=["x"]),
+            Stage("b", Mock(), inputs=["x"], outputs=["y"]),
+        ]
+        with self.assertRaises(ValueError):
+            StageScheduler(FakeState(), stages)
+
+    def test_resume_from_checkpoints(self) -> None:
+        """Test that an identical rerun restores every stage without running it."""
+        state = FakeState()
+        self.make_scheduler(state).run()
+        self.assertEqual(state.calls, ["first", "second", "third"])
+
+        rerun = FakeState()
+        scheduler = self.make_scheduler(rerun)
+        scheduler.run()
+        self.assertEqual(rerun.calls, [])
+        self.assertEqual(scheduler.restored, ["first", "second", "third"])
+        self.assertEqual(rerun.third, "third(second(first(code)))")
+
+    def test_only_changed_stage_reruns(self) -> None:
+        """Test that bumping the last stage's version costs one stage."""
+        self.make_scheduler(FakeState()).run()
+
+        self.versions["third"] = "2"
+        rerun = FakeState()
+        scheduler = self.make_scheduler(rerun)
+        scheduler.run()
+        self.assertEqual(rerun.calls, ["third"])
+        self.assertEqual(scheduler.restored, ["first", "second"])
+
+    def test_changed_source_reruns_everything(self) -> None:
+        """Test that changing the source invalidates downstream checkpoints."""
+        self.make_scheduler(FakeState()).run()
+
+        rerun = FakeState()
+        rerun.source = "edited code"
+        self.make_scheduler(rerun).run()
+        self.assertEqual(rerun.calls, ["first", "second", "third"])
+
+    def test_skip_downstream(self) -> None:
+        """Test that a stage can skip everything after it."""
+        state = FakeState()
+        scheduler = self.make_scheduler(state, skip_after_first=True)
+        scheduler.run()
+        self.assertEqual(state.calls, ["first"])
+        self.assertEqual(scheduler.skipped, ["second", "third"])
+
+    def test_progress_events(self) -> None:
+        """Test that each stage reports when it runs, finishes, is restored or skipped."""
+        events = []
+        self.make_scheduler(FakeState(), on_progress=lambda *event: events.append(event)).run()
+        self.assertEqual(events, [("first", "running"), ("first", "done"), ("second", "running"), ("second", "done"), ("third", "running"), ("third", "done")])
+
+        events.clear()
+        self.versions["second"] = "2"
+        self.make_scheduler(FakeState(), skip_after_first=True, on_progress=lambda *event: events.append(event)).run()
+        self.assertEqual(events, [("first", "restored"), ("second", "skipped"), ("third", "skipped")])
+
+    def test_no_checkpoint_dir(self) -> None:
+        """Test that checkpointing can be disabled."""
+        state = FakeState()
+        stages = [Stage("first", state.run_first, inputs=["source"], outputs=["first"])]
+        StageScheduler(state, stages).run()
+        StageScheduler(state, stages).run()
+        self.assertEqual(state.calls, ["first", "first"])
+
+    def test_pipeline_keys_on_language(self) -> None:
+        """Test that the same source uploaded with another language gets its own fault localization checkpoint."""
+        def key(filename):
+            pipeline = Pipeline.__new__(Pipeline)
+            pipeline.filename, pipeline.precode_content = filename, "class A {}"
+            pipeline.model = Mock(model="model-a", routes={}, generation_profiles={})
+            return StageScheduler(pipeline, pipeline.get_stages()).stage_key("fault_localization")
+
+        self.assertNotEqual(key("A.java"), key("A.py"))
+        self.assertEqual(key("A.java"), key("B.java"))
+
+
+if __name__ == '__main__':
+    unittest.main()
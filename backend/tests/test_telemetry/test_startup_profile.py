@@ -0,0 +1,46 @@
+import unittest
+import sys
+import os
+import subprocess
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from backend.source.telemetry.startup_profile import format_report, parse_importtime
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   encodings.aliases
+import time:       300 |        420 | encodings
+import time:      2000 |       2000 |     numpy.core
+import time:       500 |       2500 |   numpy
+import time:      1000 |       3500 | backend.source.pipeline.rag
+some other stderr line
+"""
+
+
+class TestStartupProfile(unittest.TestCase):
+    def test_parse_importtime(self) -> None:
+        """Test that every importtime line becomes (module, self, cumulative, depth)."""
+        modules = parse_importtime(IMPORTTIME_OUTPUT)
+        self.assertEqual(len(modules), 5)
+        self.assertEqual(modules[0], ("encodings.aliases", 120, 120, 1))
+        self.assertEqual(modules[2], ("numpy.core", 2000, 2000, 2))
+        self.assertEqual(modules[4], ("backend.source.pipeline.rag", 1000, 3500, 0))
+
+    def test_format_report(self) -> None:
+        """Test that packages are ranked by cumulative time and modules by their own time."""
+        report = format_report(parse_importtime(IMPORTTIME_OUTPUT), {"import_seconds": 1.5, "build_seconds": 0.25}, top=2)
+        self.assertIn("UI imports: 1.50s, UI build: 0.25s", report)
+        packages, modules = report.split("Slowest modules (self):")
+        self.assertLess(packages.index("numpy"), packages.index("encodings"))
+        self.assertIn("0.002s  numpy.core", modules)
+        self.assertNotIn("encodings.aliases", modules)
+
+    def test_pipeline_import_is_light(self) -> None:
+        """Test that importing the pipeline leaves the slow model libraries for first use."""
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..'))
+        script = "import sys, backend.source.pipeline.pipeline; print(sorted(m for m in ('litellm', 'transformers', 'sentence_transformers', 'torch', 'huggingface_hub', 'faiss') if m in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "[]")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import urllib.request
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from backend.source.telemetry.tracing import Tracer, start_metrics_server
+import backend.source.telemetry.tracing as tracing
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self) -> None:
+        """Create a tracer writing to a temporary JSONL file."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.trace_path = os.path.join(self.tmp_dir.name, "traces.jsonl")
+        self.tracer = Tracer(self.trace_path)
+
+    def test_nested_spans_share_trace(self) -> None:
+        """Test that child spans join their parent's trace."""
+        with self.tracer.span("pipeline.run") as root:
+            with self.tracer.span("stage", stage="fault_localization") as child:
+                self.tracer.add(prompt_tokens=12, completion_tokens=3)
+
+        self.assertEqual(child.trace_id, root.trace_id)
+        self.assertEqual(child.parent_id, root.span_id)
+        self.assertEqual(child.attributes["prompt_tokens"], 12)
+        self.assertIsNone(self.tracer.current_span())
+
+    def test_spans_exported_to_jsonl(self) -> None:
+        """Test that finished spans are appended to the trace file."""
+        with self.tracer.span("rag.retrieve_context", k=5):
+            pass
+        with open(self.trace_path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["name"], "rag.retrieve_context")
+        self.assertEqual(records[0]["attributes"], {"k": 5})
+
+    def test_trace_file_rotates(self) -> None:
+        """Test that the trace file is moved aside once it would pass max_bytes."""
+        tracer = Tracer(self.trace_path, max_bytes=600)
+        for _ in range(5):
+            with tracer.span("rag.retrieve_context", k=5):
+                pass
+        self.assertLessEqual(os.path.getsize(self.trace_path), 600)
+        self.assertTrue(os.path.exists(f"{self.trace_path}.1"))
+
+    def test_trace_file_is_opt_in(self) -> None:
+        """Test that the process tracer only writes a file when PIPELINE_TRACE_PATH is set."""
+        self.assertIsNone(Tracer().trace_path)
+        if not os.getenv("PIPELINE_TRACE_PATH"):
+            self.assertIsNone(tracing.tracer.trace_path)
+
+    def test_error_recorded(self) -> None:
+        """Test that exceptions are recorded on the span and re-raised."""
+        with self.assertRaises(ValueError):
+            with self.tracer.span("llm.generate") as span:
+                raise ValueError("boom")
+        self.assertEqual(span.error, "ValueError: boom")
+
+    def test_summary(self) -> None:
+        """Test the per-run summary aggregates by span label."""
+        with self.tracer.span("pipeline.run") as root:
+            for _ in range(2):
+                with self.tracer.span("llm.generate", prompt_tokens=10, completion_tokens=2, retries=1):
+                    pass
+            with self.tracer.span("stage", stage="pattern_matching", cache_hit=True):
+                pass
+
+        summary = self.tracer.summary(root.trace_id)
+        self.assertEqual(summary["llm.generate"]["count"], 2)
+        self.assertEqual(summary["llm.generate"]["prompt_tokens"], 20)
+        self.assertEqual(summary["llm.generate"]["retries"], 2)
+        self.assertEqual(summary["stage[pattern_matching]"]["cache_hits"], 1)
+        self.assertIn("| llm.generate | 2 |", self.tracer.format_summary(root.trace_id))
+        self.assertEqual(self.tracer.format_summary(None), "No run recorded yet.")
+
+    def test_shared_and_untraced_spans(self) -> None:
+        """Test that a span can join several traces, or only count towards the metrics."""
+        tracer = Tracer(max_traces=2)
+        with tracer.span("pipeline.run") as first:
+            with tracer.span("pipeline.run") as second:
+                pass
+        with tracer.span("rag.embedding_batch", parent=first, links=[second.trace_id]) as batch:
+            pass
+        self.assertEqual(batch.parent_id, first.span_id)
+        self.assertIn(batch, tracer.spans(first.trace_id))
+        self.assertIn(batch, tracer.spans(second.trace_id))
+
+        for _ in range(3):
+            with tracer.span("rag.embedding_batch", keep_trace=False):
+                pass
+        self.assertTrue(tracer.spans(first.trace_id))
+        self.assertIn('pipeline_span_seconds_count{span="rag.embedding_batch"} 4', tracer.render_prometheus())
+
+    def test_render_prometheus(self) -> None:
+        """Test the Prometheus text format output."""
+        with self.tracer.span("llm.generate", prompt_tokens=7):
+            pass
+        text = self.tracer.render_prometheus()
+        self.assertIn('pipeline_span_seconds_count{span="llm.generate"} 1', text)
+        self.assertIn('pipeline_prompt_tokens_total{span="llm.generate"} 7', text)
+        self.assertIn("# TYPE pipeline_span_seconds summary", text)
+
+    def test_metrics_server(self) -> None:
+        """Test that the metrics endpoint serves the process tracer."""
+        with tracing.tracer.span("metrics.test"):
+            pass
+        server = start_metrics_server(0, host="127.0.0.1")
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            self.assertIn('span="metrics.test"', response.read().decode("utf-8"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,6 @@
+import sys
+from backend.source.pipeline.batch.batch_runner import main
+
+# Headless entry point, e.g. `python batch.py path/to/repo --output results.jsonl`
+if __name__ == "__main__":
+    sys.exit(main())
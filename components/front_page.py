@@ -9,7 +9,9 @@ from api.WebSocketClient import WebSocketClient
 #from components.model_selection import create_model_selection_dropdown
 
 from components.file_utils import read_file, get_file_language
-from components.pipeline_service import initialize_pipeline, run_pipeline, run_fault_localization, get_final_patch
+from components.pipeline_service import MODEL_CHOICES, initialize_pipeline, run_fault_localization, submit_pipeline, cancel_pipeline, format_job_status, jobs, sessions
+from backend.source.concurrency.job_queue import QueueFull
+from components.warmup import warmup
 from components.ui_helpers import enable_continue, disable_continue_show_rerun
 from components.callbacks import on_continue1, on_continue2, on_continue3
 
@@ -61,7 +63,7 @@ language = "python"
 def on_file_upload(file):
     """
     Reads the file and updates the file display with its content and detected language.
-    Also enables the run buttons if a file is uploaded.
+    Also enables the run buttons if a file is uploaded and warm-up has finished.
     """
     if file is None:
         return gr.update(value="No file uploaded."), gr.update(interactive=False), gr.update(interactive=False)
@@ -69,7 +71,57 @@ def on_file_upload(file):
     language = get_file_language(file)
     if language == "java":
         language = "python"
-    return gr.update(value=content, language=language), gr.update(interactive=True), gr.update(interactive=True)
+    return gr.update(value=content, language=language), gr.update(interactive=warmup.ready), gr.update(interactive=warmup.ready)
+
+def refresh_readiness(file):
+    """
+    Polled until warm-up finishes, then enables the run buttons if a file is already
+    uploaded and stops polling.
+    """
+    ready = warmup.ready
+    return (
+        gr.update(value=warmup.status_text(), visible=bool(warmup.status_text())),
+        gr.update(interactive=ready and file is not None),
+        gr.update(interactive=ready and file is not None),
+        gr.Timer(active=not ready)
+    )
+
+def start_pipeline_job(file_display_value, file_obj, model, num_candidates, session_id):
+    """
+    Queues a full run and starts polling it. When the queue is full the run is refused
+    with a warning instead of waiting in the request.
+    """
+    try:
+        session_id, job_id = submit_pipeline(file_display_value, file_obj, model, num_candidates, session_id)
+    except QueueFull as e:
+        gr.Warning(f"The server is busy: {e}")
+        return session_id, None, gr.update(), gr.Timer(active=False), gr.update(visible=False)
+    return session_id, job_id, gr.update(value=format_job_status(job_id), visible=True), gr.Timer(active=True), gr.update(visible=True)
+
+def poll_job(job_id):
+    """
+    Polled while a job runs. Shows its stage progress and, once it has finished, its
+    results, then stops polling.
+    """
+    job = jobs.get(job_id)
+    unchanged = [gr.update()] * 6
+    if job is None:
+        return [gr.update(visible=False), *unchanged, gr.Timer(active=False), gr.update(visible=False)]
+    status = gr.update(value=format_job_status(job_id), visible=True)
+    if not job.is_finished:
+        return [status, *unchanged, gr.Timer(active=True), gr.update(visible=True)]
+    outputs = list(job.result) if job.state == "done" else unchanged
+    return [status, *outputs, gr.Timer(active=False), gr.update(visible=False)]
+
+def resume_job(job_id):
+    """
+    On page load, reattaches to the job this browser started last, so a reloaded or
+    reopened tab still gets its results.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return None, None, gr.Timer(active=False)
+    return job.kwargs.get("session_id"), job_id, gr.Timer(active=True)
 
 ws_client = WebSocketClient()
 def handle_initiate_pipeline(files, selected_steps, initial_prompt):
@@ -97,6 +149,11 @@ def handle_initiate_pipeline(files, selected_steps, initial_prompt):
 
 def create_full_ui():
     with gr.Blocks(css=css_code) as app:
+        # per-browser session id, the pipeline itself lives in the session manager
+        session_state = gr.State(None)
+        # the running job's id survives a reload, see resume_job
+        job_state = gr.BrowserState(None, storage_key="pipeline_job")
+
         # Header Bar with Logo and Title using gr.Image and gr.HTML
         with gr.Row(elem_classes="header-bar"):
             logo = gr.Image(
@@ -127,10 +184,22 @@ def create_full_ui():
                 )
                 model_selection = gr.Dropdown(
                     label="Model selection dropdown", 
-                    choices=["Meta Llama 3 8B-Instruct(Test)", "Meta Llama 3.1 70B-Instruct"]
+                    choices=list(MODEL_CHOICES)
+                )
+                num_candidates = gr.Slider(
+                    label="Patch candidates",
+                    minimum=1,
+                    maximum=8,
+                    step=1,
+                    value=1
                 )
                 run_pipeline_btn = gr.Button("Run Pipeline", interactive=False)
                 manual_run_btn = gr.Button("Manual Run", interactive=False)
+                warmup_status = gr.Markdown(warmup.status_text(), visible=bool(warmup.status_text()))
+                readiness_timer = gr.Timer(1.0)
+                job_status = gr.Markdown(visible=False)
+                cancel_job_btn = gr.Button("Cancel Run", variant="stop", visible=False)
+                job_timer = gr.Timer(1.0, active=False)
             # Right Column: Tabs for Each Pipeline Stage
             with gr.Column(scale=2, min_width=500):
                 with gr.Tabs() as tabs:
@@ -154,6 +223,8 @@ def create_full_ui():
                             lines=20
                         )
                         continue_button_4 = gr.Button("Continue", visible=True, interactive=False)
+                    with gr.Tab("Run Summary"):
+                        run_summary = gr.Markdown(elem_classes=["scrollable-markdown"])
         
         # =============================================================================
         # EVENT BINDINGS
@@ -164,13 +235,19 @@ def create_full_ui():
             outputs=[file_display, run_pipeline_btn, manual_run_btn]
         )
 
+        readiness_timer.tick(
+            fn=refresh_readiness,
+            inputs=[file_uploader],
+            outputs=[warmup_status, run_pipeline_btn, manual_run_btn, readiness_timer]
+        )
+
         manual_run_btn.click(
             fn=initialize_pipeline,
-            inputs=[file_display, file_uploader, model_selection],
-            outputs=[]
+            inputs=[file_display, file_uploader, model_selection, num_candidates, session_state],
+            outputs=[session_state]
         ).then(
             fn=run_fault_localization,
-            inputs=[],
+            inputs=[session_state],
             outputs=stage_output_1
         ).then(
             fn=enable_continue,
@@ -183,33 +260,46 @@ def create_full_ui():
             inputs=[],
             outputs=[continue_button_1, continue_button_2, continue_button_3, continue_button_4]
         ).then(
-            fn=initialize_pipeline,
-            inputs=[file_display, file_uploader, model_selection],
-            outputs=[]
-        ).then(
-            fn=run_pipeline,
-            inputs=[],
-            outputs=[stage_output_1, stage_output_2, stage_output_3, stage_output_4]
-        ).then(
-            fn=get_final_patch,
-            inputs=[],
-            outputs=[file_display_final]
+            fn=start_pipeline_job,
+            inputs=[file_display, file_uploader, model_selection, num_candidates, session_state],
+            outputs=[session_state, job_state, job_status, job_timer, cancel_job_btn]
+        )
+
+        # the run itself is on a job worker, the page only polls it
+        job_timer.tick(
+            fn=poll_job,
+            inputs=[job_state],
+            outputs=[job_status, stage_output_1, stage_output_2, stage_output_3, stage_output_4, file_display_final, run_summary, job_timer, cancel_job_btn]
+        )
+
+        cancel_job_btn.click(
+            fn=cancel_pipeline,
+            inputs=[job_state],
+            outputs=[job_status]
+        )
+
+        app.load(
+            fn=resume_job,
+            inputs=[job_state],
+            outputs=[session_state, job_state, job_timer]
         )
 
         continue_button_1.click(
             fn=on_continue1,
-            inputs=[],
+            inputs=[session_state],
             outputs=[continue_button_2, stage_output_2]
         )
         continue_button_2.click(
             fn=on_continue2,
-            inputs=[],
+            inputs=[session_state],
             outputs=[continue_button_3, stage_output_3]
         )
         continue_button_3.click(
             fn=on_continue3,
-            inputs=[],
+            inputs=[session_state],
             outputs=[continue_button_4, stage_output_4, file_display_final]
         )
 
+    # runs are capped by the session manager, so gradio doesn't need to serialize events
+    app.queue(default_concurrency_limit=sessions.max_concurrent_runs)
     return app
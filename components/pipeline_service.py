@@ -1,80 +1,207 @@
 # pipeline_service.py .
 import os
+import uuid
 from backend.source.pipeline.pipeline import Pipeline
+from backend.source.telemetry.tracing import tracer
+from backend.source.concurrency.singleflight import llm_flights, embedding_flights
+from backend.source.concurrency.job_queue import JobQueue
+from components.session_manager import SessionManager
 
-pipeline = None
-language = "text"
+# models offered in the UI, display name -> model id, None is the test model
+MODEL_CHOICES = {
+    "Meta Llama 3 8B-Instruct(Test)": None,
+    "Meta Llama 3.1 70B-Instruct": "accounts/eriktajti-a69f1e/deployedModels/ft-55346a98-791f5-9f0c0828",
+}
 
-def initialize_pipeline(file_display_value, file_obj, model):
-    global pipeline, language
+# how many patch candidates are validated at once when sampling more than one
+candidate_workers = int(os.getenv("PATCH_CANDIDATE_WORKERS", "4"))
+
+# one pipeline per browser session, the session id lives in gr.State
+sessions = SessionManager(
+    max_sessions=int(os.getenv("MAX_SESSIONS", "32")),
+    idle_timeout=float(os.getenv("SESSION_IDLE_TIMEOUT", "1800")),
+    max_concurrent_runs=int(os.getenv("MAX_CONCURRENT_RUNS", "10"))
+)
+
+# full runs happen here rather than in the gradio event, so they outlive the browser tab
+jobs = JobQueue(
+    workers=int(os.getenv("PIPELINE_WORKERS", str(sessions.max_concurrent_runs))),
+    max_pending=int(os.getenv("PIPELINE_QUEUE_SIZE", "20")),
+    name="pipeline"
+)
+
+# what a job reports on, in run order
+JOB_STAGES = ["initialize", "fault_localization", "pattern_matching", "patch_generation", "patch_validation"]
+
+def initialize_pipeline(file_display_value, file_obj, model, num_candidates=1, session_id=None):
+    """Build a pipeline for this session and return the session id to keep in gr.State."""
+    session_id = session_id or uuid.uuid4().hex
+    with sessions.run(session_id) as session:
+        build_pipeline(session, file_display_value, file_obj, model, num_candidates)
+    return session_id
+
+def build_pipeline(session, file_display_value, file_obj, model, num_candidates=1):
+    """Build the session's pipeline, the caller holds its run slot."""
     try:
         file_content = file_display_value if file_display_value is not None else ""
         if file_obj is not None and hasattr(file_obj, "name"):
             file_name = os.path.basename(file_obj.name)
             file_ext = os.path.splitext(file_name)[1].lower()
             if file_ext in [".py"]:
-                language = "python"
+                session.language = "python"
             elif file_ext in [".java"]:
-                language = "java"
+                session.language = "java"
             elif file_ext in [".cpp", ".c", ".h", ".hpp"]:
-                language = "cpp"
+                session.language = "cpp"
             else:
-                language = "text"
+                session.language = "text"
         else:
             file_name = "Unknown"
-            language = "text"
-        
-        if model == "Meta Llama 3 8B-Instruct(Test)":
-            pipeline = Pipeline(file_name, file_content, None, test=True)
-        elif model == "Meta Llama 3.1 70B-Instruct":
-            model = "accounts/eriktajti-a69f1e/deployedModels/ft-55346a98-791f5-9f0c0828"
-            pipeline = Pipeline(file_name, file_content, model)
-        
+            session.language = "text"
+
+        # sessions keep their index in memory so they never share code_index.faiss
+        if model in MODEL_CHOICES:
+            model_id = MODEL_CHOICES[model]
+            session.pipeline = Pipeline(file_name, file_content, model_id, test=model_id is None, num_candidates=int(num_candidates), max_workers=candidate_workers, index_path=None)
+
         print("Pipeline initialized with file:", file_name)
         print("Content length:", len(file_content))
-        print("Language detected:", language)
+        print("Language detected:", session.language)
     except Exception as e:
         print(f"Error initializing pipeline: {str(e)}")
-        pipeline = Pipeline("Unknown", "")
-        language = "text"
+        session.pipeline = Pipeline("Unknown", "", index_path=None)
+        session.language = "text"
 
-def run_fault_localization():
-    pipeline.fault_localization()
-    return str(pipeline.localization)
-
-def run_pattern_matching():
-    pipeline.pattern_matching()
+def format_patterns(pipeline):
     complete_output = ""
     for pre_pattern in pipeline.pre_patterns:
-        complete_output += f"{pre_pattern}\n"
+        if pre_pattern is not None:
+            complete_output += f"{pre_pattern}\n"
     return complete_output
 
-def run_patch_generation():
-    pipeline.patch_generation()
+def format_patches(pipeline):
     html_output = "<h3>Patches Generated</h3>"
-    for i, patch in enumerate(pipeline.patches):
-        label = "Final Patch" if i == len(pipeline.patches) - 1 else f"Patch {i+1}"
+    patches = pipeline.patches or []
+    for i, patch in enumerate(patches):
+        label = "Final Patch" if i == len(patches) - 1 else f"Patch {i+1}"
         html_output += (
             f"<details class='dropdown-html'><summary>{label}</summary>"
             f"<pre><code>{patch}</code></pre></details><br>"
         )
     return html_output
 
-def run_patch_validation():
-    pipeline.patch_validation()
-    pipeline.rag.clear_index()
-    return str(pipeline.validation)
+def run_fault_localization(session_id):
+    with sessions.run(session_id) as session:
+        session.pipeline.fault_localization()
+        return str(session.pipeline.localization)
+
+def run_pattern_matching(session_id):
+    with sessions.run(session_id) as session:
+        session.pipeline.pattern_matching()
+        return format_patterns(session.pipeline)
+
+def run_patch_generation(session_id):
+    with sessions.run(session_id) as session:
+        session.pipeline.patch_generation()
+        return format_patches(session.pipeline)
+
+def run_patch_validation(session_id):
+    with sessions.run(session_id) as session:
+        session.pipeline.patch_validation()
+        session.pipeline.rag.clear_index()
+        return str(session.pipeline.validation)
+
+def pipeline_job(job, file_display_value, file_obj, model, num_candidates, session_id):
+    """Initialize and run the session's pipeline on a job worker, reporting each stage."""
+    # one run slot for both, so the session can't be evicted between building and running
+    with sessions.run(session_id) as session:
+        job.report("initialize", "running")
+        build_pipeline(session, file_display_value, file_obj, model, num_candidates)
+        job.report("initialize", "done")
+        pipeline = session.pipeline
+        try:
+            pipeline.run_pipline(on_progress=job.report)
+        finally:
+            pipeline.rag.clear_index()
+        return (
+            str(pipeline.localization),
+            format_patterns(pipeline),
+            format_patches(pipeline),
+            str(pipeline.validation),
+            get_final_patch(session_id),
+            get_run_summary(session_id)
+        )
+
+def submit_pipeline(file_display_value, file_obj, model, num_candidates=1, session_id=None):
+    """Queue a full run and return (session id, job id). Raises QueueFull when too many runs are waiting."""
+    session_id = session_id or uuid.uuid4().hex
+    job = jobs.submit(pipeline_job, file_display_value, file_obj, model, num_candidates, session_id=session_id, name="pipeline")
+    return session_id, job.id
+
+def format_job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return ""
+    state = job.state
+    if state == "queued":
+        position = jobs.position(job.id)
+        state = f"queued (position {position})" if position else state
+    elif state == "running" and job.cancel_requested:
+        state = "cancelling, stops before its next model call"
+    elif state == "failed":
+        state = f"failed: {job.error}"
+    progress = job.progress()
+    lines = [
+        f"**Job** `{job.id[:8]}`: {state}",
+        "",
+        "| Stage | Status |",
+        "| --- | --- |",
+    ]
+    for stage in JOB_STAGES:
+        lines.append(f"| {stage} | {progress.get(stage, 'pending')} |")
+    return "\n".join(lines)
+
+def cancel_pipeline(job_id):
+    jobs.cancel(job_id)
+    return format_job_status(job_id)
+
+def format_task_usage(model):
+    """Per-task prompt tokens, how many were a static prefix or cached by the provider, and capped calls."""
+    usage = getattr(model, "task_usage", None) or {}
+    if not usage:
+        return ""
+    lines = [
+        "| Task | Calls | Prompt tokens | Static prefix | Provider cached | Capped |",
+        "| --- | --- | --- | --- | --- | --- |",
+    ]
+    for task, row in sorted(usage.items()):
+        lines.append(
+            f"| {task} | {row['calls']} | {row['prompt_tokens']} | {row['prefix_tokens']} | "
+            f"{row['cached_tokens']} | {row['capped']} |"
+        )
+    return "\n\n" + "\n".join(lines)
 
-def run_pipeline():
+def get_run_summary(session_id):
+    """Per-span timing, token and cache summary of the session's last full run."""
+    if session_id is None or session_id not in sessions:
+        return tracer.format_summary(None)
+    pipeline = sessions.get(session_id).pipeline
+    summary = tracer.format_summary(getattr(pipeline, "trace_id", None))
+    # process wide, duplicate requests from any session that shared an in-flight call
+    llm, embedding = llm_flights.stats(), embedding_flights.stats()
     return (
-        run_fault_localization(),
-        run_pattern_matching(),
-        run_patch_generation(),
-        run_patch_validation()
+        f"{summary}{format_task_usage(getattr(pipeline, 'model', None))}\n\nCoalesced requests (all sessions): {llm['coalesced']} of "
+        f"{llm['executed'] + llm['coalesced']} LLM calls, {embedding['coalesced']} of "
+        f"{embedding['executed'] + embedding['coalesced']} embedding calls"
     )
 
-def get_final_patch():
-    """Return the final patch from the pipeline's patches list."""
+def get_final_patch(session_id):
+    """Return the patch chosen during validation, falling back to the last generated patch."""
+    if session_id is None or session_id not in sessions:
+        return ""
+    pipeline = sessions.get(session_id).pipeline
+    if pipeline is not None and getattr(pipeline, "final_patch", None):
+        return pipeline.final_patch
     if pipeline is not None and hasattr(pipeline, "patches") and pipeline.patches:
         return pipeline.patches[-1]
     return ""
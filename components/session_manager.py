@@ -0,0 +1,77 @@
+# session_manager.py
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+class PipelineSession:
+    """Pipeline state owned by a single browser session."""
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.pipeline = None
+        self.language = "text"
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+class SessionManager:
+    """
+    Keeps one pipeline per session id (stored in gr.State), evicting least recently used
+    and idle sessions, and caps how many pipeline runs execute at the same time.
+    """
+    def __init__(self, max_sessions=32, idle_timeout=1800, max_concurrent_runs=10):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_concurrent_runs = max_concurrent_runs
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._run_slots = threading.BoundedSemaphore(max_concurrent_runs)
+
+    def _evict(self):
+        # sessions with a run in progress are never evicted
+        now = time.monotonic()
+        for session_id, session in list(self._sessions.items()):
+            if now - session.last_used > self.idle_timeout and not session.lock.locked():
+                del self._sessions[session_id]
+        for session_id, session in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            if not session.lock.locked():
+                del self._sessions[session_id]
+
+    def get(self, session_id):
+        """Return the session for session_id, creating it if needed."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = PipelineSession(session_id)
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+            self._evict()
+            return session
+
+    def remove(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    @contextmanager
+    def run(self, session_id):
+        """Hold a global run slot and the session's own lock while working on its pipeline."""
+        with self._run_slots:
+            session = self.get(session_id)
+            with session.lock:
+                with self._lock:
+                    # it may have been evicted between lookup and locking
+                    self._sessions.setdefault(session_id, session)
+                try:
+                    yield session
+                finally:
+                    session.last_used = time.monotonic()
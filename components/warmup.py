@@ -0,0 +1,104 @@
+# warmup.py
+import threading
+import time
+from components.pipeline_service import MODEL_CHOICES
+
+class Warmup:
+    """
+    Loads what the first pipeline run would otherwise wait for, in a background thread
+    started once the app is listening: tokenizers, the embedding model, a throwaway index
+    to encode and search, and one tiny completion per model so the provider connection is
+    open. The Run buttons stay disabled until it is ready. A step that fails is reported
+    and skipped, it never keeps the app locked.
+    """
+    def __init__(self):
+        self.state = "off"
+        self.current = None
+        self.total = 0
+        self.completed = []
+        self.errors = {}
+        self.seconds = 0.0
+        self.models = []
+        self._thread = None
+        self._done = threading.Event()
+        self._done.set()
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def steps(self, connect=True):
+        steps = [("tokenizers and models", self.load_models), ("embedding model", self.load_embedder)]
+        if connect:
+            steps.append(("provider connections", self.open_connections))
+        return steps
+
+    def start(self, connect=True):
+        if self._thread is not None:
+            return self._thread
+        steps = self.steps(connect)
+        self.state = "running"
+        self.total = len(steps)
+        self._done.clear()
+        self._thread = threading.Thread(target=self._run, args=(steps,), name="warmup", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _run(self, steps):
+        start = time.perf_counter()
+        for name, step in steps:
+            self.current = name
+            try:
+                step()
+                self.completed.append(name)
+            except Exception as e:
+                print(f"Warm-up step '{name}' failed: {e}")
+                self.errors[name] = str(e)
+        self.current = None
+        self.seconds = time.perf_counter() - start
+        self.state = "ready"
+        print(f"Warm-up finished in {self.seconds:.1f}s" + (f", failed: {', '.join(self.errors)}" if self.errors else ""))
+        self._done.set()
+
+    def load_models(self):
+        # building each model loads its tokenizer into the shared cache and imports litellm
+        from backend.source.model.model import Model
+        from backend.source.pipeline.pipeline import fireworks_api_key
+        for choice, model_id in MODEL_CHOICES.items():
+            try:
+                if model_id is None:
+                    self.models.append(Model(None, None, None, test=True))
+                else:
+                    self.models.append(Model(model_id, fireworks_api_key, "fireworks"))
+            except Exception as e:
+                # one model that can't load shouldn't keep the others cold
+                print(f"Warm-up could not load {choice}: {e}")
+                self.errors[choice] = str(e)
+
+    def load_embedder(self):
+        # an in-memory index over a tiny file exercises the encoder, faiss and the search path
+        from backend.source.pipeline.rag.rag import RAG
+        rag = RAG(index_path=None)
+        rag.embed_code([{"filename": "Warmup.java", "content": "class Warmup {\n    void run() {}\n}"}])
+        rag.retrieve_context("warm up", k=1)
+
+    def open_connections(self):
+        # the provider clients litellm caches keep their connections for the real calls
+        for model in self.models:
+            model.generate_response("ping", task="warmup")
+
+    def status_text(self):
+        if self.state == "off":
+            return ""
+        if not self.ready:
+            step = min(len(self.completed) + len(self.errors) + 1, self.total)
+            return f"Warming up ({step}/{self.total}): loading {self.current or 'models'}…"
+        if self.errors:
+            return f"Ready after {self.seconds:.0f}s warm-up (failed: {', '.join(self.errors)})"
+        return f"Ready after {self.seconds:.0f}s warm-up"
+
+# one per process, main.py starts it after app.launch when WARMUP is on
+warmup = Warmup()
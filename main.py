@@ -1,10 +1,36 @@
+import os
+import sys
+import argparse
+
+# checked before anything heavy is imported, the profile itself runs in a fresh interpreter
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Launch the code repair UI.")
+    parser.add_argument("--profile-startup", action="store_true", help="Report how long the UI takes to import and build, per module, then exit.")
+    parser.add_argument("--top", type=int, default=25, help="Modules listed by --profile-startup.")
+    args, _ = parser.parse_known_args()
+    if args.profile_startup:
+        from backend.source.telemetry.startup_profile import main as profile_startup
+        profile_startup(args.top)
+        sys.exit(0)
+
 import gradio as gr
 from components.front_page import create_full_ui
+from components.warmup import warmup
+from backend.source.telemetry.tracing import start_metrics_server
 
 # Create the UI
 app = create_full_ui()
 
 # Launch the app
 if __name__ == "__main__":
-    app.launch(server_name="0.0.0.0", server_port=7860, share=True, show_api=False)
-
+    # Prometheus text metrics, e.g. METRICS_PORT=9100 -> http://host:9100/metrics
+    if os.getenv("METRICS_PORT"):
+        start_metrics_server(int(os.getenv("METRICS_PORT")))
+    # WARMUP=0 skips the preload, WARMUP_CONNECT=0 loads models without calling the provider
+    if os.getenv("WARMUP", "1") == "1":
+        # listen first so the page is up while models load, the Run buttons wait for it
+        app.launch(server_name="0.0.0.0", server_port=7860, share=True, show_api=False, prevent_thread_lock=True)
+        warmup.start(connect=os.getenv("WARMUP_CONNECT", "1") == "1")
+        app.block_thread()
+    else:
+        app.launch(server_name="0.0.0.0", server_port=7860, share=True, show_api=False)